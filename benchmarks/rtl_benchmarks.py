@@ -0,0 +1,448 @@
+"""
+==============
+RTL benchmarks
+==============
+Benchmarks of the Python side hot paths of TheSyDeKick RTL interface.
+
+No simulator is needed. Synthetic modules, entities and IO data are
+generated to a temporary directory, and the following operations are
+timed:
+
+- parsing of Verilog modules and VHDL entities, and building their
+  `ios` connector bundles
+- testbench `generate_contents` for a DUT with thousands of connectors
+- assignments of a connector bundle for a list of match expressions
+- event type `rtl_iofile.Data` conversion
+- text and binary input file write and output file read throughput
+- import of the rtl package in a new interpreter, with the import of
+  thesdk alone as a reference
+
+Each benchmark is repeated, with untimed setup before each repetition,
+and the minimum, median and mean times are reported. Results can be
+stored as JSON and compared against a baseline stored earlier, e.g. on
+another commit::
+
+    python benchmarks/rtl_benchmarks.py -o baseline.json
+    git checkout <commit>
+    python benchmarks/rtl_benchmarks.py -o current.json --compare baseline.json
+
+    # Compare stored results without running
+    python benchmarks/rtl_benchmarks.py --current current.json --compare baseline.json
+
+With `--compare`, the exit status is 1 if the median time of any
+benchmark has grown more than `--threshold` relative to the baseline.
+
+With the `import_rtl` benchmark, it is also checked that `import rtl`
+does not import the modules deferred to the first use, `deferred_modules`,
+and that `from rtl import *` still binds the classes `star_classes`.
+The exit status is 1 if either check fails.
+
+"""
+import os
+import re
+import sys
+import gc
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+# The rtl package of this working tree
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from thesdk import *
+from rtl import rtl, rtl_iofile
+from rtl.testbench import testbench as vtb
+from rtl.connector import rtl_connector, rtl_connector_bundle
+from rtl.sv.verilog_module import verilog_module
+from rtl.sv.verilog_lexer import parse_module
+from rtl.vhdl.vhdl_entity import vhdl_entity, parse_entity
+import rtl.interface_cache as interface_cache
+
+# Modules that `import rtl` must not import
+deferred_modules = [ 'pandas', 'thesdk.iofile', 'rtl.rtl_iofile', 'rtl.testbench',
+        'rtl.compile_scheduler' ]
+
+# Classes that `from rtl import *` must bind, including the deferred ones
+star_classes = [ 'rtl', 'rtl_iofile', 'vtb', 'rtl_connector_bundle' ]
+
+def import_env():
+    ''' Environment of a new interpreter importing the rtl package of this
+    working tree.
+
+    '''
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))) ] + ([ env['PYTHONPATH'] ] if env.get('PYTHONPATH') else []))
+    return env
+
+def check_imports():
+    ''' Returns the `deferred_modules` imported by `import rtl` in a new interpreter.
+
+    '''
+    code = ('import sys, json, rtl; print(json.dumps([ m for m in %r if m in sys.modules ]))'
+            % (deferred_modules))
+    result = subprocess.run([ sys.executable, '-c', code ], env=import_env(),
+            check=True, capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def check_star_import():
+    ''' Returns the `star_classes` not bound by `from rtl import *` in a new interpreter.
+
+    '''
+    code = ('import json; from rtl import *; print(json.dumps([ c for c in %r '
+            'if not isinstance(globals().get(c), type) ]))' % (star_classes))
+    result = subprocess.run([ sys.executable, '-c', code ], env=import_env(),
+            check=True, capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+class bench_entity(rtl,thesdk):
+    ''' Entity with `width` input ports A_<n> and output ports Z_<n> of 16 bits.
+
+    '''
+    def __init__(self, **kwargs):
+        self.proplist=[]
+        self._classfile=os.path.join(kwargs.get('path'), 'bench_entity', 'bench_entity')
+        self.width=kwargs.get('width', 1)
+        self.IOS=Bundle()
+        self.IOS.Members['A']=IO()
+        self.IOS.Members['Z']=IO()
+        self.model='icarus'
+        self.lang='sv'
+
+    @property
+    def inputs(self):
+        return [ 'A_%d' % index for index in range(self.width) ]
+
+    @property
+    def outputs(self):
+        return [ 'Z_%d' % index for index in range(self.width) ]
+
+def verilog_source(width):
+    ''' Verilog module bench_entity with `width` inputs and outputs and
+    as many parameters.
+
+    '''
+    parameters = ',\n'.join('    parameter P_%d = %d' % (index, index) for index in range(width))
+    ports = [ '    input clock', '    input reset' ]
+    ports += [ '    input signed [15:0] A_%d' % index for index in range(width) ]
+    ports += [ '    output reg signed [15:0] Z_%d' % index for index in range(width) ]
+    body = '\n'.join('always @(posedge clock) Z_%d <= A_%d;' % (index, index) for index in range(width))
+    return 'module bench_entity #(\n%s\n) (\n%s\n);\n%s\nendmodule\n' % (
+            parameters, ',\n'.join(ports), body)
+
+def vhdl_source(width):
+    ''' VHDL entity bench_entity with `width` inputs and outputs and as many generics.
+
+    '''
+    generics = ';\n'.join('        g_%d : integer := %d' % (index, index) for index in range(width))
+    ports = [ '        clock : in std_logic', '        reset : in std_logic' ]
+    ports += [ '        A_%d : in std_logic_vector(15 downto 0)' % index for index in range(width) ]
+    ports += [ '        Z_%d : out std_logic_vector(15 downto 0)' % index for index in range(width) ]
+    return ('library ieee;\nuse ieee.std_logic_1164.all;\n\nentity bench_entity is\n'
+            '    generic(\n%s\n    );\n    port(\n%s\n    );\nend entity bench_entity;\n\n'
+            'architecture rtl of bench_entity is\nbegin\nend architecture rtl;\n') % (
+            generics, ';\n'.join(ports))
+
+class benchmarks:
+    ''' Collection of the benchmarks.
+
+    Parameters
+    ----------
+    **kwargs :
+        path : str
+            Work directory
+        scale : float, 1.0
+            Scale of the problem sizes
+
+    '''
+    def __init__(self, **kwargs):
+        self.path = kwargs.get('path')
+        self.scale = kwargs.get('scale', 1.0)
+        thesdk.GLOBALS['RTLCACHEPATH'] = os.path.join(self.path, 'cache')
+
+    def size(self, value):
+        return max(1, int(value * self.scale))
+
+    def entity(self, width=1):
+        return bench_entity(path=os.path.join(self.path, 'entities'), width=width)
+
+    def write_source(self, name, contents):
+        path = os.path.join(self.path, 'sources', name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as outfile:
+            outfile.write(contents)
+        return path
+
+    def clear_interface_cache(self):
+        interface_cache._memo.clear()
+        shutil.rmtree(os.path.join(self.path, 'cache'), ignore_errors=True)
+
+    # Each benchmark returns (size, unit, setup, run). setup is called before each
+    # repetition and its return value passed to run.
+
+    def verilog_parse(self):
+        width = self.size(2000)
+        text = verilog_source(width)
+        return 2 * width, 'ports', lambda: None, lambda _: parse_module(text, 'bench_entity')
+
+    def verilog_ios(self):
+        width = self.size(2000)
+        file = self.write_source('bench_entity.sv', verilog_source(width))
+        def setup():
+            self.clear_interface_cache()
+            return verilog_module(file=file, name='bench_entity')
+        return 2 * width, 'ports', setup, lambda module: module.ios
+
+    def verilog_ios_cached(self):
+        width = self.size(2000)
+        file = self.write_source('bench_entity.sv', verilog_source(width))
+        def setup():
+            interface_cache._memo.clear()
+            return verilog_module(file=file, name='bench_entity')
+        self.clear_interface_cache()
+        setup().ios
+        return 2 * width, 'ports', setup, lambda module: module.ios
+
+    def vhdl_parse(self):
+        width = self.size(2000)
+        text = vhdl_source(width)
+        return 2 * width, 'ports', lambda: None, lambda _: parse_entity(text, 'bench_entity')
+
+    def vhdl_ios(self):
+        width = self.size(2000)
+        file = self.write_source('bench_entity.vhd', vhdl_source(width))
+        def setup():
+            self.clear_interface_cache()
+            return vhdl_entity(file=file, name='bench_entity')
+        return 2 * width, 'ports', setup, lambda entity: entity.ios
+
+    def testbench_generate_contents(self):
+        width = self.size(2000)
+        def setup():
+            dut = self.entity(width=width)
+            os.makedirs(dut.vlogsrcpath, exist_ok=True)
+            with open(dut.vlogsrc, 'w') as outfile:
+                outfile.write(verilog_source(width))
+            _=rtl_iofile(dut, name='A', dir='in', iotype='sample', ionames=dut.inputs,
+                    datatype='sint')
+            _=rtl_iofile(dut, name='Z', dir='out', iotype='sample', ionames=dut.outputs,
+                    datatype='sint')
+            dut.IOS.Members['A'].Data=np.zeros((16, width), dtype=np.int64)
+            dut.copy_rtl_sources()
+            dut.tb=vtb(parent=dut, lang=dut.lang)
+            dut.tb.define_testbench()
+            dut.add_connectors()
+            dut.create_connectors()
+            dut.connect_inputs()
+            dut.format_ios()
+            return dut
+        return 2 * width, 'connectors', setup, lambda dut: dut.tb.generate_contents()
+
+    def connector_assign(self):
+        width = self.size(20000)
+        matchlist = [ r'B_%d_.*' %(n) for n in range(50) ] + [ r'A_1.*' ]
+        def setup():
+            bundle = rtl_connector_bundle()
+            for n in range(width):
+                connector = rtl_connector(name='A_%d' %(n), cls='wire', ll=15, rl=0)
+                bundle.Members[connector.name] = connector
+            for connector in bundle.Members.values():
+                connector.connect = bundle.Members['A_0']
+            return bundle
+        return width, 'connectors', setup, lambda bundle: bundle.assign(match=matchlist)
+
+    def iofile_events(self):
+        width = 8
+        events = self.size(20000)
+        def setup():
+            dut = self.entity(width=width)
+            file = rtl_iofile(dut, name='control', dir='in', iotype='event',
+                    ionames=dut.inputs)
+            file.rtl_connectors=[ rtl_connector(lang='sv', name=name) for name in dut.inputs ]
+            return file
+        def run(file):
+            file.set_control_data(init=0)
+            for index in range(events):
+                file.set_control_data(time=index * 10, name='A_%d' % (index % width), val=index)
+            return file.Data
+        return events, 'events', setup, run
+
+    def _iofile(self, direction, fileformat, width):
+        dut = self.entity(width=width)
+        file = rtl_iofile(dut, name='A' if direction == 'in' else 'Z', dir=direction,
+                iotype='sample', ionames=dut.inputs if direction == 'in' else dut.outputs,
+                datatype='sint', fileformat=fileformat)
+        file.rtl_connectors=[ rtl_connector(lang='sv', name=name) for name in file.ionames ]
+        os.makedirs(os.path.dirname(file.file), exist_ok=True)
+        return file
+
+    def _data(self, rows, width):
+        return np.random.default_rng(0).integers(-2**15, 2**15, size=(rows, width))
+
+    def _write(self, fileformat):
+        rows = self.size(100000)
+        width = 8
+        data = self._data(rows, width)
+        def setup():
+            file = self._iofile('in', fileformat, width)
+            file.Data = data
+            return file
+        return rows * width, 'values', setup, lambda file: file.write()
+
+    def _read(self, fileformat):
+        rows = self.size(100000)
+        width = 8
+        data = self._data(rows, width)
+        def setup():
+            file = self._iofile('out', fileformat, width)
+            if fileformat == 'binary':
+                data.astype(file.langmodule.binarydtype).tofile(file.file)
+            else:
+                np.savetxt(file.file, data, fmt='%d', delimiter='\t')
+            return file
+        return rows * width, 'values', setup, lambda file: file.read()
+
+    def iofile_write_text(self):
+        return self._write('text')
+
+    def iofile_read_text(self):
+        return self._read('text')
+
+    def iofile_write_binary(self):
+        return self._write('binary')
+
+    def iofile_read_binary(self):
+        return self._read('binary')
+
+    def _import(self, module):
+        env = import_env()
+        cmd = [ sys.executable, '-c', 'import %s' % module ]
+        return 1, 'imports', lambda: None, lambda _: subprocess.run(cmd, env=env, check=True)
+
+    def import_thesdk(self):
+        return self._import('thesdk')
+
+    def import_rtl(self):
+        return self._import('rtl')
+
+    names = [ 'import_thesdk', 'import_rtl', 'verilog_parse', 'verilog_ios', 'verilog_ios_cached', 'vhdl_parse', 'vhdl_ios',
+            'testbench_generate_contents', 'connector_assign', 'iofile_events', 'iofile_write_text',
+            'iofile_read_text', 'iofile_write_binary', 'iofile_read_binary' ]
+
+    def run(self, name, repeat):
+        ''' Runs benchmark `name` `repeat` times and returns its result.
+
+        '''
+        size, unit, setup, run = getattr(self, name)()
+        times = []
+        for _ in range(repeat):
+            arg = setup()
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                run(arg)
+                times.append(time.perf_counter() - start)
+            finally:
+                gc.enable()
+        median = statistics.median(times)
+        return { 'size' : size, 'unit' : unit, 'repeat' : repeat,
+                'min' : min(times), 'median' : median, 'mean' : statistics.mean(times),
+                'throughput' : size / median if median > 0 else None }
+
+def git_revision():
+    try:
+        return subprocess.run([ 'git', 'describe', '--always', '--dirty' ],
+                cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL).stdout.decode().strip()
+    except OSError:
+        return ''
+
+def compare(current, baseline, threshold):
+    ''' Prints the median times relative to the baseline.
+    Returns True if no benchmark is slower than `threshold`.
+
+    '''
+    ok = True
+    print('%-32s %12s %12s %8s' % ('benchmark', 'baseline', 'current', 'ratio'))
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            print('%-32s %12s %12.6f %8s' % (name, '-', result['median'], '-'))
+            continue
+        reference = baseline['results'][name]
+        if reference['size'] != result['size']:
+            print('%-32s sizes differ, not compared' % name)
+            continue
+        ratio = result['median'] / reference['median']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = ' slower'
+            ok = False
+        print('%-32s %12.6f %12.6f %8.3f%s' % (name, reference['median'], result['median'],
+            ratio, flag))
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of TheSyDeKick RTL interface.')
+    parser.add_argument('-o', '--output', help='Store the results to a JSON file.')
+    parser.add_argument('-k', '--filter', default='', help='Run benchmarks matching a regex.')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-s', '--scale', type=float, default=1.0, help='Scale of the problem sizes.')
+    parser.add_argument('--compare', help='Baseline JSON file to compare to.')
+    parser.add_argument('--current', help='Compare these stored results instead of running.')
+    parser.add_argument('--threshold', type=float, default=0.2,
+            help='Allowed relative growth of the median time. Default 0.2.')
+    parser.add_argument('--list', action='store_true', help='List the benchmarks.')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(benchmarks.names))
+        return 0
+
+    status = 0
+    if args.current:
+        with open(args.current) as infile:
+            current = json.load(infile)
+    else:
+        if re.search(args.filter, 'import_rtl'):
+            imported = check_imports()
+            if imported:
+                print('import rtl imports deferred modules: %s' % (', '.join(imported)))
+                status = 1
+            missing = check_star_import()
+            if missing:
+                print('from rtl import * does not bind: %s' % (', '.join(missing)))
+                status = 1
+        path = tempfile.mkdtemp(prefix='rtl_benchmarks_')
+        try:
+            suite = benchmarks(path=path, scale=args.scale)
+            current = { 'revision' : git_revision(), 'python' : platform.python_version(),
+                    'platform' : platform.platform(), 'scale' : args.scale,
+                    'date' : time.strftime('%Y-%m-%dT%H:%M:%S'), 'results' : {} }
+            for name in benchmarks.names:
+                if re.search(args.filter, name):
+                    result = suite.run(name, args.repeat)
+                    current['results'][name] = result
+                    print('%-32s %12.6f s  %12.0f %s/s' % (name, result['median'],
+                        result['throughput'] or 0, result['unit']), flush=True)
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+        if args.output:
+            with open(args.output, 'w') as outfile:
+                json.dump(current, outfile, indent=1)
+
+    if args.compare:
+        with open(args.compare) as infile:
+            baseline = json.load(infile)
+        if not compare(current, baseline, args.threshold):
+            return 1
+    return status
+
+if __name__=="__main__":
+    sys.exit(main())
@@ -17,18 +17,20 @@ import subprocess
 import shlex
 from abc import *
 import numpy as np
-import pandas as pd
 from functools import reduce
 import shutil
 import re
+import glob
+import tempfile
+import importlib
+import types
 
 #TheSyDeKick modules
 if not (os.path.abspath('../../thesdk') in sys.path):
     sys.path.append(os.path.abspath('../../thesdk'))
 from thesdk import *
 from rtl.connector import indent, rtl_connector_bundle, verilog_connector_bundle
-from rtl.testbench import testbench as vtb
-from rtl.rtl_iofile import rtl_iofile as rtl_iofile
+from rtl.file_watcher import wait_for_files
 # Simulator modules
 from rtl.sv.sv import sv as sv
 from rtl.vhdl.vhdl import vhdl as vhdl
@@ -36,8 +38,56 @@ from rtl.icarus.icarus import icarus as icarus
 from rtl.questasim.questasim import questasim as questasim
 from rtl.ghdl.ghdl import ghdl as ghdl
 from rtl.verilator.verilator import verilator as verilator
-
-class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
+from rtl.compile_cache import compile_cache as compile_cache
+from rtl.vpi.vpi import vpi as vpi
+from rtl.simulation_pool import simulation_pool
+from rtl.process_runner import process_step, process_runner
+from rtl.rtl_profile import rtl_profile
+import rtl.rtl_staging as staging
+
+# Attributes of this package imported on first access (PEP 562), as
+# { name : (module, attribute) }. The IO file classes import thesdk.iofile,
+# and with it pandas, and the testbench classes the module parsers, which
+# are needed only when a simulation is run. Pandas is not used by the
+# package itself, and is kept for compatibility, as are the submodules
+# that were bound to the package by importing the classes.
+_lazy_attributes = {
+        'pd' : ('pandas', None),
+        'rtl_iofile' : ('rtl.rtl_iofile', 'rtl_iofile'),
+        'vtb' : ('rtl.testbench', 'testbench'),
+        'module' : ('rtl.module', None),
+        'module_common' : ('rtl.module_common', None),
+        'rtl_iofile_common' : ('rtl.rtl_iofile_common', None),
+        'testbench' : ('rtl.testbench', None),
+        'testbench_common' : ('rtl.testbench_common', None),
+        }
+
+def __getattr__(name):
+    if name in _lazy_attributes:
+        module, attribute = _lazy_attributes[name]
+        value = importlib.import_module(module)
+        if attribute is not None:
+            value = getattr(value, attribute)
+        globals()[name] = value
+        return value
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+class _rtl_package(types.ModuleType):
+    ''' Module class of this package. Importing the submodule `rtl.rtl_iofile`
+    sets the attribute `rtl_iofile` of the package to the submodule. It is
+    ignored, so that the attribute is the class, as before the imports
+    were deferred.
+
+    '''
+    def __setattr__(self, name, value):
+        if isinstance(value, types.ModuleType) and name in _lazy_attributes \
+                and _lazy_attributes[name][1] is not None:
+            return
+        super().__setattr__(name, value)
+
+sys.modules[__name__].__class__ = _rtl_package
+
+class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,vpi,compile_cache,thesdk,metaclass=abc.ABCMeta):
     """Adding this class as a superclass enforces the definitions
     for rtl simulations in the subclasses.
 
@@ -216,6 +266,8 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
                 self._sim_opt_dict = self.questasim_sim_opt_dict
             elif self.model == 'vhdl':
                 self._sim_opt_dict = self.questasim_sim_opt_dict
+            elif self.model == 'verilator':
+                self._sim_opt_dict = self.verilator_sim_opt_dict
             else:
                 self._sim_opt_dict = {
                         'no-opt' : '',
@@ -400,9 +452,12 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
 
            Returns
            -------
-               self.simpath +'/work'
+               self.simpath +'/work', or the compile cache entry
+               if `rtl_compile_cache` is enabled.
 
         '''
+        if hasattr(self, '_rtl_compile_cache_workpath'):
+            return self._rtl_compile_cache_workpath
         if not hasattr(self, '_rtlworkpath'):
             self._rtlworkpath = self.simpath +'/work'
         return self._rtlworkpath
@@ -410,15 +465,18 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
     def delete_rtlworkpath(self):
         ''' Deletes compilation directory
             Not a deleter decorator, because does not delete
-            the property.
+            the property. Compile cache entries are kept.
 
         '''
-        if os.path.exists(self.rtlworkpath):
+        workpath = self.rtlworkpath
+        if self.rtl_compile_cache_release():
+            self.print_log(type='D',msg='Keeping cached %s' % workpath)
+        elif os.path.exists(workpath):
             try:
-                shutil.rmtree(self.rtlworkpath)
-                self.print_log(type='D',msg='Removing %s' % self.rtlworkpath)
+                shutil.rmtree(workpath)
+                self.print_log(type='D',msg='Removing %s' % workpath)
             except:
-                self.print_log(type='W',msg='Could not remove %s' %self.rtlworkpath)
+                self.print_log(type='W',msg='Could not remove %s' % workpath)
 
     @property
     def rtlparameters(self):
@@ -440,6 +498,62 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
     def rtlparameters(self):
             self._rtlparameters = None
 
+    @property
+    def rtl_plusargs(self):
+        '''Dictionary of testbench variables given on the simulator
+        command line as plusargs. Unlike `rtlparameters`, they do not
+        affect the compilation, so one compiled simulation can be run with
+        different values. Supported by the icarus and verilator models.
+
+        Example:
+        {'name' : ('integer', 5), 'mask' : ('reg [7:0]', 255) }
+
+        Types 'integer', 'int', 'longint' and vectors of 'reg', 'logic'
+        or 'bit' with an explicit range are read with %d, 'real' with %f
+        and 'string' with %s.
+
+        The variables are assigned in an initial block at time 0, so
+        other initial blocks can read them only after a delay, e.g. #0.
+
+        '''
+        if not hasattr(self, '_rtl_plusargs'):
+            self._rtl_plusargs = dict()
+        return self._rtl_plusargs
+    @rtl_plusargs.setter
+    def rtl_plusargs(self,value):
+            self._rtl_plusargs = value
+
+    @property
+    def rtl_plusargs_files(self):
+        '''Bool : If True, the Verilog testbench reads the IO file names from
+        plusargs named after the file parameters, so that the compiled
+        simulation does not depend on them. With `rtl_compile_cache`,
+        a sweep then compiles only once. Supported by the icarus and verilator models.
+
+        Default: False
+
+        '''
+        if not hasattr(self, '_rtl_plusargs_files'):
+            self._rtl_plusargs_files = False
+        return self._rtl_plusargs_files
+    @rtl_plusargs_files.setter
+    def rtl_plusargs_files(self,value):
+            self._rtl_plusargs_files = value
+
+    @property
+    def rtl_plusargs_string(self):
+        '''Plusargs of the simulation command, for `rtl_plusargs` and with
+        `rtl_plusargs_files` for the IO files.
+
+        '''
+        plusargs=''
+        if self.rtl_plusargs_files:
+            for name, iofile in self.iofile_bundle.Members.items():
+                plusargs+=' +%s=%s' %(next(iter(iofile.rtlparam)), iofile.file)
+        for name, val in self.rtl_plusargs.items():
+            plusargs+=' +%s=%s' %(name, str(val[1]).strip('"'))
+        return plusargs
+
     @property
     def vlogmodulefiles(self):
         '''List of verilog modules to be compiled in addition of DUT
@@ -503,6 +617,24 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
     def rtlfiles(self, value):
         self._rtlfiles = value
 
+    @property
+    def rtl_compile_jobs(self):
+        '''Number of source files compiled in parallel by simulators compiling
+        files separately to a shared library. Files are scheduled by their
+        dependencies with `rtl.compile_scheduler`. Currently used by the
+        questasim models. Icarus compiles all files in one process, and GHDL
+        rewrites its library file at every analysis, so they compile sequentially.
+
+        Default: 1, consecutive files of the same language are compiled with one command.
+
+        '''
+        if not hasattr(self, '_rtl_compile_jobs'):
+            self._rtl_compile_jobs = 1
+        return self._rtl_compile_jobs
+    @rtl_compile_jobs.setter
+    def rtl_compile_jobs(self, value):
+        self._rtl_compile_jobs = value
+
     @property
     def vhdlentityfiles(self):
         '''List of VHDL entity files to be compiled in addition to DUT
@@ -754,10 +886,106 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
     @rtlcmd.setter
     def rtlcmd(self,value):
         self._rtlcmd=value
+        self._rtlcmd_custom=True
     @rtlcmd.deleter
     def rtlcmd(self):
         self._rtlcmd=None
 
+    @property
+    def rtlsteps(self):
+        '''List of `rtl.process_runner.process_step` compiling and running the
+        simulation. Steps are named 'compile', 'sync', 'elaborate', 'simulate' and 'view'.
+        The 'sync' step is included only if `rtl_sync` is 'sync'.
+        If `rtlcmd` is set, it is run with the shell as a single 'simulate' step.
+
+        '''
+        if getattr(self, '_rtlcmd_custom', False):
+            return [ process_step(name='simulate', cmd=self._rtlcmd, shell=True) ]
+        if self.model == 'icarus':
+            steps = self.icarus_rtlsteps
+        elif self.model in [ 'sv', 'vhdl' ]:
+            steps = self.questasim_rtlsteps
+        elif self.model=='ghdl':
+            steps = self.ghdl_rtlsteps
+        elif self.model=='verilator':
+            steps = self.verilator_rtlsteps
+        else:
+            self.print_log(type='F', msg='Model %s not supported' %(self.model))
+        self._rtlcmd = process_step.join(steps)
+        return steps
+
+    @property
+    def rtl_step_timeouts(self):
+        '''Dictionary of timeouts in seconds of the simulation steps by step name,
+        e.g. {'compile' : 600, 'simulate' : 3600}. Steps not listed run without a timeout.
+
+        '''
+        if not hasattr(self, '_rtl_step_timeouts'):
+            self._rtl_step_timeouts = dict()
+        return self._rtl_step_timeouts
+    @rtl_step_timeouts.setter
+    def rtl_step_timeouts(self, value):
+        self._rtl_step_timeouts = value
+
+    @property
+    def rtl_step_records(self):
+        '''Records of the steps of the latest simulation, with the wall clock time,
+        the user and system CPU times, and the peak memory of each step. See
+        `rtl.process_runner.process_runner.run`.
+
+        '''
+        if not hasattr(self, '_rtl_step_records'):
+            self._rtl_step_records = []
+        return self._rtl_step_records
+
+    @property
+    def rtl_profile(self):
+        '''`rtl.rtl_profile.rtl_profile` of the latest `run_rtl`, with the timing
+        of its stages and simulator steps, and the IO file sizes. See its `report` attribute.
+
+        '''
+        if not hasattr(self, '_rtl_profile'):
+            self._rtl_profile = rtl_profile()
+        return self._rtl_profile
+    @rtl_profile.setter
+    def rtl_profile(self, value):
+        self._rtl_profile = value
+
+    @property
+    def rtl_profile_file(self):
+        '''If set, the profile of `run_rtl` is exported to this file after the run.
+
+        Default: None
+
+        '''
+        if not hasattr(self, '_rtl_profile_file'):
+            self._rtl_profile_file = None
+        return self._rtl_profile_file
+    @rtl_profile_file.setter
+    def rtl_profile_file(self, value):
+        self._rtl_profile_file = value
+
+    @property
+    def rtl_profile_format(self):
+        '''Format of `rtl_profile_file`. 'json' (default) for the report,
+        'chrome' for the Chrome trace event format.
+
+        '''
+        if not hasattr(self, '_rtl_profile_format'):
+            self._rtl_profile_format = 'json'
+        return self._rtl_profile_format
+    @rtl_profile_format.setter
+    def rtl_profile_format(self, value):
+        self._rtl_profile_format = value
+
+    def cancel_rtl_sim(self):
+        '''Terminates a running simulation, e.g. from another thread.
+
+        '''
+        runner = getattr(self, '_rtl_runner', None)
+        if runner is not None:
+            runner.cancel()
+
     def create_connectors(self):
         '''Creates connector definitions from
            1) From a iofile that is provided in the Data
@@ -773,6 +1001,7 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
            self.iofile_bundle.Members[ioname].Data
 
         '''
+        from rtl.rtl_iofile import rtl_iofile
         for ioname,io in self.IOS.Members.items():
             if ioname in self.iofile_bundle.Members:
                 val=self.iofile_bundle.Members[ioname]
@@ -781,6 +1010,7 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
                         and val.dir == 'in':
                     # Data must be properly shaped
                     self.iofile_bundle.Members[ioname].Data=self.IOS.Members[ioname].Data
+                    val.invalidate_rtl_fragments()
 
     def extract_vlogfiles(self):
         """Return extracted verilog files from ``self.rtlfiles``
@@ -818,13 +1048,34 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
                         if ((val.datatype == 'sint' ) or (val.datatype == 'scomplex')):
                             self.tb.connectors.Members[assocname].type='signed'
                     self.tb.connectors.Members[assocname].ioformat=val.ioformat
+                # The connectors were modified in place
+                val.invalidate_rtl_fragments()
             else:
                 self.print_log(type='F',
                     msg='List of associated ionames not defined for IO %s\n. Provide it as list of strings' %(ioname))
 
+    @property
+    def rtl_staging(self):
+        """str : How the sources are staged to `rtlsimpath`.
+        'copy' (default) | 'symlink' | 'hardlink' | 'reflink'
+
+        'symlink' avoids copying altogether, the simulators read the original
+        sources. 'hardlink' and 'reflink' fall back to copying, if not supported
+        by the file system. See `rtl.rtl_staging`.
+
+        """
+        if not hasattr(self, '_rtl_staging'):
+            self._rtl_staging = 'copy'
+        return self._rtl_staging
+    @rtl_staging.setter
+    def rtl_staging(self, value):
+        if value not in staging.strategies:
+            self.print_log(type='F', msg='Unsupported rtl_staging %s' % value)
+        self._rtl_staging = value
+
     def copy_or_relink(self,**kwargs):
         ''' If the source is a symlink, create the target as a link to original target.
-        otherwise, copy the file.
+        otherwise, stage the file with `rtl_staging` strategy.
 
         Parameters
         ----------
@@ -832,23 +1083,31 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
             Path to source file
         dst : str
             Path to destination file.
+
+        Returns
+        -------
+        str
+            The strategy used, 'symlink' for relinked files.
         '''
         src=kwargs.get('src')
         dst=kwargs.get('dst')
         if os.path.islink(src):
-            if not os.path.islink(dst):
-                os.symlink(os.path.join(os.path.dirname(src), os.readlink(src)), dst)
-            else:
+            if os.path.lexists(dst):
                 os.remove(dst)
-                os.symlink(os.path.join(os.path.dirname(src), os.readlink(src)), dst)
+            os.symlink(os.path.join(os.path.dirname(src), os.readlink(src)), dst)
+            return 'symlink'
         else:
-            shutil.copyfile(src, dst, follow_symlinks=False)
+            return staging.stage_file(src, dst, self.rtl_staging)
 
     def copy_rtl_sources(self):
-        ''' Copy rtl sources to self.rtlsimpath
+        ''' Stage rtl sources to self.rtlsimpath
+
+        Sources recorded in the staging manifest of `rtlsimpath` are staged
+        again only if they have changed. Other existing files in `rtlsimpath`
+        are used as externally generated sources.
 
         '''
-        self.print_log(type='I', msg='Copying rtl sources to %s' % self.rtlsimpath)
+        self.print_log(type='I', msg='Staging rtl sources to %s' % self.rtlsimpath)
 
         vlog_model = self.model in ['sv', 'icarus', 'verilator']
         vhdl_model = self.model in ['ghdl', 'vhdl']
@@ -871,50 +1130,275 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
         if dut_bname not in self.rtlfiles:
             self.rtlfiles += [dut_bname]
 
-        # Copy files if they exist under sv/ or vhdl/
+        # Stage files if they exist under sv/ or vhdl/
+        manifest = staging.load_manifest(self.rtlsimpath)
+        staged = {}
         for modfile in self.rtlfiles:
             _, file_ext = os.path.splitext(modfile)
             lang = "vlog" if file_ext in [".v", ".sv"] else "vhdl"
             tgt_dir = self.vlogsrcpath if lang == "vlog" else self.vhdlsrcpath
             srcfile = os.path.join(tgt_dir, modfile)
             dstfile = os.path.join(self.rtlsimpath, modfile)
-            if os.path.isfile(dstfile):
+            entry = manifest.get(modfile)
+            if entry is None and os.path.isfile(dstfile):
                 self.print_log(type='I', msg='Using externally generated source: %s' % modfile)
+                continue
+            stamp = staging.source_stamp(srcfile) if os.path.exists(srcfile) else None
+            if (entry is not None and os.path.lexists(dstfile) and entry['stamp'] == stamp
+                    and entry.get('requested') == self.rtl_staging):
+                self.print_log(type='I', msg='Using unchanged staged source: %s' % modfile)
+                staged[modfile] = entry
             else:
-                self.print_log(type='I', msg='Copying %s to %s' % (srcfile, dstfile))
-                self.copy_or_relink(src=srcfile,dst=dstfile)
+                self.print_log(type='I', msg='Staging %s to %s' % (srcfile, dstfile))
+                strategy = self.copy_or_relink(src=srcfile,dst=dstfile)
+                staged[modfile] = { 'stamp' : stamp, 'strategy' : strategy,
+                        'requested' : self.rtl_staging }
+        if staged != manifest:
+            staging.save_manifest(self.rtlsimpath, staged)
         # Append testbench to rtlfiles
         if tb_bname not in self.rtlfiles:
             self.rtlfiles += [tb_bname]
-        # flush cached writes to disk
-        output = subprocess.check_output("sync %s" % self.rtlsimpath, shell=True)
-        output = output.decode('utf-8')
-        if len(output) != 0:
-            print(output)
+        # Flush the sources to disk
+        self.rtl_sync_files(files=[ os.path.join(self.rtlsimpath, modfile)
+            for modfile in self.rtlfiles ])
+
+    @property
+    def rtl_sync(self):
+        """str : Durability of the generated files. 'fsync' (default) | 'sync' | 'none'
+
+        - 'fsync' : The copied sources, the testbench and the input files are
+          flushed to disk with fsync, together with their directories.
+        - 'sync' : The generated files are flushed with the sync command,
+          and the compiled work library with a 'sync' step after the compilation.
+        - 'none' : Nothing is flushed. For local scratch directories, e.g. on
+          tmpfs, that are not shared with other hosts.
+
+        Nothing is flushed in the scratch directory of `rtl_scratch`.
+
+        """
+        if not hasattr(self, '_rtl_sync'):
+            self._rtl_sync = 'fsync'
+        return self._rtl_sync
+    @rtl_sync.setter
+    def rtl_sync(self, value):
+        if value not in [ 'fsync', 'sync', 'none' ]:
+            self.print_log(type='F', msg='Unsupported rtl_sync %s' % value)
+        self._rtl_sync = value
+
+    def rtl_sync_files(self, **kwargs):
+        ''' Flushes generated files to disk according to `rtl_sync`.
+        Files that do not exist are ignored.
+
+        Parameters
+        ----------
+        **kwargs :
+            files : list of str
+                Generated files
+
+        '''
+        # Scratch directories are not shared
+        if getattr(self, '_rtl_scratch_path', None):
+            return
+        files = [ file for file in kwargs.get('files', []) if os.path.lexists(file) ]
+        if self.rtl_sync == 'fsync':
+            dirs = set()
+            for file in files:
+                # Links are not followed to the original sources
+                if not os.path.islink(file):
+                    fd = os.open(file, os.O_RDONLY)
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                dirs.add(os.path.dirname(os.path.abspath(file)))
+            # Directory entries of the new files
+            for dir in dirs:
+                fd = os.open(dir, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        elif self.rtl_sync == 'sync' and files:
+            subprocess.check_call([ 'sync' ] + files)
+
+    @property
+    def rtl_scratch(self):
+        """False (default) | True | str
+
+        Run the simulation in a scratch directory on a local file system instead
+        of `simpath`. The sources, the testbench, the IO files and the compiled
+        work library are then all kept off the project file system. The scratch
+        directory is removed after the simulation. See `rtl_scratch_keep` for
+        the files copied back to `simpath`.
+
+        True places the scratch directory under thesdk.GLOBALS['RTLSCRATCHPATH'],
+        or /dev/shm if the variable is not set. A string gives the directory.
+        Not used with LSF submissions, or if the directory has less free space
+        than `rtl_scratch_minfree`.
+
+        """
+        if not hasattr(self, '_rtl_scratch'):
+            self._rtl_scratch = False
+        return self._rtl_scratch
+    @rtl_scratch.setter
+    def rtl_scratch(self, value):
+        self._rtl_scratch = value
+
+    @property
+    def rtl_scratch_root(self):
+        """str : Directory of the scratch directories, see `rtl_scratch`.
+
+        """
+        if isinstance(self.rtl_scratch, str):
+            return self.rtl_scratch
+        root = thesdk.GLOBALS.get('RTLSCRATCHPATH', '')
+        if not root:
+            root = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        return root
+
+    @property
+    def rtl_scratch_minfree(self):
+        """int : Minimum free space in bytes required for using `rtl_scratch`.
+        Default 1 GiB.
+
+        """
+        if not hasattr(self, '_rtl_scratch_minfree'):
+            self._rtl_scratch_minfree = 2**30
+        return self._rtl_scratch_minfree
+    @rtl_scratch_minfree.setter
+    def rtl_scratch_minfree(self, value):
+        self._rtl_scratch_minfree = value
+
+    @property
+    def rtl_scratch_keep(self):
+        """list of str : Glob patterns, relative to `simpath`, of the files copied
+        back from the scratch directory, e.g. ['rtl/*.vcd']. The contents of
+        `rtlsimpath` are copied back if `preserve_rtlfiles` is True, and the
+        IO files with their `preserve` attribute set. Default [].
+
+        """
+        if not hasattr(self, '_rtl_scratch_keep'):
+            self._rtl_scratch_keep = []
+        return self._rtl_scratch_keep
+    @rtl_scratch_keep.setter
+    def rtl_scratch_keep(self, value):
+        self._rtl_scratch_keep = value
+
+    def _reset_rtl_paths(self):
+        ''' Resets the paths derived from `simpath` after it has changed.
+
+        '''
+        for attr in [ '_rtlsimpath', '_rtlworkpath', '_simtb', '_simdut' ]:
+            self.__dict__.pop(attr, None)
+        for name, iofile in self.iofile_bundle.Members.items():
+            langmodules = [ getattr(iofile, attr, None) for attr in
+                    [ '_langmodule_verilog', '_langmodule_vhdl', '_langmodule_vpi' ] ]
+            for obj in [ iofile ] + langmodules:
+                if obj is not None:
+                    obj.__dict__.pop('_file', None)
+                    obj.__dict__.pop('_rtlparam', None)
+                    obj.__dict__.pop('_rtl_fragments', None)
+            for obj in langmodules:
+                if obj is not None:
+                    obj.file = iofile.file
+
+    def _enter_rtl_scratch(self):
+        ''' Moves `simpath` to a new scratch directory, if `rtl_scratch` is set.
+
+        '''
+        self._rtl_scratch_path = None
+        if not self.rtl_scratch:
+            return
+        if self.has_lsf:
+            self.print_log(type='W', msg='Scratch directories are not shared with LSF hosts, using %s' % self.simpath)
+            return
+        root = self.rtl_scratch_root
+        try:
+            os.makedirs(root, exist_ok=True)
+            free = shutil.disk_usage(root).free
+        except OSError as e:
+            self.print_log(type='W', msg='Scratch directory %s not available: %s' % (root, e))
+            return
+        if free < self.rtl_scratch_minfree:
+            self.print_log(type='W', msg='Only %d bytes free in %s, using %s' % (free, root, self.simpath))
+            return
+        self._rtl_project_simpath = self.simpath
+        self._rtl_scratch_path = tempfile.mkdtemp(prefix='%s_%s_' % (self.name, self.runname), dir=root)
+        self.print_log(type='I', msg='Using scratch directory %s' % self._rtl_scratch_path)
+        self._simpath = self._rtl_scratch_path
+        self._reset_rtl_paths()
+
+    def _exit_rtl_scratch(self):
+        ''' Copies the kept files back to the project `simpath`, removes the
+        scratch directory and restores the paths. Returns True if a scratch
+        directory was used.
+
+        The simulation files are removed with the scratch directory, so the
+        files of the project `simpath` are not cleaned up afterwards.
+
+        '''
+        scratch = getattr(self, '_rtl_scratch_path', None)
+        if not scratch:
+            return False
+        simpath = self._rtl_project_simpath
+        keep = []
+        for pattern in self.rtl_scratch_keep:
+            keep += glob.glob(os.path.join(scratch, pattern), recursive=True)
+        if self.preserve_rtlfiles and os.path.isdir(self.rtlsimpath):
+            keep.append(self.rtlsimpath)
+        keep += [ file.file for name, file in self.iofile_bundle.Members.items()
+                if getattr(file, 'preserve', False) and os.path.isfile(file.file) ]
+        for path in keep:
+            target = os.path.join(simpath, os.path.relpath(path, scratch))
+            self.print_log(type='I', msg='Keeping %s' % target)
+            if os.path.isdir(path):
+                shutil.copytree(path, target, symlinks=True, dirs_exist_ok=True)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copy2(path, target, follow_symlinks=False)
+        shutil.rmtree(scratch, ignore_errors=True)
+        self._rtl_scratch_path = None
+        self._simpath = simpath
+        self._reset_rtl_paths()
+        return True
+
+    @property
+    def rtl_filetimeout(self):
+        """float : Timeout in seconds for the IO files to appear.
+
+        Input files are checked before the simulator is launched, and output
+        files once the simulator process has exited. Default 60.
+
+        """
+        if not hasattr(self, '_rtl_filetimeout'):
+            self._rtl_filetimeout = 60
+        return self._rtl_filetimeout
+    @rtl_filetimeout.setter
+    def rtl_filetimeout(self, value):
+        self._rtl_filetimeout = value
 
     def execute_rtl_sim(self):
         '''Runs the rtl simulation in external simulator
 
+        Completion is determined by the exit status of the simulator
+        process. The output files are then waited for with
+        `rtl.file_watcher.wait_for_files` for at most `rtl_filetimeout` seconds.
+        IO files with `iomode` 'fifo' or 'vpi' are streamed while the simulator runs.
+
         '''
-        filetimeout=60 #File appearance timeout in seconds
-        count=0
-        files_ok=False
-        while not files_ok:
-            count +=1
-            if count >filetimeout:
-                self.print_log(type='F', msg='Verilog infile writing timeout')
-            for name, file in self.iofile_bundle.Members.items():
-                if file.dir=='in':
-                    files_ok=True
-                    files_ok=files_ok and os.path.isfile(file.file)
-            time.sleep(int(1)) #Wait for one second
+        streams=[ file for name, file in self.iofile_bundle.Members.items()
+                if file.iomode!='file' ]
+        infiles=[ file.file for name, file in self.iofile_bundle.Members.items()
+                if file.dir=='in' and file.iomode=='file' ]
+        if wait_for_files(files=infiles, timeout=self.rtl_filetimeout):
+            self.print_log(type='F', msg='Verilog infile writing timeout')
 
         #Remove existing output files before execution
         for name, file in self.iofile_bundle.Members.items():
-            if file.dir=='out':
+            if file.dir=='out' and file.iomode=='file':
                 try:
                     #Still keep the file in the infiles list
-                    os.remove(file.name)
+                    os.remove(file.file)
                 except:
                     pass
 
@@ -931,27 +1415,39 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
             else:
                 self.print_log(type='I', msg=f"Executing in directory {self.rtlsimpath}")
                 execpath=self.rtlsimpath
-            self.print_log(type='I', msg="Running external command %s\n" %(self.rtlcmd) )
-            rtlcmd = f"cd {execpath} && {self._rtlcmd}"
-            output = subprocess.check_output(rtlcmd, shell=True)
-            self.print_log(type='I', msg='Simulator output:\n'+output.decode('utf-8'))
-        except subprocess.CalledProcessError as e:
-            output = e.output
-            self.print_log(type='F', msg='Simulator output:\n'+output.decode('utf-8'))
-
-
-        count=0
-        files_ok=False
-        while not files_ok:
-            count +=1
-            if count >filetimeout:
-                self.print_log(type='F', msg="Verilog outfile timeout")
-            time.sleep(int(1))
-            for name, file in self.iofile_bundle.Members.items():
-                if file.dir=='out':
-                    files_ok=True
-                    files_ok=files_ok and os.path.isfile(file.file)
-
+            steps = self.rtlsteps
+            self.print_log(type='I', msg="Running external command %s\n" %(self._rtlcmd) )
+            for step in steps:
+                if step.timeout is None:
+                    step.timeout = self.rtl_step_timeouts.get(step.name)
+            self._rtl_runner = process_runner(cwd=execpath,
+                    log=lambda line: self.print_log(type='I', msg=line))
+            self._rtl_step_records = self._rtl_runner.records
+            for file in streams:
+                file.start_stream()
+            for step in steps:
+                self.print_log(type='I', msg='Running %s step: %s' %(step.name, step))
+                record = self._rtl_runner.run_step(step)
+                self.print_log(type='I', msg='Step %s finished in %.2f s, CPU %.2f s' %(step.name,
+                    record['wall'], record['user'] + record['system']))
+        except subprocess.SubprocessError as e:
+            output = e.output or b''
+            for file in streams:
+                file.finish_stream(check=False)
+            self.rtl_compile_cache_release()
+            self.print_log(type='F', msg='%s\nSimulator output:\n%s' %(e, output.decode('utf-8')))
+        finally:
+            if getattr(self, '_rtl_runner', None) is not None:
+                self.rtl_profile.add_steps(self._rtl_runner.records)
+            self._rtl_runner = None
+
+        for file in streams:
+            file.finish_stream()
+        outfiles=[ file.file for name, file in self.iofile_bundle.Members.items()
+                if file.dir=='out' and file.iomode=='file' ]
+        missing=wait_for_files(files=outfiles, timeout=self.rtl_filetimeout)
+        if missing:
+            self.print_log(type='F', msg="Verilog outfile timeout: %s" %(', '.join(missing)))
 
     @property
     def assignment_matchlist(self):
@@ -1010,30 +1506,99 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
             # Loading a previously stored state
             self._read_state()
         else:
-            self.copy_rtl_sources()
-            self.tb=vtb(parent=self,lang=self.lang)
-            self.tb.define_testbench()
-            self.add_connectors()
-            self.create_connectors()
-            self.connect_inputs()
-            if hasattr(self,'define_io_conditions'):
-                self.define_io_conditions()   # Local, this is dependent on how you
-                                              # control the simulation
-                                              # i.e. when you want to read an write your IO's
-            self.format_ios()
-            self.tb.generate_contents()
-            self.tb.export(force=True)
-            self.write_infile()
-            self.execute_rtl_sim()
-            self.read_outfile()
-            self.connect_outputs()
-            # Save entity state
-            if self.save_state:
-                self._write_state()
-            # Clean simulation results
-            self.delete_iofile_bundle()
-            self.delete_rtlworkpath()
-            self.delete_rtlsimpath()
+            from rtl.testbench import testbench as vtb
+            self.rtl_profile=rtl_profile()
+            span=self.rtl_profile.span
+            with span('run_rtl'):
+                self._enter_rtl_scratch()
+                try:
+                    with span('copy_rtl_sources'):
+                        self.copy_rtl_sources()
+                    with span('define_testbench'):
+                        self.tb=vtb(parent=self,lang=self.lang)
+                        self.tb.define_testbench()
+                        self.add_connectors()
+                        self.create_connectors()
+                        self.connect_inputs()
+                        if hasattr(self,'define_io_conditions'):
+                            self.define_io_conditions()   # Local, this is dependent on how you
+                                                          # control the simulation
+                                                          # i.e. when you want to read an write your IO's
+                        self.format_ios()
+                    with span('generate_testbench'):
+                        self.tb.generate_contents()
+                        self.tb.export(force=True)
+                        self.rtl_sync_files(files=[ self.simtb ])
+                    with span('write_infile'):
+                        self.write_infile()
+                    with span('execute_rtl_sim'):
+                        self.execute_rtl_sim()
+                    for name, file in self.iofile_bundle.Members.items():
+                        self.rtl_profile.add_file(name=name, file=file.file, dir=file.dir)
+                    with span('read_outfile'):
+                        self.read_outfile()
+                        self.connect_outputs()
+                finally:
+                    # The compile cache entry is released also after a failure,
+                    # so that the next run looks it up again
+                    self.rtl_compile_cache_release()
+                    # Kept files are copied back and the scratch directory removed
+                    scratch = self._exit_rtl_scratch()
+                # Save entity state
+                if self.save_state:
+                    with span('save_state'):
+                        self._write_state()
+                # Clean simulation results. The results in a scratch directory
+                # were removed with it, and the kept files must stay.
+                with span('cleanup'):
+                    if not scratch:
+                        self.delete_iofile_bundle()
+                        self.delete_rtlworkpath()
+                        self.delete_rtlsimpath()
+            if self.rtl_profile_file:
+                self.rtl_profile.export(file=self.rtl_profile_file, format=self.rtl_profile_format)
+
+    def run_rtl_batch(self,**kwargs):
+        '''Runs variants of this entity concurrently in a `simulation_pool`.
+
+        Each variant is a copy of this entity with its own runname and
+        `rtlsimpath`. This entity itself is not simulated.
+
+        Parameters
+        ----------
+        **kwargs :
+            rtlparameters : list of dict
+                `rtlparameters` of each variant, updating the ones of this entity.
+            iodata : list of dict
+                Input data of each variant as {ioname : Data}.
+            max_workers : int
+                Maximum number of concurrent simulations. Default is the
+                number of available cores.
+            method : str, 'run_rtl'
+                Method executed for each variant.
+
+        Returns
+        -------
+        list
+            The simulated variants. Outputs are in their IOS.
+
+        '''
+        parameters=kwargs.get('rtlparameters',[])
+        iodata=kwargs.get('iodata',[])
+        if parameters and iodata and len(parameters) != len(iodata):
+            self.print_log(type='F', msg='rtlparameters and iodata variant lists differ in length.')
+        pool=simulation_pool(max_workers=kwargs.get('max_workers',None),
+                method=kwargs.get('method','run_rtl'))
+        variants=[]
+        for index in range(max(len(parameters),len(iodata))):
+            variant=pool.clone(entity=self,runname='%s_%d' % (self.runname,index))
+            if parameters:
+                variant.rtlparameters=dict(self.rtlparameters, **parameters[index])
+            if iodata:
+                for name, data in iodata[index].items():
+                    variant.IOS.Members[name].Data=data
+            variants.append(variant)
+        return pool.run(entities=variants)
 
     #This writes all infile
     def write_infile(self):
@@ -1041,8 +1606,15 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
 
         '''
         for name, val in self.iofile_bundle.Members.items():
-            if val.dir=='in':
+            if val.iomode=='fifo' and self.has_lsf:
+                self.print_log(type='W', msg='Named pipes are not shared with LSF hosts, using file IO for %s' %(name))
+                val.iomode='file'
+            elif val.iomode=='vpi' and self.has_lsf:
+                self.print_log(type='F', msg='VPI IO of %s requires local simulation' %(name))
+            if val.dir=='in' and val.iomode=='file':
                 self.iofile_bundle.Members[name].write()
+        self.rtl_sync_files(files=[ val.file for name, val in self.iofile_bundle.Members.items()
+            if val.dir=='in' and val.iomode=='file' ])
 
     #This reads all outfiles
     def read_outfile(self):
@@ -1050,7 +1622,8 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
 
         '''
         for name, val in self.iofile_bundle.Members.items():
-            if val.dir=='out':
+            # Streamed outputs are read during the simulation
+            if val.dir=='out' and val.iomode=='file':
                  self.iofile_bundle.Members[name].read()
 
     def connect_outputs(self):
@@ -1061,3 +1634,6 @@ class rtl(questasim,icarus,verilator,ghdl,vhdl,sv,thesdk,metaclass=abc.ABCMeta):
             if val.dir=='out':
                 self.IOS.Members[name].Data=self.iofile_bundle.Members[name].Data
 
+# `from rtl import *` exports the public names of the package, including
+# the ones imported on first access, which it then imports.
+__all__ = [ name for name in globals() if not name.startswith('_') ] + list(_lazy_attributes)
@@ -0,0 +1,100 @@
+"""
+============
+Code emitter
+============
+Buffer for generating the code of the testbenches and the IO files.
+
+The code is collected as a list of fragments and joined once, when
+requested, instead of concatenating strings. Indentation is tracked
+structurally with `block`, and every fragment is indented as it is
+added, so that the time of the generation is linear in the size of
+the generated code.
+
+Example
+-------
+
+    ::
+
+        out=code_emitter()
+        out.indent(text='initial begin')
+        with out.block():
+            out.indent(text='reset = 1;')
+        out.indent(text='end')
+        code=out.getvalue()
+
+"""
+from contextlib import contextmanager
+
+class code_emitter:
+    ''' Code buffer with structural indentation.
+
+    Parameters
+    ----------
+    level : int
+        Initial level of indentation. Default 0
+    nspaces : int
+        Number of spaces per level. Default 4
+
+    '''
+    def __init__(self, **kwargs):
+        self.level=kwargs.get('level',0)
+        self.nspaces=kwargs.get('nspaces',4)
+        self._parts=[]
+
+    def write(self, text):
+        ''' Adds `text` as is, without indentation.
+
+        '''
+        self._parts.append(text)
+
+    def indent(self, **kwargs):
+        ''' Adds a text block indented to the current level of the buffer
+        plus `level`, with a newline after every line, including the last
+        one. Equivalent to `rtl.connector.indent`.
+
+        Parameters
+        ----------
+        **kwargs :
+            text  : text to indent (may allow line breaks)
+            level : additional level of indent. Default 0
+
+        '''
+        text=kwargs.get('text','')
+        level=self.level+kwargs.get('level',0)
+        if not text:
+            return
+        spaces=' '*self.nspaces*level
+        self._parts.append(''.join([ spaces+line+'\n' for line in text.splitlines() ]))
+
+    @contextmanager
+    def block(self, level=1):
+        ''' Context in which the indentation level of the buffer is
+        increased by `level`.
+
+        '''
+        self.level+=level
+        try:
+            yield self
+        finally:
+            self.level-=level
+
+    def getvalue(self):
+        ''' Returns the code generated so far.
+
+        '''
+        if len(self._parts) > 1:
+            self._parts=[ ''.join(self._parts) ]
+        return self._parts[0] if self._parts else ''
+
+    def dump(self, file):
+        ''' Writes the generated code to an open file, without joining
+        the fragments.
+
+        '''
+        file.writelines(self._parts)
+
+    def __str__(self):
+        return self.getvalue()
+
+    def __len__(self):
+        return sum(len(part) for part in self._parts)
@@ -0,0 +1,268 @@
+"""
+=============
+Compile cache
+=============
+Compile cache is a mixin class providing a persistent, content addressed
+cache of compiled simulation libraries and executables for the RTL class.
+
+The cache key is the sha256 digest of the simulation model, the simulator
+version, the compilation arguments, `rtlparameters` and the contents of
+the compiled source files. On a cache hit the simulator specific compile
+steps are skipped, and the simulation is run from the cached work
+directory. Entries are pruned in least recently used order.
+
+An entry is compiled while holding an exclusive `flock` on its lock file,
+`.thesdk_lock`. The lock is released by the operating system also if the
+compiling process is killed, so an entry without the completion marker
+that is not locked has been abandoned, and is taken over by the next
+compilation with the same key, or removed by pruning.
+
+"""
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+from thesdk import *
+from rtl.rtl_cache_common import rtl_cache_root, file_digest, simulator_version
+
+class compile_cache(thesdk):
+
+    @property
+    def rtl_compile_cache(self):
+        ''' True | False (default)
+
+        If True, compiled work libraries are stored in
+        `rtl_compile_cache_path` and reused by later simulations with
+        identical sources, compile arguments, parameters and simulator version.
+
+        '''
+        if not hasattr(self, '_rtl_compile_cache'):
+            self._rtl_compile_cache = False
+        return self._rtl_compile_cache
+    @rtl_compile_cache.setter
+    def rtl_compile_cache(self, value):
+        self._rtl_compile_cache = value
+
+    @property
+    def rtl_compile_cache_path(self):
+        ''' Root directory of the compile cache.
+
+        Default: `rtl_cache_root()/compile`
+
+        '''
+        if not hasattr(self, '_rtl_compile_cache_path'):
+            self._rtl_compile_cache_path = os.path.join(rtl_cache_root(), 'compile')
+        return self._rtl_compile_cache_path
+    @rtl_compile_cache_path.setter
+    def rtl_compile_cache_path(self, value):
+        self._rtl_compile_cache_path = value
+
+    @property
+    def rtl_compile_cache_entries(self):
+        ''' Maximum number of cached compilations kept per simulation model.
+        Least recently used entries are removed first. Default 16.
+
+        '''
+        if not hasattr(self, '_rtl_compile_cache_entries'):
+            self._rtl_compile_cache_entries = 16
+        return self._rtl_compile_cache_entries
+    @rtl_compile_cache_entries.setter
+    def rtl_compile_cache_entries(self, value):
+        self._rtl_compile_cache_entries = value
+
+    @property
+    def rtl_compile_cache_hit(self):
+        ''' True if the current work directory was found from the compile cache.
+        Valid after `rtl_compile_cache_lookup`.
+
+        '''
+        if not hasattr(self, '_rtl_compile_cache_hit'):
+            self._rtl_compile_cache_hit = False
+        return self._rtl_compile_cache_hit
+
+    @property
+    def rtl_compile_cache_marker(self):
+        ''' File marking a completed compilation in a cache entry.
+        Touched by the compile command on a cache miss.
+
+        '''
+        return os.path.join(self.rtlworkpath, '.thesdk_compiled')
+
+    def _rtl_compile_cache_lock(self, entry):
+        ''' Takes the lock of a cache entry without blocking.
+
+        Returns
+        -------
+        file or None
+            The open lock file, or None if the entry is locked by another
+            process, or was removed.
+
+        '''
+        try:
+            lock = open(os.path.join(entry, '.thesdk_lock'), 'w')
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        return lock
+
+    def rtl_compile_cache_key(self, **kwargs):
+        ''' Digest identifying a compilation.
+
+        Parameters
+        ----------
+        **kwargs :
+            files : list of str
+                Source files compiled.
+            version : list of str
+                Command printing the simulator version.
+            extra : list
+                Additional items affecting the compilation, e.g. fixed compiler flags.
+            runtime_files : bool, False
+                If True, IO file paths are masked from the source digests. Use
+                only when the simulator overrides them at run time.
+
+        '''
+        files = kwargs.get('files', [])
+        replace = []
+        if kwargs.get('runtime_files', False):
+            for name, iofile in self.iofile_bundle.Members.items():
+                replace.append((iofile.file.encode('utf-8'),
+                    ('<iofile:%s>' % name).encode('utf-8')))
+        items = {
+                'model' : self.model,
+                'version' : simulator_version(kwargs.get('version', [])),
+                'vlogcompargs' : list(self.vlogcompargs),
+                'vhdlcompargs' : list(self.vhdlcompargs),
+                'rtlparameters' : sorted([ (str(k), str(v)) for k, v in self.rtlparameters.items() ]),
+                'extra' : [ str(item) for item in kwargs.get('extra', []) ],
+                'files' : [ (os.path.basename(f), file_digest(f, replace=replace)) for f in files ],
+                }
+        return hashlib.sha256(json.dumps(items).encode('utf-8')).hexdigest()
+
+    def rtl_compile_cache_lookup(self, **kwargs):
+        ''' Selects the work directory for the current compilation.
+
+        On a hit, the cached work directory is used and
+        `rtl_compile_cache_hit` is set to True. On a miss, the cache entry
+        is locked, and the compile command is expected to touch
+        `rtl_compile_cache_marker` after a successful compilation. An entry
+        abandoned by an earlier compilation is cleared and compiled again.
+        If the entry is being compiled by another process, a private work
+        directory is used instead.
+
+        Parameters
+        ----------
+        **kwargs :
+            See `rtl_compile_cache_key`
+
+        Returns
+        -------
+        str
+            The work directory, also returned by `rtlworkpath` for the rest of the simulation.
+
+        '''
+        if not self.rtl_compile_cache:
+            self._rtl_compile_cache_hit = False
+            return self.rtlworkpath
+        if hasattr(self, '_rtl_compile_cache_workpath'):
+            return self._rtl_compile_cache_workpath
+        modelpath = os.path.join(self.rtl_compile_cache_path, self.model)
+        entry = os.path.join(modelpath, self.rtl_compile_cache_key(**kwargs))
+        marker = os.path.join(entry, '.thesdk_compiled')
+        self._rtl_compile_cache_hit = False
+        self._rtl_compile_cache_owner = False
+        self._rtl_compile_cache_private = False
+        if os.path.isfile(marker):
+            self.print_log(type='I', msg='Using cached compilation %s' % entry)
+            os.utime(marker)
+            self._rtl_compile_cache_hit = True
+        else:
+            self.rtl_compile_cache_prune(path=modelpath)
+            os.makedirs(entry, exist_ok=True)
+            lock = self._rtl_compile_cache_lock(entry)
+            if lock is None:
+                self.print_log(type='W', msg='Cache entry %s is being compiled elsewhere, compiling privately.' % entry)
+                self._rtl_compile_cache_private = True
+                entry = self.simpath + '/work'
+            elif os.path.isfile(marker):
+                # Completed by another process after the marker was checked
+                lock.close()
+                self._rtl_compile_cache_hit = True
+            else:
+                # Remove the files of an abandoned compilation
+                for name in os.listdir(entry):
+                    path = os.path.join(entry, name)
+                    if name == '.thesdk_lock':
+                        continue
+                    elif os.path.isdir(path) and not os.path.islink(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.remove(path)
+                self.print_log(type='I', msg='Compiling to cache entry %s' % entry)
+                self._rtl_compile_cache_owner = True
+                self._rtl_compile_cache_lockfile = lock
+        self._rtl_compile_cache_workpath = entry
+        return entry
+
+    def rtl_compile_cache_prune(self, **kwargs):
+        ''' Removes the least recently used complete entries exceeding
+        `rtl_compile_cache_entries`, and the abandoned incomplete ones.
+
+        Parameters
+        ----------
+        **kwargs :
+            path : str
+                Directory containing the entries of one simulation model.
+
+        '''
+        path = kwargs.get('path')
+        if not os.path.isdir(path):
+            return
+        entries = []
+        for name in os.listdir(path):
+            entry = os.path.join(path, name)
+            marker = os.path.join(entry, '.thesdk_compiled')
+            if os.path.isfile(marker):
+                entries.append((os.path.getmtime(marker), entry))
+            elif os.path.isdir(entry):
+                lock = self._rtl_compile_cache_lock(entry)
+                if lock is not None:
+                    self.print_log(type='D', msg='Removing abandoned compile cache entry %s' % entry)
+                    shutil.rmtree(entry, ignore_errors=True)
+                    lock.close()
+        entries.sort()
+        # Leave room for the entry about to be compiled
+        for _, entry in entries[:max(0, len(entries) - self.rtl_compile_cache_entries + 1)]:
+            self.print_log(type='D', msg='Pruning compile cache entry %s' % entry)
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def rtl_compile_cache_release(self):
+        ''' Forgets the work directory and the hit of the current simulation.
+        An incomplete entry reserved by this simulation is removed.
+
+        Returns
+        -------
+        bool
+            True if `rtlworkpath` is a cache entry that must be kept.
+
+        '''
+        self._rtl_compile_cache_hit = False
+        if not hasattr(self, '_rtl_compile_cache_workpath'):
+            return False
+        entry = self._rtl_compile_cache_workpath
+        keep = ( not self._rtl_compile_cache_private
+                and os.path.isfile(os.path.join(entry, '.thesdk_compiled')) )
+        if self._rtl_compile_cache_owner and not keep:
+            shutil.rmtree(entry, ignore_errors=True)
+        lock = self.__dict__.pop('_rtl_compile_cache_lockfile', None)
+        if lock is not None:
+            lock.close()
+        del self._rtl_compile_cache_workpath
+        self._rtl_compile_cache_owner = False
+        self._rtl_compile_cache_private = False
+        return keep
@@ -0,0 +1,124 @@
+"""
+=================
+Compile scheduler
+=================
+Parallel compilation of RTL source files.
+
+The compile commands of the source files form a dependency graph, where
+a file depends on the earlier files providing the packages, entities
+and modules it refers to. Files without mutual dependencies are
+compiled in parallel, each file as soon as its dependencies are
+compiled. Dependencies are only taken from earlier files, so the given
+compile order is always a valid schedule.
+
+The schedule is stored in a JSON file, and run as a script from the
+simulation command::
+
+    python compile_scheduler.py [-j <jobs>] <plan.json>
+
+This module uses only the standard library, so that it can be run with
+any Python interpreter.
+
+"""
+import re
+import sys
+import json
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+_verilog_comment = re.compile(r'//[^\n]*|/\*.*?\*/', re.S)
+_verilog_provides = re.compile(
+        r'^\s*(?:module|macromodule|package|interface|program)\s+(?:automatic\s+|static\s+)?(\w+)',
+        re.M)
+_verilog_requires = re.compile(r'\b(\w+)\s*::')
+
+def verilog_units(text):
+    ''' Returns the sets of the modules, packages and interfaces a Verilog source
+    provides, and the packages it requires at compile time.
+
+    '''
+    text = _verilog_comment.sub('', text)
+    provides = set(_verilog_provides.findall(text))
+    requires = set(_verilog_requires.findall(text)) - provides
+    return provides, requires
+
+def compile_dag(units):
+    ''' Dependencies of the source files.
+
+    Parameters
+    ----------
+    units : list of (set, set)
+        Units provided and required by each source file, in compile order.
+
+    Returns
+    -------
+    list of list of int
+        Indices of the earlier files each file depends on.
+
+    '''
+    providers = {}
+    deps = []
+    for index, (provides, requires) in enumerate(units):
+        deps.append(sorted({ providers[unit] for unit in requires if unit in providers }))
+        for unit in provides:
+            providers.setdefault(unit, index)
+    return deps
+
+def run_plan(plan, jobs):
+    ''' Runs the compile commands of a plan with at most `jobs` in parallel.
+    Stops starting new commands after the first failure.
+
+    Parameters
+    ----------
+    plan : list of dict
+        Items with 'cmd', the shell command, and 'deps', the indices of the
+        items that must complete first.
+    jobs : int
+        Number of parallel commands.
+
+    Returns
+    -------
+    int
+        Return code of the first failed command, 0 on success.
+
+    '''
+    done = set()
+    started = set()
+    running = {}
+    failure = 0
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        while len(done) < len(plan):
+            if not failure:
+                for index, item in enumerate(plan):
+                    if (index not in started and len(running) < jobs
+                            and all(dep in done for dep in item['deps'])):
+                        started.add(index)
+                        running[executor.submit(subprocess.run, item['cmd'], shell=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)] = index
+            if not running:
+                break
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = running.pop(future)
+                result = future.result()
+                sys.stdout.write(result.stdout.decode('utf-8', 'replace'))
+                sys.stdout.flush()
+                if result.returncode:
+                    failure = failure or result.returncode
+                    sys.stderr.write('Compile command failed: %s\n' % plan[index]['cmd'])
+                else:
+                    done.add(index)
+    return failure
+
+def main():
+    parser = argparse.ArgumentParser(description='Run compile commands in dependency order.')
+    parser.add_argument('-j', '--jobs', type=int, default=1)
+    parser.add_argument('plan')
+    args = parser.parse_args()
+    with open(args.plan) as infile:
+        plan = json.load(infile)
+    sys.exit(run_plan(plan, args.jobs))
+
+if __name__=="__main__":
+    main()
@@ -10,11 +10,19 @@ returns definition strings according to given 'lang' paramenter
 Written by Marko Kosunen 20190109 marko.kosunen@aalto.fi
 """
 import os
+import re
+import functools
+from copy import copy, deepcopy
 from thesdk import *
 from rtl.sv.verilog_connector import verilog_connector
 from rtl.vhdl.vhdl_connector import vhdl_connector
 
 class rtl_connector(thesdk):
+    # Connectors are created for every IO of every module. Attributes
+    # are stored in slots to keep them small and fast to copy.
+    __slots__ = ( '_name', '_lang', '_cls', '_ll', '_rl', '_init', '_connect',
+            '_typearg', '_width', '_verilog_langobject', '_vhdl_langobject' )
+
     def __init__(self, **kwargs):
         ''' Executes init of module_common, thus having the same attributes and
         parameters.
@@ -245,6 +253,45 @@ class rtl_connector(thesdk):
         value=kwargs.get('value',self.connect.name)
         return self.langobject.bassign(time=time,value=value)
 
+    def clone(self, memo=None):
+        '''Returns a copy of the connector, equivalent to `copy.deepcopy`.
+
+        The connector this connector is connected to is cloned too. The
+        language objects are copied shallowly, as their attributes are
+        strings.
+
+        Parameters
+        ----------
+        memo : dict
+            Memo dictionary of `copy.deepcopy`. Default None
+
+        '''
+        if memo is None:
+            memo={}
+        if id(self) in memo:
+            return memo[id(self)]
+        cls=self.__class__
+        new=cls.__new__(cls)
+        memo[id(self)]=new
+        for slot in rtl_connector.__slots__:
+            try:
+                value=getattr(self,slot)
+            except AttributeError:
+                continue
+            if slot == '_connect':
+                value=deepcopy(value,memo)
+            elif slot in [ '_verilog_langobject', '_vhdl_langobject' ]:
+                value=copy(value)
+                value.parent=new
+            setattr(new,slot,value)
+        # Attributes of subclasses and attributes set by the user
+        if self.__dict__:
+            new.__dict__.update(deepcopy(self.__dict__,memo))
+        return new
+
+    def __deepcopy__(self, memo):
+        return self.clone(memo)
+
 class rtl_connector_bundle(Bundle):
     def __init__(self,**kwargs):
         super().__init__(**kwargs)
@@ -289,52 +336,92 @@ class rtl_connector_bundle(Bundle):
         self.Members[to]=self.Members.pop(fro)
         self.Members[to].name=to
 
+    def matching(self,**kwargs):
+        '''Names of the members matching a regular expression, in the order
+        of the members. A list of expressions is matched in one pass.
+
+        Parameters
+        ----------
+        **kwargs :
+            match : str | list(str)
+                Regular expression, or a list of them of which any must
+                match. Default r".*"
+            full : Bool
+                Match the whole name as `re.fullmatch`, instead of the
+                beginning of it as `re.match`. Default False
+
+        '''
+        matcher=_matcher(_patterns(kwargs.get('match',r".*")),kwargs.get('full',False))
+        return [ name for name in self.Members if matcher(name) ]
+
     def connect(self,**kwargs):
+        '''Connects the members matching `match` (str or list of str, see
+        `matching`) to the member named `connect`.
+
+        '''
         #[TODO]: Write sanity checks
         match=kwargs.get('match',r".*")  #By default, connect all
         conname=kwargs.get('connect')
-        for name, value in self.Members.items():
-            if re.match(match,name):
-                value.connect=self.Members[conname]
+        for name in self.matching(match=match):
+            self.Members[name].connect=self.Members[conname]
 
     def init(self,**kwargs):
+        '''Sets the initial value of the members matching `match` (str or
+        list of str, see `matching`) to `init`.
+
+        '''
         #[TODO]: Write sanity checks
         match=kwargs.get('match',r".*")  #By default, connect all
         initval=kwargs.get('init','')
-        for name, value in self.Members.items():
-            if re.match(match,name):
-                value.init=initval
+        for name in self.matching(match=match):
+            self.Members[name].init=initval
 
     def assign(self,**kwargs):
+        '''Assignment strings of the members whose names fully match `match`.
+
+        If `match` is a list, the members are matched against all of the
+        expressions in one pass. The assignments are grouped in the order
+        of the list, and a member matching several expressions is assigned
+        for each of them.
+
+        '''
         #[TODO]: Write sanity checks
         match=kwargs.get('match',r".*") #By default, assign all
-        assignments=''
-        for name, value in self.Members.items():
-            if re.fullmatch(match,name):
-                assignments=assignments+value.assignment
-        return indent(text=assignments, level=kwargs.get('level',0))
+        level=kwargs.get('level',0)
+        if not isinstance(match,(list,tuple)):
+            assignments=[ self.Members[name].assignment
+                    for name in self.matching(match=match,full=True) ]
+            return indent(text=''.join(assignments), level=level)
+        patterns=_patterns(match)
+        matchers=[ _matcher((pattern,),True) for pattern in patterns ]
+        groups=[ [] for pattern in patterns ]
+        for name in self.matching(match=patterns,full=True):
+            value=self.Members[name]
+            for group, matcher in zip(groups,matchers):
+                if matcher(name):
+                    group.append(value.assignment)
+        return ''.join([ indent(text=''.join(group), level=level) for group in groups ])
 
     def rtl_inits(self,**kwargs):
         """Initialization strings for the coonectors to be used in creating testbench.
 
         """
         #[TODO]: Write sanity checks
-        inits=''
+        inits=[]
         match=kwargs.get('match',r".*") #By default, assign all
-        for name, val in self.Members.items():
-            if re.match(match,name) and ( val.init is not None and val.init != '' ):
+        for name in self.matching(match=match):
+            val=self.Members[name]
+            if val.init is not None and val.init != '':
                 #inits=inits+'%s = %s;\n' %(val.name,val.init)
-                inits=inits+val.initialization
-        return indent(text=inits, level=kwargs.get('level',0))
+                inits.append(val.initialization)
+        return indent(text=''.join(inits), level=kwargs.get('level',0))
 
     def list(self,**kwargs):
         #[TODO]: Write sanity checks
         names=kwargs.get('names','')
-        connectors=[]
-        if names:
-            for name in names:
-                connectors.append(self.Members[name])
-        return connectors
+        if not names:
+            return []
+        return [ self.Members[name] for name in names ]
 
 class verilog_connector_bundle(rtl_connector_bundle,thesdk):
     def __init__(self,**kwargs):
@@ -351,15 +438,41 @@ class verilog_connector_bundle(rtl_connector_bundle,thesdk):
     def verilog_inits(self,**kwargs):
         """ Obsolete method to retain backwards compatibility use 'rtl_inits instead'
         """
-        #[TODO]: Write sanity checks
-        inits=''
-        match=kwargs.get('match',r".*") #By default, assign all
-        for name, val in self.Members.items():
-            if re.match(match,name) and ( val.init is not None and val.init != '' ):
-                #inits=inits+'%s = %s;\n' %(val.name,val.init)
-                inits=inits+val.initialization
         #self.print_log(type='O', msg = 'verilog_inits is obsolete. Use rtl_inits instead')
-        return indent(text=inits, level=kwargs.get('level',0))
+        return self.rtl_inits(**kwargs)
+
+def _patterns(match):
+    '''Tuple of the regular expressions given as `match`, a single
+    expression or a list of them.
+
+    '''
+    if isinstance(match,(list,tuple)):
+        return tuple(match)
+    return (match,)
+
+@functools.lru_cache(maxsize=256)
+def _matcher(patterns,full=False):
+    '''Function returning a true value if any of the regular expressions
+    `patterns` (tuple) matches a name. The expressions are combined to a
+    single one if possible.
+
+    '''
+    compiled=[ re.compile(pattern) for pattern in patterns ]
+    method='fullmatch' if full else 'match'
+    if not compiled:
+        return lambda name: False
+    if len(compiled)==1:
+        return getattr(compiled[0],method)
+    # Groups would be renumbered in the combined expression
+    if all([ isinstance(pattern,str) for pattern in patterns ]) \
+            and all([ regex.groups==0 for regex in compiled ]):
+        try:
+            combined=re.compile('|'.join([ '(?:%s)' %(pattern) for pattern in patterns ]))
+            return getattr(combined,method)
+        except re.error:
+            pass
+    methods=[ getattr(regex,method) for regex in compiled ]
+    return lambda name: any([ match(name) for match in methods ])
 
 #Helper to indent text blocks
 def indent(**kwargs):
@@ -375,11 +488,8 @@ def indent(**kwargs):
     text = kwargs.get('text', '')
     nspaces = 4
     level = kwargs.get('level', 0)
-    textout=''
-    for line in text.splitlines():
-        spaces = ' ' * nspaces*level
-        textout += spaces+line+'\n'
-    return textout
+    spaces = ' ' * nspaces*level
+    return ''.join([ spaces+line+'\n' for line in text.splitlines() ])
 
 # Support the old name for backwards compatibility
 def intend(**kwargs):
@@ -0,0 +1,127 @@
+"""
+===========
+Event store
+===========
+Array backed storage for event type IO data.
+
+Events are stored as rows of a time vector, an int64 value matrix and a
+boolean mask telling which values changed at each time. The dense
+representation, where unchanged values are forward filled from the
+previous event, is computed with vectorized NumPy operations and cached
+until the next modification.
+
+"""
+import numpy as np
+
+class event_store:
+    ''' Storage of event type IO data.
+
+    Parameters
+    ----------
+    width : int
+        Number of value columns, i.e. number of connectors.
+
+    '''
+    def __init__(self, width):
+        self.width = width
+        self._rows = {}
+        self._size = 0
+        self._times = np.zeros(0, dtype=np.int64)
+        self._values = np.zeros((0, width), dtype=np.int64)
+        self._mask = np.zeros((0, width), dtype=bool)
+        self._dense = None
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, size):
+        ''' Grows the arrays geometrically to hold at least size rows.
+
+        '''
+        capacity = self._times.shape[0]
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 64)
+        times = np.zeros(capacity, dtype=np.int64)
+        values = np.zeros((capacity, self.width), dtype=np.int64)
+        mask = np.zeros((capacity, self.width), dtype=bool)
+        times[:self._size] = self._times[:self._size]
+        values[:self._size] = self._values[:self._size]
+        mask[:self._size] = self._mask[:self._size]
+        self._times, self._values, self._mask = times, values, mask
+
+    def _row(self, time):
+        ''' Row index of the event at time. Creates an empty event if needed.
+
+        '''
+        row = self._rows.get(time)
+        if row is None:
+            self._reserve(self._size + 1)
+            row = self._size
+            self._times[row] = time
+            self._rows[time] = row
+            self._size += 1
+        return row
+
+    def set(self, time, column, value):
+        ''' Sets the value of one column at time. Other columns keep their
+        previous values.
+
+        '''
+        row = self._row(int(time))
+        self._values[row, column] = value
+        self._mask[row, column] = True
+        self._dense = None
+
+    def set_rows(self, rows, mask=None):
+        ''' Sets complete events from an array with time in the first column.
+        Existing events at the same times are replaced. If several rows
+        have the same time, the last one is used.
+
+        Parameters
+        ----------
+        rows : array_like
+            Events as [ time, value_1, ... value_width ]
+        mask : array_like of bool, optional
+            Changed values of the rows. Default all True.
+
+        '''
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1, self.width + 1)
+        if mask is None:
+            mask = np.ones((rows.shape[0], self.width), dtype=bool)
+        else:
+            mask = np.asarray(mask, dtype=bool).reshape(-1, self.width)
+        # Keep the last occurrence of each time
+        times, last = np.unique(rows[::-1, 0], return_index=True)
+        last = rows.shape[0] - 1 - last
+        indices = np.empty(times.shape[0], dtype=np.int64)
+        for i, time in enumerate(times.tolist()):
+            indices[i] = self._row(time)
+        self._values[indices] = rows[last, 1:]
+        self._mask[indices] = mask[last]
+        self._dense = None
+
+    def items(self):
+        ''' Events in time order as (time, values), where unchanged values are None.
+
+        '''
+        order = np.argsort(self._times[:self._size], kind='stable')
+        for row in order.tolist():
+            yield ( int(self._times[row]),
+                    [ int(v) if m else None for v, m in zip(self._values[row], self._mask[row]) ] )
+
+    def dense(self):
+        ''' Events in time order as an int64 array with time in the first
+        column and unchanged values forward filled from previous events.
+        Unchanged values of the first event are zero.
+
+        '''
+        if self._dense is None:
+            order = np.argsort(self._times[:self._size], kind='stable')
+            mask = self._mask[order]
+            # Row index of the latest change of each column
+            latest = np.where(mask, np.arange(order.shape[0])[:, None], 0)
+            np.maximum.accumulate(latest, axis=0, out=latest)
+            values = self._values[order][latest, np.arange(self.width)]
+            self._dense = np.column_stack((self._times[order], values))
+        return self._dense
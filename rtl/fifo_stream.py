@@ -0,0 +1,173 @@
+"""
+===========
+FIFO stream
+===========
+Threads streaming IO data through named pipes while the simulator runs.
+
+A `fifo_writer` writes the input data in chunks to a named pipe read by
+the testbench, and a `fifo_reader` parses the output pipe incrementally
+into a growing int64 array. Python and the simulator thus run overlapped,
+and the text representation of the data is never held in memory as a
+whole.
+
+Opening a named pipe blocks until the other end is opened. If the
+simulator exits without opening a pipe, `finish` opens the other end
+itself to release the thread.
+
+"""
+import os
+import threading
+import numpy as np
+
+class fifo_stream(threading.Thread):
+    ''' Base class of the FIFO streaming threads.
+
+    Parameters
+    ----------
+    **kwargs :
+        path : str
+            Path of the named pipe.
+        dtype : str or None
+            NumPy dtype of binary records. None for tab separated text.
+        chunk : int, 65536
+            Number of rows or bytes transferred at a time.
+
+    '''
+    def __init__(self, **kwargs):
+        super().__init__(daemon=True)
+        self.path = kwargs.get('path')
+        self.dtype = kwargs.get('dtype', None)
+        self.chunk = kwargs.get('chunk', 65536)
+        self.error = None
+
+    @staticmethod
+    def create(path):
+        ''' Creates a named pipe, replacing an existing file.
+
+        '''
+        if os.path.lexists(path):
+            os.remove(path)
+        os.mkfifo(path)
+
+    def run(self):
+        try:
+            self.stream()
+        except BrokenPipeError:
+            # Reader exited before all the data was written
+            pass
+        except Exception as e:
+            self.error = e
+
+    def stream(self):
+        pass
+
+    def unblock(self):
+        ''' Opens and closes the other end of the pipe, releasing a blocked open.
+
+        '''
+        pass
+
+    def finish(self):
+        ''' Waits for the thread to complete. Call after the simulator has exited.
+
+        '''
+        while self.is_alive():
+            self.unblock()
+            self.join(0.1)
+
+class fifo_writer(fifo_stream):
+    ''' Writes data to a named pipe.
+
+    Parameters
+    ----------
+    **kwargs :
+        data : ndarray
+            Integer data written one row per line or record.
+        See `fifo_stream`.
+
+    '''
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.data = np.asarray(kwargs.get('data'))
+        if self.data.ndim == 1:
+            self.data = self.data.reshape(-1, 1)
+
+    def stream(self):
+        with open(self.path, 'wb') as fd:
+            for start in range(0, self.data.shape[0], self.chunk):
+                rows = self.data[start:start+self.chunk]
+                if self.dtype is None:
+                    np.savetxt(fd, rows, fmt='%d', delimiter='\t')
+                else:
+                    fd.write(rows.astype(self.dtype).tobytes())
+
+    def unblock(self):
+        try:
+            os.close(os.open(self.path, os.O_RDONLY | os.O_NONBLOCK))
+        except OSError:
+            pass
+
+class fifo_reader(fifo_stream):
+    ''' Reads data from a named pipe to an int64 array.
+
+    Parameters
+    ----------
+    **kwargs :
+        columns : int
+            Number of values per row.
+        See `fifo_stream`.
+
+    '''
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.columns = kwargs.get('columns', 1)
+        self._values = np.zeros(0, dtype=np.int64)
+        self._size = 0
+
+    @property
+    def Data(self):
+        ''' Data read so far, one row per line or record.
+
+        '''
+        return self._values[:self._size].reshape(-1, self.columns)
+
+    def _append(self, values):
+        size = self._size + values.shape[0]
+        if size > self._values.shape[0]:
+            grown = np.zeros(max(size, 2 * self._values.shape[0]), dtype=np.int64)
+            grown[:self._size] = self._values[:self._size]
+            self._values = grown
+        self._values[self._size:size] = values
+        self._size = size
+
+    def stream(self):
+        if self.dtype is None:
+            recordsize = 1
+        else:
+            recordsize = np.dtype(self.dtype).itemsize * self.columns
+        buffer = b''
+        with open(self.path, 'rb') as fd:
+            while True:
+                data = fd.read(self.chunk)
+                if not data:
+                    break
+                buffer += data
+                if self.dtype is None:
+                    cut = buffer.rfind(b'\n') + 1
+                    if cut:
+                        self._append(np.array(buffer[:cut].split(), dtype=np.int64))
+                else:
+                    cut = len(buffer) - len(buffer) % recordsize
+                    self._append(np.frombuffer(buffer[:cut], dtype=self.dtype).astype(np.int64))
+                buffer = buffer[cut:]
+        if buffer.strip():
+            if self.dtype is None:
+                self._append(np.array(buffer.split(), dtype=np.int64))
+            else:
+                raise ValueError('Incomplete record at the end of %s' % self.path)
+
+    def unblock(self):
+        try:
+            os.close(os.open(self.path, os.O_WRONLY | os.O_NONBLOCK))
+        except OSError:
+            pass
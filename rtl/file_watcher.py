@@ -0,0 +1,120 @@
+"""
+============
+File watcher
+============
+Helpers for detecting the appearance of simulation IO files.
+
+On Linux the parent directories of the watched files are monitored with
+inotify (accessed through ctypes, no extra dependencies), so a file
+written by a local simulator is detected as soon as it is closed. Where
+inotify is not available, or the file is written by a remote host on a
+network filesystem, a stat polling loop with exponential backoff is used
+instead. The polling starts at 100 microseconds and saturates at
+`max_poll` seconds.
+
+"""
+import os
+import time
+import select
+import ctypes
+import ctypes.util
+
+# inotify event masks from <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+
+def _libc():
+    ''' Returns the C library handle if it provides inotify, else None.
+
+    '''
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+class _inotify:
+    ''' Minimal inotify wrapper watching a set of directories.
+
+    '''
+    def __init__(self, dirs):
+        self.fd = -1
+        libc = _libc()
+        if libc is None:
+            return
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return
+        for d in dirs:
+            if libc.inotify_add_watch(fd, os.fsencode(d), _IN_MASK) < 0:
+                os.close(fd)
+                return
+        self.fd = fd
+
+    def wait(self, timeout):
+        ''' Blocks until an event arrives or timeout (seconds) expires.
+
+        '''
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            try:
+                # Events are not parsed, the caller re-checks the files.
+                while os.read(self.fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+def wait_for_files(**kwargs):
+    ''' Waits until all the given files exist.
+
+    Parameters
+    ----------
+    **kwargs :
+        files : list of str
+            Paths of the files to wait for.
+        timeout : float, 60
+            Maximum time to wait in seconds.
+        max_poll : float, 0.05
+            Upper limit of the polling interval in seconds. Also bounds the
+            inotify wait, so that files created by other hosts on network
+            filesystems are detected.
+
+    Returns
+    -------
+    list of str
+        Files that did not appear within the timeout. Empty list on success.
+
+    '''
+    files = list(kwargs.get('files', []))
+    timeout = kwargs.get('timeout', 60)
+    max_poll = kwargs.get('max_poll', 0.05)
+    missing = [ f for f in files if not os.path.isfile(f) ]
+    if not missing:
+        return []
+    deadline = time.monotonic() + timeout
+    dirs = set(os.path.dirname(os.path.abspath(f)) for f in missing)
+    # Watch before re-checking, so that no creation event is lost.
+    watcher = _inotify([ d for d in dirs if os.path.isdir(d) ])
+    poll = 1e-4
+    try:
+        while True:
+            missing = [ f for f in missing if not os.path.isfile(f) ]
+            remaining = deadline - time.monotonic()
+            if not missing or remaining <= 0:
+                return missing
+            if watcher.fd >= 0:
+                watcher.wait(min(max_poll, remaining))
+            else:
+                time.sleep(min(poll, remaining))
+                poll = min(2 * poll, max_poll)
+    finally:
+        watcher.close()
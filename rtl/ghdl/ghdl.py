@@ -6,22 +6,98 @@ Initially written by Marko Kosunen 20230610
 """
 
 from thesdk import *
+import sys
+import shutil
+import hashlib
+from rtl.rtl_cache_common import rtl_cache_root
+from rtl.ghdl import ghdl_library
+from rtl.process_runner import process_step
 class ghdl(thesdk):
+    @property
+    def ghdl_incremental(self):
+        ''' True | False (default)
+
+        If True, the VHDL sources are analyzed to a persistent library
+        `ghdl_library_path`, where only the changed sources and the sources
+        depending on them are analyzed again. The library is copied to
+        `rtlworkpath`, where the testbench is analyzed and elaborated.
+        Overrides `rtl_compile_cache` for the GHDL model.
+
+        '''
+        if not hasattr(self, '_ghdl_incremental'):
+            self._ghdl_incremental = False
+        return self._ghdl_incremental
+    @ghdl_incremental.setter
+    def ghdl_incremental(self, value):
+        self._ghdl_incremental = value
+
+    @property
+    def ghdl_library_path(self):
+        ''' Directory of the persistent library of `ghdl_incremental`.
+
+        Default: `rtl_cache_root()/ghdl/<name>_<digest of entitypath>`
+
+        '''
+        if not hasattr(self, '_ghdl_library_path'):
+            digest=hashlib.sha256(self.entitypath.encode('utf-8')).hexdigest()[:16]
+            self._ghdl_library_path = os.path.join(rtl_cache_root(), 'ghdl',
+                    '%s_%s' % (self.name, digest))
+        return self._ghdl_library_path
+    @ghdl_library_path.setter
+    def ghdl_library_path(self, value):
+        self._ghdl_library_path = value
+
     @property
     def ghdl_rtlcmd(self):
+        '''Shell command equivalent to `ghdl_rtlsteps`.
+
+        '''
+        self._rtlcmd = process_step.join(self.ghdl_rtlsteps)
+        return self._rtlcmd
+
+    @property
+    def ghdl_rtlsteps(self):
+        '''List of `process_step` analyzing, elaborating and running the simulation.
+
+        '''
         submission=self.lsf_submission
+        vhdlmodules=self.vhdllibfileentities + [ self.rtlsimpath + '/'+ 
+            str(param) for param in self.extract_vhdlfiles()]
+        if self.ghdl_incremental:
+            self._rtl_compile_cache_hit = False
+        else:
+            self.rtl_compile_cache_lookup(files=vhdlmodules, version=['ghdl', '--version'])
         if not os.path.exists(self.rtlworkpath):
             os.mkdir(self.rtlworkpath)
+        if self.rtl_compile_cache and not self.rtl_compile_cache_hit and not self.ghdl_incremental:
+            # Library refers to the analyzed sources, which must outlive rtlsimpath
+            srcpath=os.path.join(self.rtlworkpath, 'src')
+            if not os.path.exists(srcpath):
+                os.mkdir(srcpath)
+            for index, module in enumerate(vhdlmodules):
+                vhdlmodules[index]=os.path.join(srcpath, os.path.basename(module))
+                shutil.copyfile(module, vhdlmodules[index])
         vlogmodulesstring=' '.join(self.vloglibfilemodules + [ self.rtlsimpath + '/'+ 
             str(param) for param in self.extract_vlogfiles() ])
-        vhdlmodulesstring=' '.join(self.vhdllibfileentities + [ self.rtlsimpath + '/'+ 
-            str(param) for param in self.extract_vhdlfiles()])
+        vhdlmodulesstring=' '.join(vhdlmodules)
 
         if vlogmodulesstring != '':
             self.print_log(type='W', msg="GHDL does not support Verilog+VHDL cosimulation, ignoring additional Verilog files.")
         # We need to compile VHDL source and testbench anyway
-        vhdlcompcmd = ( 'ghdl -a -Wall -Wno-unused --std=08 --workdir=' + self.rtlworkpath + ' ' + vhdlmodulesstring )
+        vhdlcompcmd = [ process_step(name='compile',
+            cmd='ghdl -a -Wall -Wno-unused --std=08 --workdir=' + self.rtlworkpath + ' ' + vhdlmodulesstring) ]
         vhdlanalysiscmd = ( 'ghdl -e --std=08 --workdir=' + self.rtlworkpath + ' ' + 'tb_' + self.name )
+        if self.ghdl_incremental:
+            # Testbench contains the file paths of this run, it is analyzed privately
+            libmodules=[]
+            for module in vhdlmodules:
+                if module != self.simtb and module not in libmodules:
+                    libmodules.append(module)
+            vhdlcompcmd = [ process_step(name='compile', cmd=[ sys.executable, ghdl_library.__file__,
+                    '--library', self.ghdl_library_path, '--workdir', self.rtlworkpath,
+                    '--flags=-Wall -Wno-unused --std=08' ] + libmodules),
+                    process_step(name='compile', cmd='ghdl -a -Wall -Wno-unused --std=08 --workdir='
+                        + self.rtlworkpath + ' ' + self.simtb) ]
 
 
         gstring = ' '.join([ 
@@ -51,19 +127,25 @@ class ghdl(thesdk):
             self.print_log(type='I',msg='No interactive control file set.')
 
         if not self.interactive_rtl:
-            rtlsimcmd = ('ghdl -r --std=08 --workdir=' + self.rtlworkpath +  ' tb_' + self.name + ' ' + controlstring)
+            rtlsimcmd = [ process_step(name='simulate', cmd=submission + 'ghdl -r --std=08 --workdir='
+                + self.rtlworkpath +  ' tb_' + self.name + ' ' + controlstring) ]
         else:
             submission="" #Local execution
-            rtlsimcmd = ('ghdl -r --std=08  --workdir=' + self.rtlworkpath + ' ' + 'tb_' + self.name + controlstring + ' --vcd='+ self.rtlsimpath + '/' + self.name +'_dump.vcd'
-                         + ' && gtkwave ' + interactive_string + ' ' + self.rtlsimpath +'/' + self.name + '_dump.vcd')
-
-        self._rtlcmd =  vhdlcompcmd +\
-                ' && sync ' + self.rtlworkpath +\
-                ' && ' +vhdlanalysiscmd + \
-                ' && ' + submission +\
-                rtlsimcmd
-
-        return self._rtlcmd
+            rtlsimcmd = [ process_step(name='simulate', cmd='ghdl -r --std=08  --workdir=' + self.rtlworkpath
+                + ' ' + 'tb_' + self.name + controlstring + ' --vcd='+ self.rtlsimpath + '/' + self.name +'_dump.vcd'),
+                process_step(name='view', cmd='gtkwave ' + interactive_string + ' ' + self.rtlsimpath
+                    +'/' + self.name + '_dump.vcd') ]
+
+        # Elaboration is always run, as its product location depends on the GHDL backend
+        steps = []
+        if not self.rtl_compile_cache_hit:
+            steps += vhdlcompcmd
+            if self.rtl_compile_cache and not self.ghdl_incremental:
+                steps.append(process_step(name='compile', cmd=['touch', self.rtl_compile_cache_marker]))
+        if self.rtl_sync == 'sync':
+            steps.append(process_step(name='sync', cmd=['sync', self.rtlworkpath]))
+        steps.append(process_step(name='elaborate', cmd=vhdlanalysiscmd))
+        return steps + rtlsimcmd
 
     @property
     def ghdl_simdut(self):
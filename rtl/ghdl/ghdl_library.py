@@ -0,0 +1,191 @@
+"""
+============
+GHDL library
+============
+Persistent, incrementally analyzed GHDL work library.
+
+The library directory contains the GHDL work directory `work`, copies
+of the analyzed sources in `src`, and a manifest of the sources with
+their digests, and the design units they provide and require.
+Only the sources that have changed, and the sources depending on the
+units they provide, are analyzed again. The analyzed library is then
+copied to the work directory of the simulation, where the testbench is
+analyzed and elaborated, so that simultaneous simulations do not
+interfere.
+
+The update is run as a script from the simulation command, holding an
+exclusive lock on the library::
+
+    python ghdl_library.py --library <dir> --workdir <dir> [--flags <flags>] files...
+
+This module uses only the standard library, so that it can be run with
+any Python interpreter.
+
+"""
+import os
+import re
+import sys
+import json
+import fcntl
+import shutil
+import hashlib
+import argparse
+import subprocess
+
+_comment = re.compile(r'--[^\n]*')
+_provides = [
+        re.compile(r'^\s*entity\s+(\w+)\s+is\b', re.I | re.M),
+        re.compile(r'^\s*package\s+(?!body\b)(\w+)\s+is\b', re.I | re.M),
+        re.compile(r'^\s*configuration\s+(\w+)\s+of\b', re.I | re.M),
+        ]
+_requires = [
+        # Entity of an architecture, package of a package body
+        re.compile(r'^\s*architecture\s+\w+\s+of\s+(\w+)', re.I | re.M),
+        re.compile(r'^\s*package\s+body\s+(\w+)', re.I | re.M),
+        # Used packages
+        re.compile(r'\buse\s+\w+\.(\w+)', re.I),
+        # Direct and component instantiations
+        re.compile(r'\b(?:entity|configuration)\s+\w+\.(\w+)', re.I),
+        re.compile(r':\s*(?:component\s+)?(\w+)\s+(?:generic|port)\s+map\b', re.I),
+        ]
+
+def design_units(text):
+    ''' Returns the sets of the design units a VHDL source provides and
+    requires. Names are lower case, and units provided by the source
+    itself are not listed as required.
+
+    '''
+    text = _comment.sub('', text)
+    provides = set()
+    requires = set()
+    for regex in _provides:
+        provides.update(name.lower() for name in regex.findall(text))
+    for regex in _requires:
+        requires.update(name.lower() for name in regex.findall(text))
+    return provides, requires - provides
+
+class ghdl_library:
+    ''' Persistent GHDL work library.
+
+    Parameters
+    ----------
+    **kwargs :
+        path : str
+            Library directory
+        flags : str
+            Analysis flags, e.g. '--std=08'. Changing them rebuilds the library.
+
+    '''
+    def __init__(self, **kwargs):
+        self.path = kwargs.get('path')
+        self.flags = kwargs.get('flags', '--std=08')
+        self.workdir = os.path.join(self.path, 'work')
+        self.srcdir = os.path.join(self.path, 'src')
+        self.manifest_file = os.path.join(self.path, 'manifest.json')
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_file) as infile:
+                manifest = json.load(infile)
+            if manifest.get('flags') == self.flags:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return { 'flags' : self.flags, 'files' : [] }
+
+    def save_manifest(self, manifest):
+        tmp = self.manifest_file + '.tmp'
+        with open(tmp, 'w') as outfile:
+            json.dump(manifest, outfile, indent=1)
+        os.replace(tmp, self.manifest_file)
+
+    def plan(self, files, manifest):
+        ''' Returns the manifest entries of `files`, and the entries to be analyzed.
+        All are analyzed, if the files or their order differ from the manifest.
+        Files are identified by their names, as the simulation directory
+        changes from run to run.
+
+        '''
+        entries = []
+        for path in files:
+            with open(path, 'rb') as infile:
+                contents = infile.read()
+            digest = hashlib.sha256(contents).hexdigest()
+            provides, requires = design_units(contents.decode('utf-8', 'replace'))
+            entries.append({ 'name' : os.path.basename(path), 'file' : path, 'digest' : digest,
+                'src' : os.path.join(self.srcdir, digest[:16] + '_' + os.path.basename(path)),
+                'provides' : sorted(provides), 'requires' : sorted(requires) })
+
+        previous = manifest['files']
+        if [ entry['name'] for entry in previous ] != [ entry['name'] for entry in entries ]:
+            return entries, entries
+        dirty = set()
+        for index, entry in enumerate(entries):
+            if entry['digest'] != previous[index]['digest']:
+                dirty.add(index)
+        # Dependents of changed units become obsolete
+        changed = True
+        while changed:
+            changed = False
+            units = set()
+            for index in dirty:
+                units.update(entries[index]['provides'])
+            for index, entry in enumerate(entries):
+                if index not in dirty and units.intersection(entry['requires']):
+                    dirty.add(index)
+                    changed = True
+        return entries, [ entry for index, entry in enumerate(entries) if index in dirty ]
+
+    def update(self, files):
+        ''' Analyzes the changed files to the library. Call with the lock held.
+
+        '''
+        manifest = self.load_manifest()
+        entries, analyze = self.plan(files, manifest)
+        if not os.path.isdir(self.workdir) or not os.listdir(self.workdir):
+            analyze = entries
+        if len(analyze) == len(entries) and os.path.exists(self.workdir):
+            # Full rebuild, remove units of files no longer in the library
+            shutil.rmtree(self.workdir)
+        os.makedirs(self.workdir, exist_ok=True)
+        os.makedirs(self.srcdir, exist_ok=True)
+        if not analyze:
+            return
+        for entry in analyze:
+            if not os.path.isfile(entry['src']):
+                shutil.copyfile(entry['file'], entry['src'])
+        # Manifest is invalid until the analysis succeeds
+        if os.path.exists(self.manifest_file):
+            os.remove(self.manifest_file)
+        subprocess.check_call('ghdl -a %s --workdir=%s %s' % (self.flags, self.workdir,
+            ' '.join(entry['src'] for entry in analyze)), shell=True)
+        self.save_manifest({ 'flags' : self.flags, 'files' : entries })
+
+    def copy(self, workdir):
+        ''' Copies the analyzed library to workdir. Call with the lock held.
+
+        '''
+        os.makedirs(workdir, exist_ok=True)
+        for name in os.listdir(self.workdir):
+            if os.path.isfile(os.path.join(self.workdir, name)):
+                shutil.copy2(os.path.join(self.workdir, name), os.path.join(workdir, name))
+
+def main():
+    parser = argparse.ArgumentParser(description='Update a persistent GHDL library.')
+    parser.add_argument('--library', required=True)
+    parser.add_argument('--workdir', required=True)
+    parser.add_argument('--flags', default='--std=08')
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+    library = ghdl_library(path=args.library, flags=args.flags)
+    os.makedirs(library.path, exist_ok=True)
+    with open(os.path.join(library.path, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        library.update([ os.path.abspath(path) for path in args.files ])
+        library.copy(args.workdir)
+
+if __name__=="__main__":
+    try:
+        main()
+    except subprocess.CalledProcessError as e:
+        sys.exit(e.returncode)
@@ -8,16 +8,35 @@ properties and methods for RTL class
 Initially written by Marko Kosunen 20221030
 """
 from thesdk import *
-import pdb
+from rtl.process_runner import process_step
 
 class icarus(thesdk,metaclass=abc.ABCMeta):
     @property
     def icarus_rtlcmd(self):
+        '''Shell command equivalent to `icarus_rtlsteps`.
+
+        '''
+        self._rtlcmd = process_step.join(self.icarus_rtlsteps)
+        return self._rtlcmd
+
+    @property
+    def icarus_rtlsteps(self):
+        '''List of `process_step` compiling and running the simulation.
+
+        '''
         submission=self.lsf_submission
+        vlogmodules=self.vloglibfilemodules + [ self.rtlsimpath + '/'+ 
+            str(param) for param in self.extract_vlogfiles() ]
+        if self.vpi_iofiles:
+            vpisources=[ self.vpi_source ]
+        else:
+            vpisources=[]
+        # With plusargs, the IO file names are given at run time
+        self.rtl_compile_cache_lookup(files=vlogmodules + vpisources, version=['iverilog', '-V'],
+                runtime_files=self.rtl_plusargs_files)
         if not os.path.exists(self.rtlworkpath):
             os.mkdir(self.rtlworkpath)
-        vlogmodulesstring=' '.join(self.vloglibfilemodules + [ self.rtlsimpath + '/'+ 
-            str(param) for param in self.extract_vlogfiles() ])
+        vlogmodulesstring=' '.join(vlogmodules)
         vhdlmodulesstring=' '.join([ self.rtlsimpath + '/'+ 
             str(param) for param in self.extract_vhdlfiles()])
 
@@ -26,6 +45,14 @@ class icarus(thesdk,metaclass=abc.ABCMeta):
 
         vlogcompcmd = ( 'iverilog -Wall -v -g2012 -o ' + self.rtlworkpath + '/' + self.name
                     + ' ' + vlogmodulesstring)
+        vpicompcmd = None
+        vpiflags = ''
+        if vpisources:
+            vpicompcmd = process_step(name='compile', cwd=self.rtlworkpath,
+                    cmd='iverilog-vpi --name=' + self.vpi_module + ' -DTHESDK_VPI '
+                    + ' '.join(vpisources))
+            vpiflags = ' -M ' + self.rtlworkpath + ' -m ' + self.vpi_module
+            vlogcompcmd += ' ' + self.vpi_sft
         gstring = ' '.join([ 
                                 ('-g ' + str(param) +'='+ str(val[1])) 
                                 for param,val in self.rtlparameters.items() 
@@ -46,17 +73,25 @@ class icarus(thesdk,metaclass=abc.ABCMeta):
             else:
                 dostring=''
                 self.print_log(type='I',msg='No interactive control file set.')
-            rtlsimcmd = ('vvp -v ' + self.rtlworkpath + '/' + self.name
-                         + ' && gtkwave ' + dostring + ' ' + self.rtlsimpath + '/' + self.name + '_dump.vcd')
+            rtlsimcmd = [ process_step(name='simulate', cmd='vvp -v' + vpiflags + ' '
+                    + self.rtlworkpath + '/' + self.name + self.rtl_plusargs_string),
+                    process_step(name='view', cmd='gtkwave ' + dostring + ' ' + self.rtlsimpath
+                        + '/' + self.name + '_dump.vcd') ]
         else:
-            rtlsimcmd = ('vvp -v ' + self.rtlworkpath + '/' + self.name + fileparams + ' ' + gstring)
-
-        self._rtlcmd =  vlogcompcmd +\
-                ' && sync ' + self.rtlworkpath +\
-                ' && ' + submission +\
-                rtlsimcmd
-
-        return self._rtlcmd
+            rtlsimcmd = [ process_step(name='simulate', cmd=submission + 'vvp -v' + vpiflags + ' '
+                    + self.rtlworkpath + '/' + self.name + fileparams + ' ' + gstring
+                    + self.rtl_plusargs_string) ]
+
+        steps = []
+        if not self.rtl_compile_cache_hit:
+            if vpicompcmd:
+                steps.append(vpicompcmd)
+            steps.append(process_step(name='compile', cmd=vlogcompcmd))
+            if self.rtl_compile_cache:
+                steps.append(process_step(name='compile', cmd=['touch', self.rtl_compile_cache_marker]))
+        if self.rtl_sync == 'sync':
+            steps.append(process_step(name='sync', cmd=['sync', self.rtlworkpath]))
+        return steps + rtlsimcmd
 
     @property
     def icarus_simdut(self):
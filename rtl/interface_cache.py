@@ -0,0 +1,119 @@
+"""
+===============
+Interface cache
+===============
+Persistent cache of the module and entity interfaces parsed from HDL
+source files.
+
+The parsed interface (ports, directions, ranges and parameters) is
+plain data, and is stored as compressed JSON under
+`rtl_cache_root()/interface`. Entries are keyed by the sha256 digest of
+the file contents, the module name, the language and the parser
+version. The digest of a file is remembered by its path, modification
+time and size, so that an unchanged file is neither read nor parsed
+again. Results are also memoized in the process.
+
+Failures to read or write the cache are not fatal, the file is then
+just parsed.
+
+"""
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+from rtl.rtl_cache_common import rtl_cache_root
+
+_memo = {}
+
+def _write(path, data):
+    ''' Writes compressed json atomically.
+
+    '''
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as outfile:
+            outfile.write(gzip.compress(json.dumps(data).encode('utf-8')))
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+def _read(path):
+    with open(path, 'rb') as infile:
+        return json.loads(gzip.decompress(infile.read()).decode('utf-8'))
+
+def cached_interface(**kwargs):
+    ''' Returns the parsed interface of a module, parsing the file only if
+    it is not found from the cache.
+
+    Parameters
+    ----------
+    **kwargs :
+        file : str
+            HDL source file
+        name : str
+            Name of the module or entity
+        lang : str
+            'sv' | 'vhdl'
+        parser : callable
+            Function parser(text, name) returning the interface as
+            JSON serializable data.
+        version : str
+            Version of the parser. Change it whenever the parser output changes.
+        root : str
+            Cache directory. Default `rtl_cache_root()/interface`.
+
+    '''
+    path = os.path.abspath(kwargs.get('file'))
+    name = kwargs.get('name')
+    lang = kwargs.get('lang')
+    parser = kwargs.get('parser')
+    version = str(kwargs.get('version'))
+    root = kwargs.get('root', os.path.join(rtl_cache_root(), 'interface'))
+
+    stat = os.stat(path)
+    memokey = (path, stat.st_mtime_ns, stat.st_size, name, lang, version)
+    if memokey in _memo:
+        return _memo[memokey]
+
+    # Digest of the file, recomputed only if the file has changed
+    indexfile = os.path.join(root, 'index',
+            hashlib.sha256(path.encode('utf-8')).hexdigest() + '.json.gz')
+    text = None
+    digest = None
+    try:
+        index = _read(indexfile)
+        if index['mtime'] == stat.st_mtime_ns and index['size'] == stat.st_size:
+            digest = index['digest']
+    except (OSError, ValueError, KeyError, EOFError):
+        pass
+    if digest is None:
+        with open(path, 'rb') as infile:
+            contents = infile.read()
+        digest = hashlib.sha256(contents).hexdigest()
+        text = contents.decode('utf-8', 'replace')
+        try:
+            _write(indexfile, { 'path' : path, 'mtime' : stat.st_mtime_ns,
+                'size' : stat.st_size, 'digest' : digest })
+        except OSError:
+            pass
+
+    key = hashlib.sha256(json.dumps([ digest, name, lang, version ]).encode('utf-8')).hexdigest()
+    entryfile = os.path.join(root, 'entries', key + '.json.gz')
+    try:
+        interface = _read(entryfile)['interface']
+    except (OSError, ValueError, KeyError, EOFError):
+        if text is None:
+            with open(path, 'rb') as infile:
+                text = infile.read().decode('utf-8', 'replace')
+        # Round trip, so that cached and parsed results are identical
+        interface = json.loads(json.dumps(parser(text, name)))
+        try:
+            _write(entryfile, { 'name' : name, 'lang' : lang, 'version' : version,
+                'interface' : interface })
+        except OSError:
+            pass
+    _memo[memokey] = interface
+    return interface
@@ -14,7 +14,6 @@ Initially written by Marko Kosunen, 2017
 """
 import os
 from thesdk import *
-from rtl import *
 from copy import deepcopy
 from rtl.connector import verilog_connector
 from rtl.connector import verilog_connector_bundle
@@ -86,7 +85,8 @@ class module(module_common,thesdk):
     # individual parameters can be set externally
     @ios.setter
     def ios(self,value):
-        self.langmodule.ios=deepcopy(value)
+        # The langmodule copies the value
+        self.langmodule.ios=value
 
     @property
     def directives(self):
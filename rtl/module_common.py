@@ -8,7 +8,7 @@ Initially written by Marko Kosunen, 28.10.2022
 """
 import os
 from thesdk import *
-from rtl import *
+from abc import abstractmethod
 from copy import deepcopy
 
 class module_common(thesdk):
@@ -145,34 +145,22 @@ class module_common(thesdk):
         '''
         #First we write the parameter section
         if self.parameters.Members:
-            parameters=''
-            first=True
-            for name, val in self.parameters.Members.items():
-                if first:
-                    parameters='#(\n    .%s(%s)' %(name,name)
-                    first=False
-                else:
-                    parameters=parameters+',\n    .%s(%s)' %(name,name)
-            parameters=parameters+'\n)'
-            self._verilog_instance='%s  %s %s' %(self.name, parameters, self.instname)
+            parameters=',\n'.join([ '    .%s(%s)' %(name,name)
+                for name in self.parameters.Members.keys() ])
+            instance=[ '%s  #(\n%s\n) %s' %(self.name, parameters, self.instname) ]
         else:
-            self._verilog_instance='%s %s ' %(self.name, self.instname)
-        first=True
+            instance=[ '%s %s ' %(self.name, self.instname) ]
         # Then we write the IOs
         if self.ios.Members:
+            ios=[]
             for ioname, io in self.ios.Members.items():
-                if first:
-                    self._verilog_instance=self._verilog_instance+'(\n'
-                    first=False
-                else:
-                    self._verilog_instance=self._verilog_instance+',\n'
                 if io.cls in [ 'input', 'output', 'inout' ]:
-                        self._verilog_instance=(self._verilog_instance+
-                                ('    .%s(%s)' %(io.name, io.connect.name)))
+                        ios.append('    .%s(%s)' %(io.name, io.connect.name))
                 else:
                     self.print_log(type='F', msg='Assigning signal direction %s to verilog module IO.' %(io.cls))
-            self._verilog_instance=self._verilog_instance+('\n)')
-        self._verilog_instance=self._verilog_instance+(';\n')
+            instance.append('(\n%s\n)' %(',\n'.join(ios)))
+        instance.append(';\n')
+        self._verilog_instance=''.join(instance)
         return self._verilog_instance
 
     @property
@@ -182,34 +170,23 @@ class module_common(thesdk):
         '''
         #First we write the parameter section
         if self.parameters.Members:
-            parameters=''
-            first=True
-            for name, val in self.parameters.Members.items():
-                if first:
-                    parameters='generic map(\n    %s => %s' %(name,name)
-                    first=False
-                else:
-                    parameters=parameters+',\n    %s > %s' %(name,name)
-            parameters=parameters+'\n)'
-            self._vhdl_instance='%s  is entity work.%s\n%s\n' %(self.instname, self.name, parameters)
+            names=list(self.parameters.Members.keys())
+            parameters=''.join([ 'generic map(\n    %s => %s' %(names[0],names[0]) ]
+                    + [ ',\n    %s > %s' %(name,name) for name in names[1:] ])
+            instance=[ '%s  is entity work.%s\n%s\n)\n' %(self.instname, self.name, parameters) ]
         else:
-            self._vhdl_instance='%s : entity work.%s\n ' %(self.instname, self.name)
-        first=True
+            instance=[ '%s : entity work.%s\n ' %(self.instname, self.name) ]
         # Then we write the IOs
         if self.ios.Members:
+            ios=[]
             for ioname, io in self.ios.Members.items():
-                if first:
-                    self._vhdl_instance=self._vhdl_instance+'port map(\n'
-                    first=False
-                else:
-                    self._vhdl_instance=self._vhdl_instance+',\n'
                 if io.cls in [ 'input', 'output', 'inout' ]:
-                        self._vhdl_instance=(self._vhdl_instance+
-                                ('    %s => %s' %(io.name, io.connect.name)))
+                        ios.append('    %s => %s' %(io.name, io.connect.name))
                 else:
                     self.print_log(type='F', msg='Assigning signal direction %s to VHDL entity IO.' %(io.cls))
-            self._vhdl_instance=self._vhdl_instance+('\n    )')
-        self._vhdl_instance=self._vhdl_instance+(';\n')
+            instance.append('port map(\n%s\n    )' %(',\n'.join(ios)))
+        instance.append(';\n')
+        self._vhdl_instance=''.join(instance)
         return self._vhdl_instance
 
 if __name__=="__main__":
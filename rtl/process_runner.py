@@ -0,0 +1,236 @@
+"""
+==============
+Process runner
+==============
+Runs the simulator command pipeline as a list of structured steps.
+
+Each `process_step` is one external command with its argument vector,
+working directory, environment and timeout. The `process_runner`
+executes the steps in order, streams the combined stdout and stderr of
+each step line by line to a log function, and records the wall clock
+time, CPU time and peak memory of each step. A running pipeline can be
+cancelled from another thread.
+
+Example
+-------
+::
+
+    runner = process_runner(log=print)
+    runner.run(steps=[
+        process_step(name='compile', cmd='iverilog -o tb tb.sv'),
+        process_step(name='simulate', cmd='vvp tb', timeout=600),
+        ])
+    print(runner.records)
+
+"""
+import os
+import time
+import shlex
+import collections
+import signal
+import threading
+import subprocess
+
+class process_step:
+    ''' A command of the simulation pipeline.
+
+    Parameters
+    ----------
+    **kwargs :
+        name : str
+            Name of the step, e.g. 'compile', 'elaborate' or 'simulate'.
+        cmd : str or list of str
+            Command. A string is split to arguments with `shlex.split`,
+            unless `shell` is True.
+        cwd : str, None
+            Working directory. None for the default of the runner.
+        env : dict, None
+            Variables added to the environment.
+        timeout : float, None
+            Maximum duration of the step in seconds.
+        shell : bool, False
+            Run cmd with the shell.
+
+    '''
+    def __init__(self, **kwargs):
+        self.name = kwargs.get('name', 'command')
+        self.cmd = kwargs.get('cmd')
+        self.cwd = kwargs.get('cwd', None)
+        self.env = kwargs.get('env', None)
+        self.timeout = kwargs.get('timeout', None)
+        self.shell = kwargs.get('shell', False)
+
+    @property
+    def argv(self):
+        ''' Argument vector of the command.
+
+        '''
+        if self.shell:
+            return [ '/bin/sh', '-c', self.cmd ]
+        if isinstance(self.cmd, str):
+            return shlex.split(self.cmd)
+        return list(self.cmd)
+
+    def __str__(self):
+        ''' Shell representation of the step.
+
+        '''
+        if self.shell or isinstance(self.cmd, str):
+            cmd = self.cmd
+        else:
+            cmd = shlex.join(self.cmd)
+        if self.env:
+            cmd = 'env %s %s' % (' '.join('%s=%s' % (key, shlex.quote(str(value)))
+                for key, value in self.env.items()), cmd)
+        if self.cwd:
+            cmd = 'cd %s && %s' % (self.cwd, cmd)
+        return cmd
+
+    @staticmethod
+    def join(steps):
+        ''' Shell command line equivalent to running `steps` in order.
+
+        '''
+        return ' && '.join(str(step) for step in steps)
+
+class process_runner:
+    ''' Runs process steps in order.
+
+    Parameters
+    ----------
+    **kwargs :
+        log : callable
+            Function called with each output line of the steps, without the line end.
+        cwd : str, None
+            Default working directory of the steps.
+        tail : int, 200
+            Number of output lines kept for error messages.
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        When a step fails, or the run is cancelled. The output is the tail of
+        the output of the failed step.
+    subprocess.TimeoutExpired
+        When a step exceeds its timeout.
+
+    '''
+    def __init__(self, **kwargs):
+        self.log = kwargs.get('log', lambda line: None)
+        self.cwd = kwargs.get('cwd', None)
+        self.tail = kwargs.get('tail', 200)
+        self.records = []
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._process = None
+        self._kill_timers = []
+
+    def cancel(self):
+        ''' Terminates the running step. The remaining steps are not run.
+
+        '''
+        self._cancelled.set()
+        with self._lock:
+            if self._process is not None:
+                self._terminate(self._process)
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _terminate(self, process):
+        ''' Terminates the process group of a step, killing it if it does not exit.
+
+        '''
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        def kill():
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        timer = threading.Timer(5, kill)
+        timer.daemon = True
+        timer.start()
+        self._kill_timers.append(timer)
+
+    def run_step(self, step):
+        ''' Runs a single step and returns its record.
+
+        '''
+        if self.cancelled:
+            raise subprocess.CalledProcessError(-signal.SIGTERM, str(step), b'Cancelled')
+        env = None
+        if step.env:
+            env = dict(os.environ, **{ key : str(value) for key, value in step.env.items() })
+        started = time.time()
+        start = time.monotonic()
+        with self._lock:
+            process = subprocess.Popen(step.argv, cwd=step.cwd or self.cwd, env=env,
+                    stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT, start_new_session=True)
+            self._process = process
+            if self.cancelled:
+                self._terminate(process)
+        timedout = threading.Event()
+        timer = None
+        if step.timeout is not None:
+            def expire():
+                timedout.set()
+                self._terminate(process)
+            timer = threading.Timer(step.timeout, expire)
+            timer.daemon = True
+            timer.start()
+        lines = collections.deque(maxlen=self.tail)
+        try:
+            for line in process.stdout:
+                line = line.decode('utf-8', 'replace').rstrip('\n')
+                lines.append(line)
+                self.log(line)
+        finally:
+            process.stdout.close()
+            # wait4 provides the resource usage of the step and its children
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            if timer is not None:
+                timer.cancel()
+            with self._lock:
+                self._process = None
+                # The process group is gone, it must not be signalled any more
+                for kill in self._kill_timers:
+                    kill.cancel()
+                self._kill_timers = []
+        record = { 'name' : step.name, 'cmd' : str(step), 'start' : started,
+                'wall' : time.monotonic() - start,
+                'user' : usage.ru_utime, 'system' : usage.ru_stime,
+                'maxrss' : usage.ru_maxrss * 1024,
+                'returncode' : process.returncode }
+        self.records.append(record)
+        output = '\n'.join(lines).encode('utf-8')
+        if timedout.is_set():
+            raise subprocess.TimeoutExpired(str(step), step.timeout, output)
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, str(step), output)
+        return record
+
+    def run(self, **kwargs):
+        ''' Runs the steps in order, stopping at the first failure.
+
+        Parameters
+        ----------
+        **kwargs :
+            steps : list of process_step
+
+        Returns
+        -------
+        list of dict
+            Records of the steps with keys name, cmd, start (seconds since the epoch),
+            wall, user, system,
+            maxrss (bytes) and returncode.
+
+        '''
+        for step in kwargs.get('steps', []):
+            self.run_step(step)
+        return self.records
@@ -9,6 +9,9 @@ Initially written by Marko kosunen 20221030
 """
 from thesdk import *
 import os
+import sys
+import json
+from rtl.process_runner import process_step
 class questasim(thesdk):
 
     @property
@@ -42,9 +45,69 @@ class questasim(thesdk):
     def questasim_sim_opt_dict(self, value):
         self._questasim_sim_opt_dict = value
 
+    @property
+    def questasim_vopt_dict(self):
+        '''Preset dictionary of vopt arguments for the `questasim_snapshot` mode,
+        corresponding to the presets of `questasim_sim_opt_dict`.
+
+        '''
+        if not hasattr(self, '_questasim_vopt_dict'):
+            self._questasim_vopt_dict = {
+                'no-opt': ['+acc'],
+                'opt-visible': ['+acc'],
+                'full-opt': [],
+                'top-visible': [f'+acc=bcglnprst+tb_{self.name}'],
+                'top-dut-visible': [
+                    f'+acc=bcglnprst+tb_{self.name}',
+                    f'+acc=bcglnprst+{self.name}'
+                ]
+            }
+        return self._questasim_vopt_dict
+    @questasim_vopt_dict.setter
+    def questasim_vopt_dict(self, value):
+        self._questasim_vopt_dict = value
+
+    @property
+    def questasim_snapshot(self):
+        '''Bool : If True, the design is optimized once with vopt to the snapshot
+        `tb_<name>_opt` in the work library, and vsim only loads the snapshot.
+        The file parameters are left floating, so that they can be given to vsim.
+        With `rtl_compile_cache`, the snapshot is kept with the compiled library, keyed
+        by the sources, `rtlparameters` and `sim_optimization`, and later runs only execute vsim.
+
+        Default: False
+
+        '''
+        if not hasattr(self, '_questasim_snapshot'):
+            self._questasim_snapshot = False
+        return self._questasim_snapshot
+    @questasim_snapshot.setter
+    def questasim_snapshot(self, value):
+        self._questasim_snapshot = value
+
     @property
     def questasim_rtlcmd(self):
+        '''Shell command equivalent to `questasim_rtlsteps`.
+
+        '''
+        self._rtlcmd = process_step.join(self.questasim_rtlsteps)
+        return self._rtlcmd
+
+    @property
+    def questasim_rtlsteps(self):
+        '''List of `process_step` compiling and running the simulation.
+
+        '''
         submission=self.lsf_submission
+        # File paths are given with -g at vsim, they do not affect compilation
+        if self.questasim_snapshot:
+            # The snapshot depends on the optimization
+            extra=[ 'snapshot', self.sim_optimization, list(self.vlogsimargs) ]
+        else:
+            extra=[]
+        self.rtl_compile_cache_lookup(
+                files=[ os.path.join(self.rtlsimpath, module) for module in self.rtlfiles ],
+                version=['vsim', '-version'], runtime_files=True, extra=extra)
         rtllibcmd =  'vlib ' +  self.rtlworkpath
         rtllibmapcmd = 'vmap work ' + self.rtlworkpath
          
@@ -83,12 +146,54 @@ class questasim(thesdk):
         # Append the last group
         comp_cmds += [' '.join(comp_group)]
 
+        if self.rtl_compile_jobs > 1:
+            # One command per file, scheduled by the dependencies between files
+            from rtl import compile_scheduler
+            from rtl.ghdl import ghdl_library
+            plan = []
+            units = []
+            for module in self.rtlfiles:
+                path = os.path.join(self.rtlsimpath, module)
+                _, file_ext = os.path.splitext(module)
+                with open(path) as infile:
+                    text = infile.read()
+                if file_ext in [".v", ".sv"]:
+                    plan.append({ 'cmd' : vlog_start + ' ' + path })
+                    units.append(compile_scheduler.verilog_units(text))
+                else:
+                    plan.append({ 'cmd' : vhdl_start + ' ' + path })
+                    units.append(ghdl_library.design_units(text))
+            for item, deps in zip(plan, compile_scheduler.compile_dag(units)):
+                item['deps'] = deps
+            planfile = os.path.join(self.rtlsimpath, 'compile_plan.json')
+            with open(planfile, 'w') as outfile:
+                json.dump(plan, outfile, indent=1)
+            comp_cmds = [ '%s %s -j %d %s' % (sys.executable, compile_scheduler.__file__,
+                self.rtl_compile_jobs, planfile) ]
+
         gstring = ' '.join([
                                 ('-g ' + str(param) +'='+ str(val[1]))
                                 for param,val in self.rtlparameters.items()
                             ])
 
         vlogsimargs = ' '.join(self.vlogsimargs)
+        simtop = 'work.tb_' + self.name
+        voptcmd = ''
+        if self.questasim_snapshot:
+            # Parameters are fixed at optimization, file parameters float
+            if self.lang == 'vhdl':
+                floating = '+floatgenerics+tb_' + self.name + '.'
+            else:
+                floating = '+floatparameters+tb_' + self.name + '.'
+            if self.sim_optimization:
+                voptargs = self.questasim_vopt_dict[self.sim_optimization]
+                vlogsimargs = ''
+            else:
+                voptargs = []
+            voptcmd = ' '.join([ 'vopt', '-64', simtop, '-o', 'tb_' + self.name + '_opt',
+                floating, gstring ] + voptargs)
+            simtop = 'work.tb_' + self.name + '_opt'
+            gstring = ''
 
         fileparams=''
         for name, file in self.iofile_bundle.Members.items():
@@ -114,22 +219,29 @@ class questasim(thesdk):
         if not self.interactive_rtl:
             rtlsimcmd = ( 'vsim -64 -batch' + timescalestring
                     + fileparams + ' ' + gstring
-                    + ' ' + vlogsimargs + ' work.tb_' + self.name
+                    + ' ' + vlogsimargs + ' ' + simtop
                     + controlstring)
         else:
             submission="" #Local execution
             rtlsimcmd = ( 'vsim -64 ' + timescalestring + fileparams
-                    + ' ' + gstring + ' ' + vlogsimargs + ' work.tb_' + self.name
+                    + ' ' + gstring + ' ' + vlogsimargs + ' ' + simtop
                          + interactive_string )
 
-        self._rtlcmd =  rtllibcmd
-        self._rtlcmd += ' && ' + rtllibmapcmd
-        for comp_cmd in comp_cmds:
-            self._rtlcmd += ' && ' + comp_cmd
-        self._rtlcmd += ' && sync ' + self.rtlworkpath
-        self._rtlcmd += ' && ' + submission
-        self._rtlcmd +=  rtlsimcmd
-        return self._rtlcmd
+        if self.rtl_compile_cache_hit:
+            steps = [ process_step(name='compile', cmd=rtllibmapcmd) ]
+        else:
+            steps = [ process_step(name='compile', cmd=rtllibcmd),
+                    process_step(name='compile', cmd=rtllibmapcmd) ]
+            for comp_cmd in comp_cmds:
+                steps.append(process_step(name='compile', cmd=comp_cmd))
+            if voptcmd:
+                steps.append(process_step(name='elaborate', cmd=voptcmd))
+            if self.rtl_compile_cache:
+                steps.append(process_step(name='compile', cmd=['touch', self.rtl_compile_cache_marker]))
+        if self.rtl_sync == 'sync':
+            steps.append(process_step(name='sync', cmd=['sync', self.rtlworkpath]))
+        steps.append(process_step(name='simulate', cmd=submission + rtlsimcmd))
+        return steps
 
     @property
     def questasim_simdut(self):
@@ -0,0 +1,62 @@
+"""
+================
+RTL cache common
+================
+Collection of common helpers for the persistent caches of
+TheSyDeKick RTL interface.
+
+The caches are stored under a common root directory given by the
+'RTLCACHEPATH' global variable in TheSDK.config. If the variable is not
+set, `~/.cache/thesdk/rtl` is used.
+
+"""
+import os
+import hashlib
+import subprocess
+from thesdk import *
+
+_simulator_versions = {}
+
+def rtl_cache_root():
+    ''' Root directory of the persistent RTL caches.
+
+    '''
+    root = thesdk.GLOBALS.get('RTLCACHEPATH', '')
+    if not root:
+        root = os.path.join(os.path.expanduser('~'), '.cache', 'thesdk', 'rtl')
+    return root
+
+def file_digest(path, **kwargs):
+    ''' Returns sha256 hex digest of the file contents.
+
+    Parameters
+    ----------
+    path : str
+        File to hash
+    **kwargs :
+        replace : list of (bytes, bytes)
+            Substitutions done to the contents before hashing. Used to
+            mask run specific strings, like IO file paths, from the digest.
+
+    '''
+    replace = kwargs.get('replace', [])
+    with open(path, 'rb') as fd:
+        contents = fd.read()
+    for old, new in replace:
+        contents = contents.replace(old, new)
+    return hashlib.sha256(contents).hexdigest()
+
+def simulator_version(cmd):
+    ''' Version string printed by a simulator command, e.g. `['vsim', '-version']`.
+    Memoized per process. Returns '' if the command can not be executed.
+
+    '''
+    key = tuple(cmd)
+    if key not in _simulator_versions:
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT, timeout=60)
+            _simulator_versions[key] = result.stdout.decode('utf-8', 'replace').strip()
+        except (OSError, subprocess.SubprocessError):
+            _simulator_versions[key] = ''
+    return _simulator_versions[key]
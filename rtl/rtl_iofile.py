@@ -10,18 +10,19 @@ Restructured from verilog_iofile by Marko Kosunen, marko.kosunen@aalto.fi 2023
 """
 import os
 import sys
-import pdb
 from abc import * 
 from thesdk import *
 from thesdk.iofile import iofile
 import numpy as np
-import pandas as pd
-import sortedcontainers as sc
 from rtl.rtl_iofile_common import rtl_iofile_common
 from rtl.sv.verilog_iofile import verilog_iofile
 from rtl.sv.verilog_iofile_obsoletes import verilog_iofile_obsoletes
 from rtl.vhdl.vhdl_iofile import vhdl_iofile
 from rtl.connector import indent
+from rtl.event_store import event_store
+from rtl.fifo_stream import fifo_stream, fifo_writer, fifo_reader
+from rtl.vpi.vpi_iofile import vpi_iofile
+from rtl.vpi.ring_buffer import ring_writer, ring_reader
 
 class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
     '''
@@ -57,6 +58,10 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
                     passed to the simulator at command line. Sets the paramname attribute.
                 ioformat : str, %d
                    sets the ioformat attribute.
+                fileformat : str, 'text'
+                   sets the fileformat attribute.
+                iomode : str, 'file'
+                   sets the iomode attribute.
         '''
         #This is a redundant check, but does not hurt.to have it here too.
         if parent==None:
@@ -67,11 +72,13 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
             self.paramname=kwargs.get('param','-g g_file_')
 
             self._ioformat=kwargs.get('ioformat','%d') #by default, the io values are decimal integer numbers
+            self.fileformat=kwargs.get('fileformat','text')
+            self.iomode=kwargs.get('iomode','file')
 
         except:
             self.print_log(type='F', msg="RTL IO file definition failed")
 
-        self._DictData = None  # data structure for event-based IO data
+        self._events = None  # event_store for event-based IO data
 
     @property
     def langmodule(self):
@@ -85,10 +92,152 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
             self._langmodule_vhdl.file=self.file
             self._langmodule_vhdl.paramname=self.paramname
             self._langmodule_vhdl.name=self.name
+        if self.iomode=='vpi':
+            if self.parent.lang!='sv':
+                self.print_log(type='F', msg='VPI IO is supported only for sv testbenches')
+            if not hasattr(self,'_langmodule_vpi'):
+                self._langmodule_vpi = vpi_iofile(self)
+                self._langmodule_vpi.file=self.file
+                self._langmodule_vpi.paramname=self.paramname
+                self._langmodule_vpi.name=self.name
+            return self._langmodule_vpi
         if self.parent.lang=='sv': 
             return self._langmodule_verilog
         elif self.parent.lang=='vhdl': 
             return self._langmodule_vhdl
+
+    def _rtl_fragment(self,name):
+        '''Code fragment `name` of the langmodule, memoized.
+
+        The fragments are generated again if the language, direction,
+        iotype or file format of the file, or the connectors or their
+        name, type, ioformat or bounds have changed, or after
+        `invalidate_rtl_fragments`. The key holds references to the
+        connectors, so that a new connector is never taken for an old one.
+
+        '''
+        langmodule=self.langmodule
+        key=(id(langmodule), self.dir, self.iotype, self.fileformat,
+                tuple([ (connector, connector.name, connector.type, connector.ioformat,
+                    connector.ll, connector.rl) for connector in self.rtl_connectors ]),
+                getattr(self.parent, 'rtl_plusargs_files', False))
+        fragments=self.__dict__.get('_rtl_fragments')
+        if fragments is None or fragments[0] != key:
+            fragments=(key, {})
+            self._rtl_fragments=fragments
+        if name not in fragments[1]:
+            fragments[1][name]=getattr(langmodule,name)
+        return fragments[1][name]
+
+    def invalidate_rtl_fragments(self):
+        '''Discards the memoized code fragments (`rtl_statdef`, `rtl_fopen`,
+        `rtl_fclose`, `rtl_fptr`, `rtl_io`). Done by the setters of this
+        class. Call it after modifying the connectors of the file in place.
+
+        '''
+        self.__dict__.pop('_rtl_fragments', None)
+
+    @property
+    def fileformat(self):
+        '''File format of sample type IO files. 'text' (default) | 'binary'
+
+        'text' files contain tab separated decimal values, one row per sample.
+        'binary' files contain fixed width little-endian integer records
+        written and read with NumPy without per-row formatting. The record
+        width is 64 bits for Verilog and 32 bits for VHDL testbenches, and
+        the connectors must be integer valued and fit the record.
+        Event type files are always text files.
+
+        '''
+        if not hasattr(self,'_fileformat'):
+            self._fileformat='text'
+        return self._fileformat
+
+    @fileformat.setter
+    def fileformat(self,value):
+        if value not in [ 'text', 'binary' ]:
+            self.print_log(type='F', msg='Unsupported fileformat %s' %(value))
+        self._fileformat=value
+        self.invalidate_rtl_fragments()
+
+    @property
+    def binaryio(self):
+        '''True if the file is read and written as binary records.
+
+        '''
+        return self.fileformat=='binary' and self.iotype=='sample'
+
+    @property
+    def iomode(self):
+        '''How the data is transferred to and from the simulator. 'file' (default) | 'fifo' | 'vpi'
+
+        'file' writes the inputs completely before the simulation, and reads
+        the outputs after it. 'fifo' streams the data through a named pipe
+        in a separate thread while the simulator runs, so that Python and the
+        simulator overlap. Data must be integer valued. Not available
+        with LSF, where file IO is used instead.
+
+        'vpi' transfers the data through a shared memory ring buffer accessed
+        by the testbench with the `thesdk_ring` VPI/DPI module, see
+        `rtl.vpi.ring_buffer`. Supported for sample type IO with 'icarus' and
+        'verilator' models, values of at most 64 bits, and local simulations.
+
+        '''
+        if not hasattr(self,'_iomode'):
+            self._iomode='file'
+        return self._iomode
+
+    @iomode.setter
+    def iomode(self,value):
+        if value not in [ 'file', 'fifo', 'vpi' ]:
+            self.print_log(type='F', msg='Unsupported iomode %s' %(value))
+        self._iomode=value
+        self.invalidate_rtl_fragments()
+
+    def start_stream(self):
+        '''Creates the named pipe or ring buffer, and starts the thread streaming the data.
+
+        '''
+        if self.iomode=='vpi':
+            if self.dir=='in':
+                self._stream=ring_writer(path=self.file, data=self.Data)
+            elif self.dir=='out':
+                self._stream=ring_reader(path=self.file, columns=len(self.rtl_connectors))
+            self._stream.start()
+            return
+        if self.binaryio:
+            dtype=self.langmodule.binarydtype
+        else:
+            dtype=None
+        fifo_stream.create(self.file)
+        if self.dir=='in':
+            self._stream=fifo_writer(path=self.file, data=self.Data, dtype=dtype)
+        elif self.dir=='out':
+            self._stream=fifo_reader(path=self.file, columns=len(self.rtl_connectors), dtype=dtype)
+        self._stream.start()
+
+    def finish_stream(self,**kwargs):
+        '''Waits for the streaming thread after the simulator has exited.
+        Output data is assigned to Data.
+
+        Parameters
+        ----------
+        **kwargs :
+            check : bool, True
+                If True, streaming errors are fatal.
+
+        '''
+        if not hasattr(self,'_stream'):
+            return
+        stream=self._stream
+        del self._stream
+        stream.finish()
+        if kwargs.get('check',True):
+            if stream.error is not None:
+                self.print_log(type='F', msg='Streaming %s failed: %s' %(self.file, stream.error))
+            if self.dir=='out':
+                self.Data=stream.Data
+
     @property
     def rtl_timescale(self):
         ''' Timescale for RTL simulations inherited from parent
@@ -110,6 +259,7 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
     @ioformat.setter
     def ioformat(self,value):
         self.langmodule.ioformat=value
+        self.invalidate_rtl_fragments()
 
 
     @property
@@ -134,6 +284,7 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
     @rtl_stat.setter
     def rtl_stat(self,value):
         self.langmodule.rtl_stat=value
+        self.invalidate_rtl_fragments()
 
     #Timestamp integers for control files
     @property
@@ -165,7 +316,7 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
         '''Verilog file read status integer variable definitions and initializations strings.
 
         '''
-        return self.langmodule.rtl_statdef
+        return self._rtl_fragment('rtl_statdef')
 
     #Status integer verilog definitions
 
@@ -175,11 +326,12 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
         '''Verilog file pointer name.
 
         '''
-        return self.langmodule.rtl_fptr
+        return self._rtl_fragment('rtl_fptr')
 
     @rtl_fptr.setter
     def rtl_fptr(self,value):
         self.langmodule.rtl_fptr=value
+        self.invalidate_rtl_fragments()
 
     # File opening, direction dependent 
     @property
@@ -187,7 +339,7 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
         '''Verilog file open routine string.
 
         '''
-        return self.langmodule.rtl_fopen
+        return self._rtl_fragment('rtl_fopen')
 
     # File close
     @property
@@ -195,7 +347,7 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
         '''Verilog file close routine sting.
 
         '''
-        return self.langmodule.rtl_fclose
+        return self._rtl_fragment('rtl_fclose')
     @property
     def rtl_connectors(self):
         ''' List for verilog connectors.
@@ -210,6 +362,7 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
     def rtl_connectors(self,value):
         #Ordered list.
         self._rtl_connectors=value
+        self.invalidate_rtl_fragments()
     
     def connector_datamap(self,**kwargs):
         '''Verilog_connectors is an ordered list. Order defines the assumed order of columns in the 
@@ -232,10 +385,34 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
                 self._verilog_connector_datamap.update({'%s' %(val.name): index})
         return self._verilog_connector_datamap[name]
 
+    def write(self,**kwargs):
+        '''Writes the input data to file. Binary files are written as
+        records of `langmodule.binarydtype`, text files by `iofile.write`.
+
+        '''
+        if self.binaryio:
+            data=np.asarray(self.Data)
+            if np.iscomplexobj(data) or not np.issubdtype(data.dtype, np.integer):
+                self.print_log(type='F', msg='Binary IO file %s requires integer data' %(self.name))
+            data.astype(self.langmodule.binarydtype).tofile(self.file)
+        else:
+            super().write(**kwargs)
+
+    def read(self,**kwargs):
+        '''Reads the output data from file. Binary files are read with
+        `np.fromfile` to an int64 array of one column per connector.
+
+        '''
+        if self.binaryio:
+            data=np.fromfile(self.file, dtype=self.langmodule.binarydtype)
+            self.Data=data.reshape(-1, len(self.rtl_connectors)).astype(np.int64)
+        else:
+            super().read(**kwargs)
+
     def set_control_data(self,**kwargs):
         '''Method to define event based data value with name, time, and value.
-        Uses a python dictionary instead of a numpy array for more efficient insertions.
-        The 'time' column acts as the dictionary key, the remaining columns are stored as the value.
+        Uses an array backed `event_store` instead of a numpy array for more efficient insertions.
+        The 'time' column identifies the event, the remaining columns are stored as the values.
 
         Parameters
         ----------
@@ -256,81 +433,69 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
         assert isinstance(time, int), "Argument 'time' should have the type 'int'"
 
         # Init Data and add first element
-        if self.DictData is None:
-            self.DictData = sc.SortedDict()
+        if self._events is None:
+            self._events = event_store(len(self.rtl_connectors))
             if np.isscalar(init):
-                self.DictData[0] = (np.ones(len(self.rtl_connectors))*init).astype(int)
+                row = np.full(len(self.rtl_connectors)+1, init, dtype=np.int64)
+                row[0] = 0
+                self._events.set_rows(row)
             elif init.shape[1] == len(self.rtl_connectors)+1:
-                init_array = init.astype(int)
-                for row in init_array:
-                    self.DictData[row[0]] = row[1:]
-        # Add subsequent elements as diffs as follows:
-        # None -- no change
-        # int -- change signal to the given value
+                self._events.set_rows(init.astype(np.int64))
+        # Add subsequent elements as changes of single values,
+        # other values are unchanged.
         else:
-            # add a new row if the time is not yet in the dictionary
-            if time not in self.DictData:
-                # init diff as no change
-                self.DictData[time] = [None for _ in range(len(self.rtl_connectors))]
-
-            # change corresponding value
-            self.DictData[time][self.connector_datamap(name=name)-1] = val
+            self._events.set(time, self.connector_datamap(name=name)-1, val)
 
     # Overload self.Data accessors to keep them consistent with the assumption of using numpy arrays
-    # To hold IO data. These methods convert to and from the diff-based data structure used in this
+    # To hold IO data. These methods convert to and from the event based data structure used in this
     # module. I.e. the self.Data property will look like an numpy array as seen from external modules
-    # while in reality it's using the more efficient SortedDict implementation internally.
+    # while in reality it's using the more efficient event_store implementation internally.
 
-    # Getter - This takes the difference based format stored in DictData and converts it to a numpy array
+    # Getter - Returns the forward filled events as a numpy array. Cached until the
+    # next modification.
     @property
     def Data(self):
+        if self.iotype=='event' and getattr(self, '_events', None) is not None:
+            return self._events.dense()
         if not hasattr(self, '_Data'):
             self._Data=None
-
-        else: 
-            if self.iotype=='event' and hasattr(self, '_DictData'):
-                diff_array = np.array([np.insert(signals, 0, time) for (time, signals) in self.DictData.items()])
-
-                # populate None values from previous timestamps
-                transposed = np.transpose(diff_array)
-                for i in range(1, transposed.shape[0]):
-                    for j in range(1, transposed.shape[1]):
-                        if transposed[i,j] is None:
-                            transposed[i,j] = transposed[i, j-1]
-                self._Data = np.transpose(transposed).astype(int)
         return self._Data
 
-    # Setter - Takes a numpy array and converts it to the diff-based SortedDict
+    # Setter - Takes a numpy array and merges it to the events
     @Data.setter
     def Data(self, value):
-        # convert value to equivalent SortedDict representation
         if self.iotype=='event':
-            if self.DictData == None:
-                self._DictData = sc.SortedDict()
-            for row in value:
-                self.DictData[row[0]] = row[1:]
-            # build a numpy array from the dict and sort it by time column
-            diff_array = np.array([np.insert(signals, 0, time) for (time, signals) in self.DictData.items()])
-
-            # populate None values from previous timestamps
-            transposed = np.transpose(diff_array)
-            for i in range(1, transposed.shape[0]):
-                for j in range(1, transposed.shape[1]):
-                    if transposed[i,j] is None:
-                        transposed[i,j] = transposed[i, j-1]
-            self._Data = np.transpose(transposed).astype(int)
+            value=np.asarray(value)
+            if getattr(self, '_events', None) is None:
+                self._events = event_store(value.shape[1]-1)
+            self._events.set_rows(value)
         else:
             self._Data=value
 
     @property
     def DictData(self):
-        if not hasattr(self, '_DictData'):
-            self._DictData=None
-        return self._DictData
+        '''Event based data as a SortedDict {time : [values]}, where unchanged values are None.
+        Read only view of the events, kept for compatibility.
+
+        '''
+        if getattr(self, '_events', None) is None:
+            return None
+        # Imported on first use, as the attribute is rarely needed
+        import sortedcontainers as sc
+        return sc.SortedDict(self._events.items())
 
     @DictData.setter
     def DictData(self, value):
-        self._DictData = value
+        if value is None:
+            self._events = None
+            return
+        items = list(value.items())
+        width = len(items[0][1]) if items else len(self.rtl_connectors)
+        mask = np.array([ [ v is not None for v in signals ] for _, signals in items ], dtype=bool)
+        rows = np.array([ [ time ] + [ 0 if v is None else v for v in signals ]
+            for time, signals in items ], dtype=np.int64)
+        self._events = event_store(width)
+        self._events.set_rows(rows, mask)
 
     # Condition string for monitoring if the signals are unknown
     @property 
@@ -344,6 +509,7 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
     @rtl_io_condition.setter
     def rtl_io_condition(self,value):
         self.langmodule.rtl_io_condition=value
+        self.invalidate_rtl_fragments()
 
     def rtl_io_condition_append(self,**kwargs ):
         '''Append new condition string to `rtl_io_condition`
@@ -355,6 +521,7 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
 
         '''
         self.langmodule.rtl_io_condition_append(**kwargs)
+        self.invalidate_rtl_fragments()
 
     @property 
     def rtl_io_sync(self):
@@ -367,6 +534,7 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
     @rtl_io_sync.setter
     def rtl_io_sync(self,value):
         self.langmodule.rtl_io_sync=value
+        self.invalidate_rtl_fragments()
 
     def rtl_io_condition_append(self,**kwargs ):
         '''Append new condition string to `rtl_io_condition`
@@ -378,6 +546,7 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
 
         '''
         self.langmodule.rtl_io_condition_append(**kwargs)
+        self.invalidate_rtl_fragments()
 
 
     @property
@@ -391,4 +560,4 @@ class rtl_iofile(verilog_iofile_obsoletes,rtl_iofile_common):
 
 
         '''
-        return self.langmodule.rtl_io
+        return self._rtl_fragment('rtl_io')
@@ -1,12 +1,9 @@
 import os
 import sys
-import pdb
 from abc import * 
 from thesdk import *
 from thesdk.iofile import iofile
 import numpy as np
-import pandas as pd
-import sortedcontainers as sc
 """
 ========================
 RTL IOfile common module 
@@ -26,8 +23,14 @@ class rtl_iofile_common(iofile):
 
         '''
         if not hasattr(self,'_file'):
+            if getattr(self,'iomode','file') == 'vpi':
+                suffix='.ring'
+            elif getattr(self,'fileformat','text') == 'binary':
+                suffix='.bin'
+            else:
+                suffix='.txt'
             self._file=self.parent.simpath +'/' + self.name \
-                    + '_' + self.rndpart +'.txt'
+                    + '_' + self.rndpart + suffix
         return self._file
     @file.setter
     def file(self,value):
@@ -0,0 +1,175 @@
+"""
+===========
+RTL profile
+===========
+Timing and resource report of RTL simulation runs.
+
+`run_rtl` records a span for each of its stages, and
+`execute_rtl_sim` one for each simulator step, with the wall clock
+time, the CPU time and the peak memory. The sizes of the IO files are
+recorded as well. The report is available as a dictionary in the
+`rtl_profile` attribute of the entity, and can be exported as JSON or
+in the Chrome trace event format, viewable e.g. in Perfetto or
+chrome://tracing.
+
+Example
+-------
+::
+
+    dut.run_rtl()
+    report = dut.rtl_profile.report
+    dut.rtl_profile.export(file='profile.json', format='chrome')
+
+"""
+import os
+import json
+import time
+import resource
+import threading
+from contextlib import contextmanager
+
+class rtl_profile:
+    ''' Collection of timing spans and IO counters.
+
+    '''
+    def __init__(self, **kwargs):
+        self.spans = []
+        self.io = {}
+
+    def add_span(self, **kwargs):
+        ''' Adds a span.
+
+        Parameters
+        ----------
+        **kwargs :
+            name : str
+            category : str
+                'run_rtl' for stages of the run, 'simulator' for simulator steps.
+            start : float
+                Start time in seconds since the epoch.
+            wall : float
+                Duration in seconds.
+            cpu : float
+                CPU time in seconds.
+            args : dict
+                Additional information.
+
+        '''
+        span = { 'name' : kwargs.get('name'), 'category' : kwargs.get('category', 'run_rtl'),
+                'start' : kwargs.get('start'), 'wall' : kwargs.get('wall'),
+                'cpu' : kwargs.get('cpu'), 'tid' : kwargs.get('tid', threading.get_ident()),
+                'args' : kwargs.get('args', {}) }
+        self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name, category='run_rtl'):
+        ''' Context manager recording the enclosed code as a span. The CPU time
+        is the one of the Python thread, and the peak memory the one of the
+        Python process.
+
+        '''
+        start = time.time()
+        counter = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.add_span(name=name, category=category, start=start,
+                    wall=time.perf_counter() - counter, cpu=time.thread_time() - cpu,
+                    args={ 'maxrss' : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 })
+
+    def add_steps(self, records):
+        ''' Adds the records of `rtl.process_runner.process_runner` as simulator spans.
+
+        '''
+        for record in records:
+            self.add_span(name=record['name'], category='simulator', start=record['start'],
+                    wall=record['wall'], cpu=record['user'] + record['system'],
+                    args={ 'cmd' : record['cmd'], 'maxrss' : record['maxrss'],
+                        'returncode' : record['returncode'] })
+
+    def add_file(self, **kwargs):
+        ''' Records the size of an IO file, if it exists.
+
+        Parameters
+        ----------
+        **kwargs :
+            name : str
+                Name of the IO file.
+            file : str
+                Path of the file.
+            dir : str
+                'in' | 'out'
+
+        '''
+        path = kwargs.get('file')
+        if path and os.path.isfile(path):
+            self.io[kwargs.get('name')] = { 'file' : path, 'dir' : kwargs.get('dir'),
+                    'bytes' : os.path.getsize(path) }
+
+    @property
+    def report(self):
+        ''' Report as a dictionary with keys
+
+        - 'spans' : list of spans, see `add_span`.
+        - 'stages' : total wall time of the spans by name.
+        - 'io' : IO files by name, with their direction and size.
+        - 'io_bytes' : total size of the input and output files.
+        - 'maxrss' : peak memory of Python and of the simulator steps in bytes.
+
+        '''
+        stages = {}
+        for span in self.spans:
+            stages[span['name']] = stages.get(span['name'], 0) + span['wall']
+        io_bytes = { 'in' : 0, 'out' : 0 }
+        for name, item in self.io.items():
+            io_bytes[item['dir']] = io_bytes.get(item['dir'], 0) + item['bytes']
+        return {
+                'spans' : list(self.spans),
+                'stages' : stages,
+                'io' : dict(self.io),
+                'io_bytes' : io_bytes,
+                'maxrss' : {
+                    'python' : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                    'simulator' : max([ span['args'].get('maxrss', 0) for span in self.spans
+                        if span['category'] == 'simulator' ], default=0)
+                    }
+                }
+
+    @property
+    def chrome_trace(self):
+        ''' Report in the Chrome trace event format.
+
+        '''
+        pid = os.getpid()
+        events = []
+        for span in self.spans:
+            events.append({ 'name' : span['name'], 'cat' : span['category'], 'ph' : 'X',
+                'ts' : span['start'] * 1e6, 'dur' : span['wall'] * 1e6,
+                'pid' : pid, 'tid' : span['tid'],
+                'args' : dict(span['args'], cpu=span['cpu']) })
+        for name, item in self.io.items():
+            events.append({ 'name' : 'io_bytes', 'ph' : 'C', 'pid' : pid,
+                'ts' : self.spans[-1]['start'] * 1e6 if self.spans else 0,
+                'args' : { name : item['bytes'] } })
+        return { 'traceEvents' : events, 'displayTimeUnit' : 'ms' }
+
+    def export(self, **kwargs):
+        ''' Writes the report to a file.
+
+        Parameters
+        ----------
+        **kwargs :
+            file : str
+                Output file.
+            format : str, 'json'
+                'json' for `report`, 'chrome' for `chrome_trace`.
+
+        '''
+        if kwargs.get('format', 'json') == 'chrome':
+            data = self.chrome_trace
+        else:
+            data = self.report
+        with open(kwargs.get('file'), 'w') as outfile:
+            json.dump(data, outfile, indent=1)
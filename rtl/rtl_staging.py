@@ -0,0 +1,101 @@
+"""
+===========
+RTL staging
+===========
+Staging of the RTL sources to the simulation directory.
+
+Sources can be staged as copies, or without copying the contents as
+symbolic links, hard links or reflinks (copy-on-write clones, supported
+e.g. by Btrfs and XFS). Hard links and reflinks fall back to copying,
+if the file system does not support them or the source is on another
+file system.
+
+The staged files are recorded in a manifest in the simulation
+directory, with the source path, modification time and size. A file is
+staged again only if its source has changed, so that a preserved
+simulation directory is reused as is. Files in the simulation directory
+not in the manifest are considered externally generated, and are
+never replaced.
+
+"""
+import os
+import json
+import fcntl
+import shutil
+
+manifest_name = '.rtl_staging.json'
+
+# ioctl request of Linux for cloning a file, FICLONE
+_ficlone = 0x40049409
+
+strategies = [ 'copy', 'symlink', 'hardlink', 'reflink' ]
+
+def _reflink(src, dst):
+    ''' Clones `src` to `dst`. Raises OSError if not supported.
+
+    '''
+    with open(src, 'rb') as infile, open(dst, 'wb') as outfile:
+        try:
+            fcntl.ioctl(outfile.fileno(), _ficlone, infile.fileno())
+        except OSError:
+            outfile.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+def stage_file(src, dst, strategy='copy'):
+    ''' Stages `src` to `dst` replacing an existing `dst`. Returns the
+    strategy actually used.
+
+    Parameters
+    ----------
+    src : str
+        Source file. Must not be a symbolic link.
+    dst : str
+        Staged file.
+    strategy : str
+        'copy' | 'symlink' | 'hardlink' | 'reflink'
+
+    '''
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if strategy == 'symlink':
+        os.symlink(os.path.abspath(src), dst)
+        return strategy
+    if strategy in [ 'hardlink', 'reflink' ]:
+        try:
+            if strategy == 'hardlink':
+                os.link(src, dst)
+            else:
+                _reflink(src, dst)
+            return strategy
+        except OSError:
+            # Another file system, or links not supported
+            pass
+    shutil.copyfile(src, dst, follow_symlinks=False)
+    return 'copy'
+
+def source_stamp(src):
+    ''' Identification of the source file contents: the real path,
+    modification time and size.
+
+    '''
+    stat = os.stat(src)
+    return [ os.path.realpath(src), stat.st_mtime_ns, stat.st_size ]
+
+def load_manifest(path):
+    ''' Returns the manifest of simulation directory `path`, {name : entry}
+    where entry has keys 'stamp' and 'strategy'.
+
+    '''
+    try:
+        with open(os.path.join(path, manifest_name)) as infile:
+            return json.load(infile)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(path, manifest):
+    file = os.path.join(path, manifest_name)
+    with open(file + '.tmp', 'w') as outfile:
+        json.dump(manifest, outfile, indent=1)
+    os.replace(file + '.tmp', file)
@@ -0,0 +1,150 @@
+"""
+===============
+Simulation pool
+===============
+Runs the RTL simulations of several entities concurrently.
+
+The Python side of a simulation mostly waits for the external simulator
+process, so the entities are run in a bounded thread pool. Each entity
+must have its own `rtlsimpath`, and the results are connected to the
+IOS of each entity as in a normal call of `run_rtl`.
+
+Example
+-------
+Run three configured entities with two workers::
+
+    pool = simulation_pool(max_workers=2)
+    pool.run(entities=[dut1, dut2, dut3])
+
+"""
+import os
+import copy
+from thesdk import *
+
+class simulation_pool(thesdk):
+    def __init__(self, **kwargs):
+        '''Parameters
+        ----------
+        **kwargs :
+            max_workers : int
+                Maximum number of concurrent simulations. Default is the
+                number of cores available to this process.
+            method : str, 'run_rtl'
+                Name of the method executed for each entity.
+        '''
+        self.max_workers = kwargs.get('max_workers', None)
+        self.method = kwargs.get('method', 'run_rtl')
+
+    @property
+    def max_workers(self):
+        ''' Maximum number of concurrent simulations.
+
+        '''
+        if self._max_workers is None:
+            try:
+                self._max_workers = len(os.sched_getaffinity(0))
+            except AttributeError:
+                self._max_workers = os.cpu_count() or 1
+        return self._max_workers
+    @max_workers.setter
+    def max_workers(self, value):
+        self._max_workers = value
+
+    # Attributes caching paths of a single simulation run
+    _run_attributes = [ '_simpath', '_rtlsimpath', '_rtlworkpath', '_simtb',
+            '_simdut', '_rtlcmd', '_rtlcmd_custom', '_rtl_compile_cache_workpath',
+            '_rtl_compile_cache_lockfile', '_rtl_runner', '_rtl_step_records', '_rtl_profile' ]
+    # Attributes reset only if generated under the old simpath
+    _generated_attributes = [ '_simulator_controlfile', '_interactive_controlfile' ]
+
+    def isolate(self, **kwargs):
+        ''' Resets the simulation paths of an entity, so that it runs in its own
+        `rtlsimpath`. Used for copies of an entity.
+
+        Parameters
+        ----------
+        **kwargs :
+            entity : rtl
+                Entity to isolate
+            runname : str
+                New run name of the entity
+
+        '''
+        entity = kwargs.get('entity')
+        oldsimpath = entity.simpath
+        for attr in self._generated_attributes:
+            if str(entity.__dict__.get(attr, '')).startswith(oldsimpath):
+                delattr(entity, attr)
+        for attr in self._run_attributes:
+            if attr in entity.__dict__:
+                delattr(entity, attr)
+        entity.runname = kwargs.get('runname')
+        for name, iofile in entity.iofile_bundle.Members.items():
+            langmodules = [ getattr(iofile, attr, None) for attr in
+                    [ '_langmodule_verilog', '_langmodule_vhdl', '_langmodule_vpi' ] ]
+            for obj in [ iofile ] + langmodules:
+                if obj is not None:
+                    obj.__dict__.pop('_file', None)
+                    obj.__dict__.pop('_rtlparam', None)
+                    obj.__dict__.pop('_rtl_fragments', None)
+            for obj in langmodules:
+                if obj is not None:
+                    obj.file = iofile.file
+        return entity
+
+    def clone(self, **kwargs):
+        ''' Returns an isolated copy of an entity.
+
+        The parent of the entity is shared, not copied.
+
+        Parameters
+        ----------
+        **kwargs :
+            entity : rtl
+                Entity to copy
+            runname : str
+                Run name of the copy
+
+        '''
+        entity = kwargs.get('entity')
+        memo = {}
+        if getattr(entity, 'parent', None) is not None:
+            memo[id(entity.parent)] = entity.parent
+        duplicate = copy.deepcopy(entity, memo)
+        return self.isolate(entity=duplicate, runname=kwargs.get('runname'))
+
+    def run(self, **kwargs):
+        ''' Runs `method` of all the given entities in the pool.
+
+        Parameters
+        ----------
+        **kwargs :
+            entities : list of rtl
+                Configured entities. Each must have a distinct `rtlsimpath`.
+
+        Returns
+        -------
+        list
+            The entities, with the simulation outputs connected to their IOS.
+
+        '''
+        entities = list(kwargs.get('entities', []))
+        paths = [ entity.rtlsimpath for entity in entities ]
+        if len(set(paths)) != len(paths):
+            self.print_log(type='F', msg='Entities in a simulation pool must have distinct rtlsimpaths.')
+        self.print_log(type='I', msg='Running %d simulations with %d workers'
+                % (len(entities), self.max_workers))
+        failed = []
+        # Imported on first use to keep the import of the rtl package light
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [ executor.submit(getattr(entity, self.method)) for entity in entities ]
+            for entity, future in zip(entities, futures):
+                try:
+                    future.result()
+                except BaseException as e:
+                    self.print_log(type='E', msg='Simulation in %s failed: %s' % (entity.rtlsimpath, e))
+                    failed.append(entity)
+        if failed:
+            self.print_log(type='F', msg='%d of %d simulations failed' % (len(failed), len(entities)))
+        return entities
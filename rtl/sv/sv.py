@@ -9,7 +9,6 @@ are used by simulator specific classes.
 Initially written by Marko Kosunen 30.10.20200, marko.kosunen@aalto.fi
 """
 from thesdk import *
-from rtl.rtl_iofile import rtl_iofile as rtl_iofile
 
 class sv(thesdk,metaclass=abc.ABCMeta):
 
@@ -116,6 +115,7 @@ class sv(thesdk,metaclass=abc.ABCMeta):
            2) IOS of the verilog DUT
 
         '''
+        from rtl.rtl_iofile import rtl_iofile
         # Create TB connectors from the control file
         # See controller.py
         for ioname,io in self.IOS.Members.items():
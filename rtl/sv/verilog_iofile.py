@@ -12,15 +12,13 @@ Yue Dai, 2018
 """
 import os
 import sys
-import pdb
 from abc import *
 from thesdk import *
 #from thesdk.iofile import iofile
 from rtl.rtl_iofile_common import rtl_iofile_common
 import numpy as np
-import pandas as pd
-import sortedcontainers as sc
 from rtl.connector import indent
+from rtl.code_emitter import code_emitter
 
 class verilog_iofile(rtl_iofile_common):
     """
@@ -48,6 +46,20 @@ class verilog_iofile(rtl_iofile_common):
     def ioformat(self,value):
         self._ioformat=value
 
+    @property
+    def binarydtype(self):
+        '''NumPy dtype of the records of binary IO files. 64-bit little-endian integer.
+
+        '''
+        return '<i8'
+
+    def binary_swap(self,name):
+        '''Verilog expression reordering the bytes of a 64-bit buffer read
+        with `$fread`, that reads the first byte of the file to the MSB.
+
+        '''
+        return '{%s}' %(', '.join([ '%s[%s:%s]' %(name, 8*i+7, 8*i) for i in range(8) ]))
+
     @property
     def rtlparam(self):
         '''Extracts the parameter name and value from simparam attribute.
@@ -62,6 +74,39 @@ class verilog_iofile(rtl_iofile_common):
             self._rtlparam={key:('string','\"%s\"'%(val))}
         return self._rtlparam
 
+    @property
+    def rtl_plusargs_files(self):
+        '''True if the file name is read from the simulator command line with
+        `$value$plusargs`. Set with the `rtl_plusargs_files` attribute of the entity.
+
+        '''
+        return getattr(self.parent.parent, 'rtl_plusargs_files', False)
+
+    @property
+    def rtl_fname(self):
+        '''Verilog expression of the file name. The file parameter, or with
+        `rtl_plusargs_files`, a string variable read from the plusarg named after the
+        parameter, falling back to the parameter value.
+
+        '''
+        if self.rtl_plusargs_files:
+            return 'fname_%s' %(self.name)
+        return next(iter(self.rtlparam))
+
+    def rtl_initial_open(self, call):
+        '''Initial block assigning the result of the file open `call` to the file pointer.
+        With `rtl_plusargs_files`, the file name is read from the command line first.
+
+        '''
+        if not self.rtl_plusargs_files:
+            return 'initial %s = %s;\n' %(self.rtl_fptr, call)
+        param=next(iter(self.rtlparam))
+        return ('initial begin\n'
+                + indent(text='if (!$value$plusargs("%s=%%s", %s)) %s = %s;' %(param,
+                    self.rtl_fname, self.rtl_fname, param), level=1)
+                + indent(text='%s = %s;' %(self.rtl_fptr, call), level=1)
+                + 'end\n')
+
     # Status parameter
     @property
     def rtl_stat(self):
@@ -126,14 +171,23 @@ class verilog_iofile(rtl_iofile_common):
         '''
         if self.parent.iotype =='sample':
             self._rtl_statdef = 'integer %s, %s;\n' %(self.rtl_stat, self.rtl_fptr)
+            if self.parent.binaryio:
+                binbufs=[]
+                for connector in self.parent.rtl_connectors:
+                    if isinstance(connector.width,int) and connector.width > 64:
+                        self.print_log(type='F', msg='Connector %s is too wide for binary IO' %(connector.name))
+                    binbufs.append('reg [63:0] binbuf_%s;\n' %(connector.name))
+                self._rtl_statdef+=''.join(binbufs)
         elif self.parent.iotype =='event':
             self._rtl_statdef = 'integer %s, %s;\n' %(self.rtl_stat, self.rtl_fptr)
             self._rtl_statdef += 'time %s, %s, %s;\n' %(self.rtl_ctstamp,
                     self.rtl_pstamp, self.rtl_tdiff)
             self._rtl_statdef += 'initial %s=0;\n' %(self.rtl_ctstamp)
             self._rtl_statdef += 'initial %s=0;\n' %(self.rtl_pstamp)
-            for connector in self.parent.rtl_connectors:
-                self._rtl_statdef+='integer buffer_%s;\n' %(connector.name)
+            self._rtl_statdef+=''.join([ 'integer buffer_%s;\n' %(connector.name)
+                for connector in self.parent.rtl_connectors ])
+        if self.rtl_plusargs_files:
+            self._rtl_statdef += 'string %s;\n' %(self.rtl_fname)
         return self._rtl_statdef
 
     # File opening, direction dependent
@@ -142,10 +196,14 @@ class verilog_iofile(rtl_iofile_common):
         '''Verilog file open routine string.
 
         '''
+        if self.parent.binaryio:
+            binary='b'
+        else:
+            binary=''
         if self.parent.dir == 'in':
-            self._rtl_fopen = 'initial %s = $fopen(%s,\"r\");\n' %(self.rtl_fptr,next(iter(self.rtlparam)))
+            self._rtl_fopen = self.rtl_initial_open('$fopen(%s,\"r%s\")' %(self.rtl_fname,binary))
         if self.parent.dir == 'out':
-            self._rtl_fopen = 'initial %s = $fopen(%s,\"w\");\n' %(self.rtl_fptr,next(iter(self.rtlparam)))
+            self._rtl_fopen = self.rtl_initial_open('$fopen(%s,\"w%s\")' %(self.rtl_fname,binary))
         return self._rtl_fopen
 
     # File close
@@ -169,14 +227,8 @@ class verilog_iofile(rtl_iofile_common):
         '''
         if not hasattr(self, '_rtl_io_condition'):
             if self.parent.dir=='out':
-                first=True
-                for connector in self.parent.rtl_connectors:
-                    if first:
-                        self._rtl_io_condition='~$isunknown(%s)' %(connector.name)
-                        first=False
-                    else:
-                        self._rtl_io_condition='%s \n&& ~$isunknown(%s)' \
-                                %(self._rtl_io_condition,connector.name)
+                self._rtl_io_condition=' \n&& '.join([ '~$isunknown(%s)' %(connector.name)
+                    for connector in self.parent.rtl_connectors ])
             elif self.parent.dir=='in':
                 self.rtl_io_condition= ' 1 '
         return self._rtl_io_condition
@@ -227,74 +279,100 @@ class verilog_iofile(rtl_iofile_common):
 
 
         '''
-        first=True
-        if self.parent.iotype=='sample':
+        out=code_emitter()
+        if self.parent.binaryio:
+            # Records of 64-bit little-endian integers, one per connector.
+            # Sign extension is done by the assignment to the buffer.
+            if self.parent.dir=='out':
+                out.write('always '+self.rtl_io_sync +'begin\n')
+                with out.block():
+                    out.indent(text='if ( %s ) begin\n' %(self.rtl_io_condition))
+                    with out.block():
+                        for connector in self.parent.rtl_connectors:
+                            out.indent(text='binbuf_%s = %s;' %(connector.name,connector.name))
+                        out.indent(text='$fwrite(%s, \"%s\", %s);' %(self.rtl_fptr,
+                            '%u'*len(self.parent.rtl_connectors),
+                            ', '.join([ 'binbuf_%s' %(connector.name) for connector in self.parent.rtl_connectors ])))
+                    out.indent(text='end')
+                out.indent(text='end')
+            elif self.parent.dir=='in':
+                out.write('while (!$feof(%s)) begin\n' %(self.rtl_fptr))
+                out.indent(text='%s' %self.rtl_io_sync)
+                with out.block():
+                    out.indent(text='if ( %s ) begin\n' %self.rtl_io_condition)
+                    with out.block():
+                        for connector in self.parent.rtl_connectors:
+                            out.indent(text='%s = $fread(binbuf_%s, %s);' %(self.rtl_stat,
+                                connector.name, self.rtl_fptr))
+                            out.indent(text='%s = %s;' %(connector.name,
+                                self.binary_swap('binbuf_%s' %(connector.name))))
+                        # Peek the next byte, so that $feof is true after the last record
+                        out.indent(text='%s = $fgetc(%s);' %(self.rtl_stat, self.rtl_fptr))
+                        out.indent(text='if ( %s != -1 ) %s = $ungetc(%s, %s);' %(self.rtl_stat,
+                            self.rtl_stat, self.rtl_stat, self.rtl_fptr))
+                    out.indent(text='end')
+                out.indent(text='end')
+        elif self.parent.iotype=='sample':
             if self.parent.dir=='out':
-                self._rtl_io='always '+self.rtl_io_sync +'begin\n'
-                self._rtl_io+=indent(text='if ( %s ) begin\n' %(self.rtl_io_condition), level=1)
-                self._rtl_io+=indent(text='$fwrite(%s, ' %(self.rtl_fptr), level=2)
+                out.write('always '+self.rtl_io_sync +'begin\n')
+                out.indent(text='if ( %s ) begin\n' %(self.rtl_io_condition), level=1)
+                out.indent(text='$fwrite(%s, ' %(self.rtl_fptr), level=2)
             elif self.parent.dir=='in':
-                self._rtl_io='while (!$feof(f_%s)) begin\n' %self.name
-                self._rtl_io+=indent(text='%s' %self.rtl_io_sync, level=0)
-                self._rtl_io+=indent(text='if ( %s ) begin\n' %self.rtl_io_condition, level=1)
-                self._rtl_io+=indent(text='%s = $fscanf(%s, ' \
+                out.write('while (!$feof(f_%s)) begin\n' %self.name)
+                out.indent(text='%s' %self.rtl_io_sync)
+                out.indent(text='if ( %s ) begin\n' %self.rtl_io_condition, level=1)
+                out.indent(text='%s = $fscanf(%s, ' \
                         %(self.rtl_stat, self.rtl_fptr), level=2)
-            for connector in self.parent.rtl_connectors:
-                if first:
-                    iolines='%s' %(connector.name)
-                    format='\"%s' %(connector.ioformat)
-                    first=False
-                else:
-                    iolines='%s,\n%s' %(iolines,connector.name)
-                    format='%s\\t%s' %(format,connector.ioformat)
-
+            iolines=',\n'.join([ connector.name for connector in self.parent.rtl_connectors ])
+            format='\"'+'\\t'.join([ connector.ioformat for connector in self.parent.rtl_connectors ])
             format=format+'\\n\",\n'
-            self._rtl_io+=indent(text=format+iolines+'\n);',level=2)+indent(text='end', level=1)+indent(text='end', level=0)
+            out.indent(text=format+iolines+'\n);',level=2)
+            out.indent(text='end', level=1)
+            out.indent(text='end')
 
         #Control files are handled differently
         elif self.parent.iotype=='event':
             if self.parent.dir=='out':
                 self.print_log(type='F', msg='Output writing for control files not supported')
             elif self.parent.dir=='in':
-                self._rtl_io='begin\nwhile(!$feof(%s)) begin\n    ' \
-                        %(self.rtl_fptr)
-                self._rtl_io+='%s = %s-%s;\n    #%s begin\n    ' \
+                out.write('begin\nwhile(!$feof(%s)) begin\n    ' \
+                        %(self.rtl_fptr))
+                out.write('%s = %s-%s;\n    #%s begin\n    ' \
                         %(self.rtl_tdiff,
                         self.rtl_ctstamp, self.rtl_pstamp,
-                        self.rtl_tdiff)
+                        self.rtl_tdiff))
 
                 #t= Every control file requires status, diff, current_timestamp
                 # and past timestamp
-                self._rtl_io+='    %s = %s;\n    ' \
-                        %(self.rtl_pstamp, self.rtl_ctstamp)
+                out.write('    %s = %s;\n    ' \
+                        %(self.rtl_pstamp, self.rtl_ctstamp))
 
                 for connector in self.parent.rtl_connectors:
-                    self._rtl_io+='    %s = buffer_%s;\n    ' \
-                            %(connector.name,connector.name)
+                    out.write('    %s = buffer_%s;\n    ' \
+                            %(connector.name,connector.name))
 
-                self._rtl_io+='    %s = $fscanf(%s, ' \
-                        %(self.rtl_stat,self.rtl_fptr)
+                out.write('    %s = $fscanf(%s, ' \
+                        %(self.rtl_stat,self.rtl_fptr))
 
             #The first column is timestap
-            iolines='            %s' %(self.rtl_ctstamp)
-            format='\"%d'
-            for connector in self.parent.rtl_connectors:
-                iolines='%s,\n            buffer_%s' \
-                        %(iolines,connector.name)
-                format='%s\\t%s' %(format,connector.ioformat)
+            iolines=',\n'.join([ '            %s' %(self.rtl_ctstamp) ]
+                    + [ '            buffer_%s' %(connector.name) for connector in self.parent.rtl_connectors ])
+            format='\\t'.join([ '\"%d' ]
+                    + [ connector.ioformat for connector in self.parent.rtl_connectors ])
             format=format+'\\n\",\n'
-            self._rtl_io+=format+iolines+'\n        );\n    end\nend\n'
+            out.write(format+iolines+'\n        );\n    end\nend\n')
 
             #Repeat the last assignment outside the loop
-            self._rtl_io+='%s = %s-%s;\n#%s begin\n' %(self.rtl_tdiff,
-                    self.rtl_ctstamp, self.rtl_pstamp,self.rtl_tdiff)
-            self._rtl_io+='    %s = %s;\n' %(self.rtl_pstamp,
-                    self.rtl_ctstamp)
+            out.write('%s = %s-%s;\n#%s begin\n' %(self.rtl_tdiff,
+                    self.rtl_ctstamp, self.rtl_pstamp,self.rtl_tdiff))
+            out.write('    %s = %s;\n' %(self.rtl_pstamp,
+                    self.rtl_ctstamp))
             for connector in self.parent.rtl_connectors:
-                self._rtl_io+='    %s = buffer_%s;\n' \
-                %(connector.name,connector.name)
-            self._rtl_io+='end\nend\n'
+                out.write('    %s = buffer_%s;\n' \
+                %(connector.name,connector.name))
+            out.write('end\nend\n')
         else:
             self.print_log(type='F', msg='Iotype not defined')
+        self._rtl_io=out.getvalue()
         return self._rtl_io
 
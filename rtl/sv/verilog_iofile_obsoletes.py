@@ -19,7 +19,7 @@ class verilog_iofile_obsoletes():
 
     @verilog_stat.setter
     def verilog_stat(self,value):
-        self.langmodule.rtl_stat=value
+        self.rtl_stat=value
 
 
     #Timestamp integers for control files
@@ -69,7 +69,7 @@ able definitions and initializations strings.
 
     @verilog_fptr.setter
     def verilog_fptr(self,value):
-        self.langmodule._rtl_fptr=value
+        self.rtl_fptr=value
 
     # File opening, direction dependent 
     @property
@@ -0,0 +1,269 @@
+"""
+==============
+Verilog lexer
+==============
+Single pass tokenizer and interface parser for Verilog modules.
+
+The source is scanned once from the beginning to the end of the module.
+Comments, strings and compiler directives are recognized, so that
+they do not confuse the parsing. The parser extracts the header
+parameters and the ports of a named module, with the directions and
+ranges given either in the ANSI port list or in the module body.
+
+The result is plain data, so that it can be stored and compared::
+
+    {
+        'parameters' : [ (name, value), ... ],
+        'ports' : [ { 'name' : name, 'cls' : 'input' | 'output' | 'inout' | None,
+                      'll' : str | None, 'rl' : str | None }, ... ]
+    }
+
+"""
+import re
+
+# Version of the output of parse_module, invalidates the interface cache
+parser_version = '1'
+
+_token_regex = re.compile(r'''
+      (?P<ws>\s+)
+    | (?P<comment>//[^\n]*|/\*.*?\*/)
+    | (?P<string>"(?:\\.|[^"\\])*")
+    | (?P<ident>[a-zA-Z_][a-zA-Z0-9_$]*|\\\S+|`[a-zA-Z_][a-zA-Z0-9_$]*|\$[a-zA-Z_][a-zA-Z0-9_$]*)
+    | (?P<number>[0-9][0-9_]*(?:\.[0-9_]+)?|'[sS]?[bBoOdDhH]\s*[0-9a-fA-FxXzZ?_]+|'[01xXzZ])
+    | (?P<op>.)
+    ''', re.S | re.X)
+
+_directions = { 'input', 'output', 'inout' }
+
+# Keywords that may precede a port or parameter name
+_types = { 'wire', 'reg', 'logic', 'var', 'tri', 'tri0', 'tri1', 'wand', 'wor',
+        'triand', 'trior', 'supply0', 'supply1', 'uwire', 'signed', 'unsigned',
+        'integer', 'int', 'shortint', 'longint', 'byte', 'bit', 'real', 'time',
+        'realtime', 'string', 'parameter', 'localparam', 'type' }
+
+# Blocks, whose declarations do not belong to the module interface
+_blocks = { 'function' : 'endfunction', 'task' : 'endtask' }
+
+# Skips comments and strings, and finds the keywords relevant for the interface
+_keyword_regex = re.compile(r'''
+      //[^\n]*|/\*.*?\*/
+    | "(?:\\.|[^"\\])*"
+    | (?<![\w$`\\])(?P<keyword>(?:macro)?module|input|output|inout|function|endfunction|task|endtask|endmodule)(?![\w$])
+    ''', re.S | re.X)
+
+def tokenize(text, pos=0):
+    ''' Yields the tokens of Verilog source text starting from pos as
+    (kind, text, end), where kind is 'string', 'ident', 'number' or 'op',
+    and end the position after the token. Whitespace and comments are skipped.
+
+    '''
+    for match in _token_regex.finditer(text, pos):
+        kind = match.lastgroup
+        if kind != 'ws' and kind != 'comment':
+            yield kind, match.group(), match.end()
+
+def _statement(text, pos):
+    ''' Returns the tokens from pos to the next semicolon outside of
+    parentheses, and the position after the semicolon.
+
+    '''
+    tokens = []
+    depth = 0
+    for kind, value, end in tokenize(text, pos):
+        if kind == 'op':
+            if value == '(':
+                depth += 1
+            elif value == ')':
+                depth -= 1
+            elif value == ';' and depth == 0:
+                return tokens, end
+        tokens.append((kind, value))
+    return tokens, len(text)
+
+def _split(tokens):
+    ''' Splits a token list at the commas outside of brackets.
+
+    '''
+    items = [[]]
+    depth = 0
+    for kind, value in tokens:
+        if kind == 'op':
+            if value in '([{':
+                depth += 1
+            elif value in ')]}':
+                depth -= 1
+            elif value == ',' and depth == 0:
+                items.append([])
+                continue
+        items[-1].append((kind, value))
+    return [ item for item in items if item ]
+
+def _join(tokens):
+    return ''.join(value for kind, value in tokens)
+
+def _range(tokens, start):
+    ''' Parses a range [ll:rl] starting at tokens[start]. Returns (ll, rl, end),
+    where end is the index after the closing bracket.
+
+    '''
+    depth = 0
+    colon = None
+    for index in range(start, len(tokens)):
+        kind, value = tokens[index]
+        if kind != 'op':
+            continue
+        if value in '([{':
+            depth += 1
+        elif value in ')]}':
+            depth -= 1
+            if depth == 0:
+                if colon is None:
+                    return None, None, index + 1
+                return ( _join(tokens[start+1:colon]),
+                        _join(tokens[colon+1:index]), index + 1 )
+        elif value == ':' and depth == 1 and colon is None:
+            colon = index
+    return None, None, len(tokens)
+
+def _declaration(tokens):
+    ''' Parses a port declaration or a port list item.
+    Returns (cls, ll, rl, names).
+
+    '''
+    cls = None
+    ll = rl = None
+    names = []
+    index = 0
+    while index < len(tokens):
+        kind, value = tokens[index]
+        if kind == 'ident' and value in _directions and cls is None and not names:
+            cls = value
+        elif kind == 'ident' and value in _types:
+            pass
+        elif kind == 'op' and value == '[':
+            if names:
+                # Unpacked dimensions of the previous name
+                index = _range(tokens, index)[2]
+                continue
+            if ll is None:
+                ll, rl, index = _range(tokens, index)
+                continue
+            index = _range(tokens, index)[2]
+            continue
+        elif kind == 'op' and value == '=':
+            # Default value
+            break
+        elif kind == 'ident':
+            names.append(value)
+        index += 1
+    return cls, ll, rl, names
+
+def _parameters(tokens):
+    ''' Parses the parameter port list. Returns a list of (name, value).
+
+    '''
+    parameters = []
+    for item in _split(tokens):
+        for index, (kind, value) in enumerate(item):
+            if kind == 'op' and value == '=':
+                names = [ v for k, v in item[:index] if k == 'ident' and v not in _types ]
+                if names:
+                    parameters.append((names[-1], _join(item[index+1:])))
+                break
+    return parameters
+
+def _group(tokens, start):
+    ''' Returns the index of the parenthesis closing the one at tokens[start].
+
+    '''
+    depth = 0
+    for index in range(start, len(tokens)):
+        kind, value = tokens[index]
+        if kind == 'op':
+            if value == '(':
+                depth += 1
+            elif value == ')':
+                depth -= 1
+                if depth == 0:
+                    return index
+    return len(tokens)
+
+def parse_module(text, name):
+    ''' Parses the interface of module `name` from Verilog source text.
+    Only the module header and the port declarations are tokenized, the rest
+    of the module body is skipped with a keyword search.
+
+    Returns
+    -------
+    dict or None
+        Parameters and ports of the module, see module documentation.
+        None if the module is not found.
+
+    '''
+    # Find the module header
+    header = None
+    for match in _keyword_regex.finditer(text):
+        if match.group('keyword') in ('module', 'macromodule'):
+            tokens, end = _statement(text, match.end())
+            if tokens and tokens[0] == ('ident', name):
+                header = tokens[1:]
+                break
+    if header is None:
+        return None
+
+    parameters = []
+    portlist = []
+    index = 0
+    if index < len(header) and header[index] == ('op', '#'):
+        stop = _group(header, index + 1)
+        parameters = _parameters(header[index+2:stop])
+        index = stop + 1
+    if index < len(header) and header[index] == ('op', '('):
+        stop = _group(header, index)
+        portlist = header[index+1:stop]
+
+    ports = []
+    byname = {}
+    previous = None
+    for item in _split(portlist):
+        cls, ll, rl, names = _declaration(item)
+        if not names:
+            continue
+        if cls is None and previous is not None:
+            # ANSI ports inherit the direction and range of the previous port
+            cls, ll, rl = previous
+        elif cls is not None:
+            previous = (cls, ll, rl)
+        port = { 'name' : names[-1], 'cls' : cls, 'll' : ll, 'rl' : rl }
+        ports.append(port)
+        byname[port['name']] = port
+
+    # Port declarations of the module body. Direction keywords are reserved,
+    # so outside of functions and tasks they always start a port declaration.
+    pos = end
+    block = None
+    while True:
+        match = _keyword_regex.search(text, pos)
+        if match is None:
+            break
+        pos = match.end()
+        keyword = match.group('keyword')
+        if keyword is None:
+            continue
+        if block is not None:
+            if keyword == _blocks[block]:
+                block = None
+        elif keyword in _blocks:
+            block = keyword
+        elif keyword == 'endmodule':
+            break
+        elif keyword in _directions:
+            statement, pos = _statement(text, match.start())
+            cls, ll, rl, names = _declaration(statement)
+            for portname in names:
+                if portname in byname:
+                    byname[portname]['cls'] = cls
+                    if ll is not None:
+                        byname[portname]['ll'] = ll
+                        byname[portname]['rl'] = rl
+    return { 'parameters' : parameters, 'ports' : ports }
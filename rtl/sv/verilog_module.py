@@ -13,10 +13,12 @@ Initially written by Marko Kosunen, 2017
 """
 import os
 from thesdk import *
-from rtl import *
+import re
 from copy import deepcopy
 from rtl.connector import *
 from rtl.module_common import module_common
+from rtl.sv.verilog_lexer import parse_module, parser_version
+from rtl.interface_cache import cached_interface
 
 class verilog_module(module_common,thesdk):
     """Objective:
@@ -53,6 +55,19 @@ class verilog_module(module_common,thesdk):
         '''
         super().__init__(**kwargs)
     
+    @property
+    def interface(self):
+        '''Interface of the module parsed from `file` with `verilog_lexer.parse_module`.
+        Dict of parameters and ports, None if the module is not found.
+        Shared by `ios` and `parameters`. Parsing results are cached on disk
+        with `rtl.interface_cache`.
+
+        '''
+        if not hasattr(self,'_interface'):
+            self._interface=cached_interface(file=self.file, name=self.name,
+                    lang='sv', parser=parse_module, version=parser_version)
+        return self._interface
+
     @property
     def ios(self):
         '''Verilog connector bundle containing connectors for all module IOS.
@@ -62,79 +77,28 @@ class verilog_module(module_common,thesdk):
 
         '''
         if not hasattr(self,'_ios'):
-            # multiline regex for parsing relevant sections of a module definition
-            # capture groups:
-            #   0. (full match)
-            #   1. module parameter port list
-            #   2. list of ports
-            #   3. module items
-            #
-            # playground: https://regex101.com/r/n2Zmgn/1
-            module_pattern = r"module\s*"+self.name+r"\s*(\s*#\([\s\S]*?\))?\s*\(([\s\S]*?)\);([\s\S]*?)endmodule"
-            module_regex = re.compile(module_pattern)
-
-            # regex pattern for parsing port declarations
-            # capture groups:
-            #   0. (full match)
-            #   1. port direction   (input|output|inout)
-            #   2. port type        (wire|reg)
-            #   3. port size        [msb:lsb]
-            #     4. msb index
-            #     5. lsb index
-            #   6. port name (identifier)
-            #
-            # playground: https://regex101.com/r/eiZDS0/1
-            # TODO: add support for escaped identifiers
-            def port_pattern(identifier):
-                return fr"\s*(input|output|inout)?\s*(wire|reg)?\s*(\[\s*([0-9]+)\s*:\s*([0-9]+)\s*\])?\s*({identifier})"
-
-            port_identifier_pattern = r"[a-zA-Z_]+[a-zA-Z0-9_$]*"
-            port_regex = re.compile(port_pattern(port_identifier_pattern))
-
             self._ios=rtl_connector_bundle()
             self.print_log(type='I', msg="{}".format(self.file))
             if not os.path.isfile(self.file):
                 self.print_log(type='F', msg='File does not exist: %s' % self.file)
 
-            # parse module IO definitions
-            with open(self.file) as infile:
-                file_str = infile.read()
-                module_match = re.search(module_regex, file_str)
-                if module_match is not None:
-                    signals = []
-                    port_list = module_match.group(2).split(',')
-                    for port in port_list:
-                        port_match = re.search(port_regex, port)
-                        signal=rtl_connector(lang='sv')
-                        signal.cls=port_match.group(1)
-                        if port_match.group(3) is not None:
-                            signal.ll=port_match.group(4)
-                            signal.rl=port_match.group(5)
-                        signal.name=port_match.group(6)
-                        signals.append(signal)
-
-                    # look for port information in module items since
-                    # some tools output verilog in a format where the port declarations are
-                    # split between the module port list and the module body
-                    for signal in signals:
-                        # fill in IO information defined in module body
-                        signal_regex = re.compile(port_pattern(signal.name))
-                        match = re.search(signal_regex, module_match.group(3))
-                        if match is not None:
-                            if match.group(1) is not None:
-                                signal.cls = match.group(1)
-                            if match.group(3) is not None:
-                                signal.ll = match.group(4)
-                                signal.rl = match.group(5)
-
-                        # By default, we create a connector that is cross connected to the input
-                        signal.connect=deepcopy(signal)
-                        if signal.cls=='input':
-                            signal.connect.cls='reg'
-                        if signal.cls=='output':
-                            signal.connect.cls='wire'
-                        signal.connect.connect=signal
-                        self._ios.Members[signal.name]=signal
+            if self.interface is not None:
+                for port in self.interface['ports']:
+                    signal=rtl_connector(lang='sv')
+                    signal.cls=port['cls']
+                    if port['ll'] is not None:
+                        signal.ll=port['ll']
+                        signal.rl=port['rl']
+                    signal.name=port['name']
+
+                    # By default, we create a connector that is cross connected to the input
+                    signal.connect=signal.clone()
+                    if signal.cls=='input':
+                        signal.connect.cls='reg'
+                    if signal.cls=='output':
+                        signal.connect.cls='wire'
+                    signal.connect.connect=signal
+                    self._ios.Members[signal.name]=signal
         return self._ios
 
     # Setting principle, assign a dict
@@ -149,53 +113,10 @@ class verilog_module(module_common,thesdk):
 
         '''
         if not hasattr(self,'_parameters'):
-            startmatch=re.compile(r"module *(?="+self.name+r"\s*\()\s*"+r".*.+$")
-            iomatch=re.compile(r".*(?<!#)\(.*$")
-            parammatch=re.compile(r".*(?<=#)\(.*$")
-            paramstopmatch=re.compile(r".*\).*$")
-            parablock=''
             self._parameters=Bundle()
-            # Extract the module definition
-            if os.path.isfile(self.file):
-                with open(self.file) as infile:
-                    wholefile = infile.readlines()
-                    modfind = False
-                    iofind = False
-                    parafind = False
-                    for line in wholefile:
-                        if (not modfind and startmatch.match(line)):
-                            modfind = True
-                        if modfind and (not iofind) and iomatch.match(line):
-                            iofind = True
-                        if modfind and (not iofind) and parammatch.match(line):
-                                parafind = True
-                        if ( modfind and (not iofind) and parafind and paramstopmatch.match(line)):
-                            modfind = False
-                            parafind = False
-                            line = re.sub(r"\).*$","",line)
-                            line = re.sub(r"//.*$","",line)
-                            #Inclusive
-                            parablock = parablock+line +'\n'
-                        elif modfind and parafind:
-                            line = re.sub(r"//.*$","",line)
-                            parablock = parablock+line
-                    if parablock:
-                        #Generate lambda functions for pattern filtering
-                        parablock.replace("\n","")
-                        fils = [
-                            re.compile(r"module\s*"+self.name+r"\s*"),
-                            re.compile(r"#"),
-                            re.compile(r"\(*"),
-                            re.compile(r"\)*"),
-                            re.compile(r"\s*"),
-                            re.compile(r";*")
-                          ]
-                        func_list= [lambda s,fil=x: re.sub(fil,"",s) for x in fils]
-                        parablock=reduce(lambda s, func: func(s), func_list, parablock)
-                        parablock=parablock.split(',')
-                        for param in parablock:
-                                extr=param.split('=')
-                                self._parameters.Members[extr[0]]=extr[1]
+            if os.path.isfile(self.file) and self.interface is not None:
+                for name, value in self.interface['parameters']:
+                    self._parameters.Members[name]=value
         return self._parameters
 
     # Setting principle, assign a dict
@@ -204,6 +125,22 @@ class verilog_module(module_common,thesdk):
     def parameters(self,value):
         self._parameters.Members=deepcopy(value)
 
+    @property
+    def instance_parameters(self):
+        '''Names of the parameters assigned in `verilog_instance`, each to the
+        parameter of the same name in the instantiating module. The other
+        parameters keep their default values.
+
+        Default: all `parameters`
+
+        '''
+        if not hasattr(self,'_instance_parameters'):
+            return list(self.parameters.Members.keys())
+        return self._instance_parameters
+    @instance_parameters.setter
+    def instance_parameters(self,value):
+        self._instance_parameters=value
+
     @property
     def contents(self):
         '''Contents of the module. String containing the Verilog code after 
@@ -279,43 +216,32 @@ class verilog_module(module_common,thesdk):
         '''
         if not hasattr(self,'_definition'):
             #First we print the parameter section
+            definition=[]
             if self.parameters.Members:
-                parameters=''
-                first=True
+                parameters=[]
                 for name, val in self.parameters.Members.items():
                     if type(val) is not tuple:
                         self.print_log(type='F', msg='Parameter %s must be defined as {\'<name>\': (\'<type>\',value)}' %(name))
-
-                    if first:
-                        parameters='#(\n    parameter %s = %s' %(name,val[1])
-                        first=False
-                    else:
-                        parameters=parameters+',\n    parameter %s = %s' %(name,val[1])
-                parameters=parameters+'\n)'
-                self._definition='module %s %s' %(self.name, parameters)
+                    parameters.append('    parameter %s = %s' %(name,val[1]))
+                definition.append('module %s #(\n%s\n)' %(self.name, ',\n'.join(parameters)))
             else:
-                self._definition='module %s ' %(self.name)
-            first=True
+                definition.append('module %s ' %(self.name))
             if self.ios.Members:
+                ios=[]
                 for ioname, io in self.ios.Members.items():
-                    if first:
-                        self._definition=self._definition+'(\n'
-                        first=False
-                    else:
-                        self._definition=self._definition+',\n'
                     if io.cls in [ 'input', 'output', 'inout' ]:
                         if io.width==1:
-                            self._definition=(self._definition+
-                                    ('    %s %s' %(io.cls, io.name)))
+                            ios.append('    %s %s' %(io.cls, io.name))
                         else:
-                            self._definition=(self._definition+
-                                    ('    %s [%s:%s] %s' %(io.cls, io.ll, io.rl, io.name)))
+                            ios.append('    %s [%s:%s] %s' %(io.cls, io.ll, io.rl, io.name))
                     else:
                         self.print_log(type='F', msg='Assigning signal direction %s to verilog module IO.' %(io.cls))
-                self._definition=self._definition+'\n)'
-            self._definition=self._definition+';'
+                definition.append('(\n%s\n)' %(',\n'.join(ios)))
+            definition.append(';')
             if self.contents:
-                self._definition=self._definition+self.contents+'\nendmodule'
+                definition.append(self.contents)
+                definition.append('\nendmodule')
+            self._definition=''.join(definition)
         return self._definition
 
     # Instance is defined through the io_signals
@@ -326,35 +252,23 @@ class verilog_module(module_common,thesdk):
 
         '''
         #First we write the parameter section
-        if self.parameters.Members:
-            parameters=''
-            first=True
-            for name, val in self.parameters.Members.items():
-                if first:
-                    parameters='#(\n    .%s(%s)' %(name,name)
-                    first=False
-                else:
-                    parameters=parameters+',\n    .%s(%s)' %(name,name)
-            parameters=parameters+'\n)'
-            self._instance='%s  %s %s' %(self.name, parameters, self.instname)
+        if self.instance_parameters:
+            parameters=',\n'.join([ '    .%s(%s)' %(name,name)
+                for name in self.instance_parameters ])
+            instance=[ '%s  #(\n%s\n) %s' %(self.name, parameters, self.instname) ]
         else:
-            self._instance='%s %s ' %(self.name, self.instname)
-        first=True
+            instance=[ '%s %s ' %(self.name, self.instname) ]
         # Then we write the IOs
         if self.ios.Members:
+            ios=[]
             for ioname, io in self.ios.Members.items():
-                if first:
-                    self._instance=self._instance+'(\n'
-                    first=False
-                else:
-                    self._instance=self._instance+',\n'
                 if io.cls in [ 'input', 'output', 'inout' ]:
-                        self._instance=(self._instance+
-                                ('    .%s(%s)' %(io.name, io.connect.name)))
+                        ios.append('    .%s(%s)' %(io.name, io.connect.name))
                 else:
                     self.print_log(type='F', msg='Assigning signal direction %s to verilog module IO.' %(io.cls))
-            self._instance=self._instance+('\n)')
-        self._instance=self._instance+(';\n')
+            instance.append('(\n%s\n)' %(',\n'.join(ios)))
+        instance.append(';\n')
+        self._instance=''.join(instance)
         return self._instance
 
     #Methods
@@ -371,7 +285,8 @@ class verilog_module(module_common,thesdk):
         if not os.path.isfile(self.file):
             self.print_log(msg='Exporting verilog_module to %s.' %(self.file))
             with open(self.file, "w") as module_file:
-                module_file.write(self.header+self.definition)
+                module_file.write(self.header)
+                module_file.write(self.definition)
 
         elif os.path.isfile(self.file) and not kwargs.get('force'):
             self.print_log(type='F', msg=('Export target file %s exists.\n Force overwrite with force=True.' %(self.file)))
@@ -379,7 +294,8 @@ class verilog_module(module_common,thesdk):
         elif kwargs.get('force'):
             self.print_log(msg='Forcing overwrite of verilog_module to %s.' %(self.file))
             with open(self.file, "w") as module_file:
-                module_file.write(self.header+self.definition)
+                module_file.write(self.header)
+                module_file.write(self.definition)
 
 
 if __name__=="__main__":
@@ -12,10 +12,12 @@ Refactored from 'testbench' by Marko Kosunen 20221119, marko.kosunen@aalto.fi
 """
 import os
 import sys
-import pdb
+import re
 from rtl import indent
+from rtl.code_emitter import code_emitter
 from rtl.connector import rtl_connector
 from rtl.testbench_common import testbench_common
+from rtl.sv.verilog_module import verilog_module
 
 class verilog_testbench(testbench_common):
     """ Verilog testbench class.
@@ -66,6 +68,23 @@ class verilog_testbench(testbench_common):
         definitions='//Parameter definitions\n'
         for name, val in self.content_parameters.items():
                 definitions+='parameter '+ val[0]+' '+name+'='+ val[1]+';\n'
+        # Variables given as plusargs, required on the command line.
+        # Assigned at time 0, other initial blocks must not read them before #0.
+        for name, val in self.parent.rtl_plusargs.items():
+            if val[0]=='real':
+                fmt='%f'
+            elif val[0]=='string':
+                fmt='%s'
+            elif val[0] in [ 'integer', 'int', 'longint' ] or re.match(
+                    r'^(reg|logic|bit)(\s+(signed|unsigned))?\s*\[[^:\]]+:[^:\]]+\]$', val[0]):
+                fmt='%d'
+            else:
+                self.print_log(type='F', msg='Unsupported type %s of plusarg %s. Give vectors with an explicit range, e.g. \'reg [31:0]\'' %(val[0], name))
+            definitions+='%s %s;\n' %(val[0], name)
+            definitions+=('initial if (!$value$plusargs("%s=%s", %s)) begin\n' %(name, fmt, name)
+                    + indent(text='$display("Missing plusarg +%s");' %(name), level=1)
+                    + indent(text='$finish;', level=1)
+                    + 'end\n')
         return definitions
 
     @property
@@ -99,38 +118,38 @@ class verilog_testbench(testbench_common):
             val.lang='sv'
 
         # Registers first
-        definitions='//Register definitions\n'
+        definitions=['//Register definitions\n']
         for name, val in self.connectors.Members.items():
             if val.cls=='reg':
-                definitions=definitions+val.definition
+                definitions.append(val.definition)
 
-        definitions=definitions+'\n//Wire definitions\n'
+        definitions.append('\n//Wire definitions\n')
         for name, val in self.connectors.Members.items():
             if val.cls=='wire':
-                definitions=definitions+val.definition
-        return definitions
+                definitions.append(val.definition)
+        return ''.join(definitions)
 
     def assignments(self,**kwargs):
         """Wire assingment strings
 
         """
         matchlist=kwargs.get('matchlist',self.assignment_matchlist)
-        assigns='\n//Assignments\n'
-        for match in matchlist:
-            assigns=assigns+self.connectors.assign(match=match)
-        return indent(text=assigns,level=kwargs.get('level',0))
+        assigns=['\n//Assignments\n']
+        # All expressions are matched in one pass
+        assigns.append(self.connectors.assign(match=list(matchlist)))
+        return indent(text=''.join(assigns),level=kwargs.get('level',0))
 
     @property
     def iofile_definitions(self):
         """IOfile definition strings
 
         """
-        iofile_defs='//Variables for the io_files\n'
+        iofile_defs=['//Variables for the io_files\n']
         for name, val in self.iofiles.Members.items():
-            iofile_defs=iofile_defs+val.rtl_statdef
-            iofile_defs=iofile_defs+val.rtl_fopen
-        iofile_defs=iofile_defs+'\n'
-        return iofile_defs
+            iofile_defs.append(val.rtl_statdef)
+            iofile_defs.append(val.rtl_fopen)
+        iofile_defs.append('\n')
+        return ''.join(iofile_defs)
 
     @property
     def clock_definition(self):
@@ -148,11 +167,11 @@ class verilog_testbench(testbench_common):
         """File close procedure for all IO files.
 
         """
-        iofile_close='\n//Close the io_files\n'
+        iofile_close=['\n//Close the io_files\n']
         for name, val in self.iofiles.Members.items():
-            iofile_close=iofile_close+val.rtl_fclose
-        iofile_close=iofile_close+'\n'
-        return iofile_close
+            iofile_close.append(val.rtl_fclose)
+        iofile_close.append('\n')
+        return ''.join(iofile_close)
 
     @property
     def end_condition(self):
@@ -275,52 +294,60 @@ class verilog_testbench(testbench_common):
 
         """
         # Start the testbench contents
-        contents="""
+        contents=code_emitter()
+        contents.write("""
 //timescale 1ps this should probably be a global model parameter
-"""+self.parameter_definitions+\
-self.connector_definitions+\
-self.assignments()+\
-self.iofile_definitions+\
-self.misccmd+\
-self.end_condition+\
-self.dumpfile+\
-"""
+""")
+        contents.write(self.parameter_definitions)
+        contents.write(self.connector_definitions)
+        contents.write(self.assignments())
+        contents.write(self.iofile_definitions)
+        contents.write(self.misccmd)
+        contents.write(self.end_condition)
+        contents.write(self.dumpfile)
+        contents.write("""
 //DUT definition
-"""+\
-self.dut_instance.verilog_instance
+""")
+        if isinstance(self.dut_instance, verilog_module):
+            # Only the parameters declared in the testbench can be assigned
+            declared=set(self.parameters.Members) | set(self.content_parameters)
+            self.dut_instance.instance_parameters=[ name for name in
+                    self.dut_instance.parameters.Members if name in declared ]
+        contents.write(self.dut_instance.verilog_instance)
 
         for inst, module in self.verilog_instances.Members.items():
-            contents+=module.instance
+            contents.write(module.instance)
 
-        contents+=self.clock_definition
-        contents+="""
+        contents.write(self.clock_definition)
+        contents.write("""
 
 //io_out
-"""
+""")
         for key, member in self.iofiles.Members.items():
             if member.dir=='out':
-                contents+=member.rtl_io
-        contents+="""
+                contents.write(member.rtl_io)
+        contents.write("""
 
 //Execution with parallel fork-join and sequential begin-end sections
 initial #0 begin
 fork
-""" + \
-self.connectors.rtl_inits(level=1)+\
-"""
+""")
+        contents.write(self.connectors.rtl_inits(level=1))
+        contents.write("""
 
     // Sequences enabled by initdone
     $display("Ready to read");
-"""
+""")
 
-        for key, member in self.iofiles.Members.items():
-            if member.dir=='in':
-                contents+=indent(text=member.rtl_io, level=1)
+        with contents.block():
+            for key, member in self.iofiles.Members.items():
+                if member.dir=='in':
+                    contents.indent(text=member.rtl_io)
 
-        contents+='\njoin\n'+self.iofile_close+'\n'
-        contents+='$finish;\n'
-        contents+='end\n'
-        self.contents=contents
+        contents.write('\njoin\n'+self.iofile_close+'\n')
+        contents.write('$finish;\n')
+        contents.write('end\n')
+        self.contents=contents.getvalue()
 
 if __name__=="__main__":
     pass
@@ -14,7 +14,6 @@ Refactored from 'testbench' by Marko Kosunen 20221119, marko.kosunen@aalto.fi
 """
 import os
 import sys
-import pdb
 from rtl.testbench_common import testbench_common
 from rtl.sv.verilog_testbench import verilog_testbench
 from rtl.vhdl.vhdl_testbench import vhdl_testbench
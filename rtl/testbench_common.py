@@ -11,7 +11,7 @@ Refactored from 'testbench' by Marko Kosunen 20221119, marko.kosunen@aalto.fi
 import os
 import sys
 from thesdk import *
-from rtl import *
+from rtl.connector import rtl_connector_bundle
 from rtl.module import module
 from rtl.sv.verilog_module import verilog_module
 from rtl.vhdl.vhdl_entity import vhdl_entity
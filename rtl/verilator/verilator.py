@@ -8,16 +8,116 @@ properties and methods for RTL class
 Initially written by Aleksi Korsman, 2022
 """
 from thesdk import *
-import pdb
+from rtl.process_runner import process_step
 
 class verilator(thesdk,metaclass=abc.ABCMeta):
+    @property
+    def verilator_cores(self):
+        '''Number of cores available to this process.
+
+        '''
+        try:
+            return len(os.sched_getaffinity(0))
+        except AttributeError:
+            return os.cpu_count() or 1
+
+    @property
+    def verilator_threads(self):
+        '''Number of threads of the Verilated model, used by the optimized presets
+        of `verilator_sim_opt_dict`. Threading pays off for large designs only, and
+        the threads should not exceed the physical cores of the host running the
+        simulation, shared by the concurrent simulations e.g. of `run_rtl_batch`.
+        Set to more than 1 to enable threading.
+
+        Default: 1
+
+        '''
+        if not hasattr(self, '_verilator_threads'):
+            self._verilator_threads = 1
+        return self._verilator_threads
+    @verilator_threads.setter
+    def verilator_threads(self, value):
+        self._verilator_threads = value
+
+    @property
+    def verilator_build_jobs(self):
+        '''Number of parallel make jobs (-j) building the Verilated C++ model.
+
+        Default: available cores.
+
+        '''
+        if not hasattr(self, '_verilator_build_jobs'):
+            self._verilator_build_jobs = self.verilator_cores
+        return self._verilator_build_jobs
+    @verilator_build_jobs.setter
+    def verilator_build_jobs(self, value):
+        self._verilator_build_jobs = value
+
+    @property
+    def verilator_sim_opt_dict(self):
+        '''Preset dictionary of Verilator build options. Verilator compiles
+        the simulation, so these are given to verilator instead of the simulation executable.
+
+        - 'no-opt' - no optimizations, fastest build.
+        - 'opt-visible' - optimized.
+        - 'full-opt' - as 'opt-visible', with fast handling of X values, which
+          may change the simulation results of designs relying on them, and
+          the C++ compiled at -O3.
+        - 'top-visible' - as 'opt-visible', traced signals limited to the testbench.
+        - 'top-dut-visible' - as 'opt-visible', traced signals limited to the
+          testbench and the first hierarchy level of the DUT.
+
+        The optimized presets are multithreaded if `verilator_threads` is more
+        than 1, and split the output to compile the C++ in parallel.
+
+        '''
+        if not hasattr(self, '_verilator_sim_opt_dict'):
+            opt = [ '-O3' ]
+            if self.verilator_threads > 1:
+                opt += [ '--threads %d' % self.verilator_threads ]
+            opt += [ '--output-split 20000', '--output-split-cfuncs 20000' ]
+            self._verilator_sim_opt_dict = {
+                'no-opt': [ '-O0', '-CFLAGS -O0' ],
+                'opt-visible': opt + [ '-CFLAGS -O2' ],
+                'full-opt': opt + [ '--x-assign fast', '--x-initial fast', '-CFLAGS -O3' ],
+                'top-visible': opt + [ '-CFLAGS -O2', '--trace-depth 1' ],
+                'top-dut-visible': opt + [ '-CFLAGS -O2', '--trace-depth 2' ]
+            }
+        return self._verilator_sim_opt_dict
+    @verilator_sim_opt_dict.setter
+    def verilator_sim_opt_dict(self, value):
+        self._verilator_sim_opt_dict = value
+
     @property
     def verilator_rtlcmd(self):
+        '''Shell command equivalent to `verilator_rtlsteps`.
+
+        '''
+        self._rtlcmd = process_step.join(self.verilator_rtlsteps)
+        return self._rtlcmd
+
+    @property
+    def verilator_rtlsteps(self):
+        '''List of `process_step` compiling and running the simulation.
+
+        '''
         submission=self.lsf_submission
+        vlogmodules=self.vloglibfilemodules + [ self.rtlsimpath + '/'+ 
+            str(param) for param in self.vlogmodulefiles ]
+        if self.vpi_iofiles:
+            vpisources=[ self.vpi_source ]
+        else:
+            vpisources=[]
+        # Options from sim_opt_dict, and tracing for the interactive dumpfile
+        buildargs = list(self.vlogsimargs)
+        if self.interactive_rtl:
+            buildargs.append('--trace')
+        self.rtl_compile_cache_lookup(files=[self.simtb, self.simdut] + vlogmodules + vpisources,
+                version=['verilator', '--version'], extra=buildargs,
+                runtime_files=self.rtl_plusargs_files)
         if not os.path.exists(self.rtlworkpath):
             os.mkdir(self.rtlworkpath)
-        vlogmodulesstring=' '.join(self.vloglibfilemodules + [ self.rtlsimpath + '/'+ 
-            str(param) for param in self.vlogmodulefiles ])
+        vlogmodulesstring=' '.join(vlogmodules)
         vhdlmodulesstring=' '.join([ self.rtlsimpath + '/'+ 
             str(param) for param in self.vhdlentityfiles])
 
@@ -25,16 +125,17 @@ class verilator(thesdk,metaclass=abc.ABCMeta):
             self.print_log(type='W', msg="Verilator does not support Verilog+VHDL cosimulation, ignoring additional VHDL files.")
 
 
-        vlogcompcmd = ( 'verilator -Wall --Wno-lint --binary --trace --timing --Mdir ' + self.rtlworkpath +
+        vlogcompcmd = ( 'verilator -Wall --Wno-lint --binary --timing ' + ' '.join(buildargs)
+                + ' -j ' + str(self.verilator_build_jobs) + ' --Mdir ' + self.rtlworkpath +
                 ' ' + self.simtb + ' ' + self.simdut + ' ' + vlogmodulesstring )
+        if vpisources:
+            # Ring buffer functions are imported with DPI-C
+            vlogcompcmd += ' -CFLAGS -DTHESDK_DPI ' + ' '.join(vpisources)
         gstring = ' '.join([ 
                                 ('-G ' + str(param) +'='+ str(val[1])) 
                                 for param,val in self.rtlparameters.items() 
                             ])
 
-        # Still dont know what to do with these.
-        vlogsimargs = ' '.join(self.vlogsimargs)
-
         fileparams=''
         for name, file in self.iofile_bundle.Members.items():
             fileparams+=' '+file.simparam
@@ -49,17 +150,22 @@ class verilator(thesdk,metaclass=abc.ABCMeta):
             else:
                 dostring=''
                 self.print_log(type='I',msg='No interactive control file set.')
-            rtlsimcmd = ('cd '+ self.rtlworkpath + ' && ' + './Vtb_'+ self.name 
-                         + ' && gtkwave ' + dostring + ' ' + self.rtlsimpath + '/' + self.name + '_dump.vcd')
+            rtlsimcmd = [ process_step(name='simulate', cwd=self.rtlworkpath,
+                    cmd='./Vtb_'+ self.name + self.rtl_plusargs_string),
+                    process_step(name='view', cmd='gtkwave ' + dostring + ' ' + self.rtlsimpath
+                        + '/' + self.name + '_dump.vcd') ]
         else:
-            rtlsimcmd = ('cd '+ self.rtlworkpath + ' &&  ./Vtb_' + self.name )
-
-        self._rtlcmd =  vlogcompcmd +\
-                ' && sync ' + self.rtlworkpath +\
-                ' && ' + submission +\
-                rtlsimcmd
-
-        return self._rtlcmd
+            rtlsimcmd = [ process_step(name='simulate', cwd=self.rtlworkpath,
+                    cmd=submission + './Vtb_' + self.name + self.rtl_plusargs_string) ]
+
+        steps = []
+        if not self.rtl_compile_cache_hit:
+            steps.append(process_step(name='compile', cmd=vlogcompcmd))
+            if self.rtl_compile_cache:
+                steps.append(process_step(name='compile', cmd=['touch', self.rtl_compile_cache_marker]))
+        if self.rtl_sync == 'sync':
+            steps.append(process_step(name='sync', cmd=['sync', self.rtlworkpath]))
+        return steps + rtlsimcmd
 
     @property
     def verilator_simdut(self):
@@ -10,7 +10,6 @@ Initially written by Marko Kosunen 30.10.20200, marko.kosunen@aalto.fi
 """
 
 from thesdk import *
-from rtl.rtl_iofile import rtl_iofile as rtl_iofile
 
 class vhdl(thesdk,metaclass=abc.ABCMeta):
     @property
@@ -15,13 +15,146 @@ Transferred from VHDL package in Dec 2019
 
 """
 import os
-import pdb
 from thesdk import *
 from copy import deepcopy
-from rtl import *
+import re
+from functools import reduce
 from rtl.connector import rtl_connector
 from rtl.connector import rtl_connector_bundle
 from rtl.module_common import module_common
+from rtl.interface_cache import cached_interface
+
+# Version of the output of parse_entity, invalidates the interface cache
+parser_version='1'
+
+def _parse_ports(lines, name):
+    '''Parses the ports of entity `name` from the lines of a VHDL file.
+    Returns a list of dicts with keys name, cls, type, ll and rl.
+
+    '''
+    startmatch=re.compile(r"entity *(?="+name+r"\s*is)"+r".*.+$")
+    iomatch=re.compile(r".*port\(.*$")
+    parammatch=re.compile(r".*generic\(.*$")
+    iostopmatch=re.compile(r'.*\);.*$')
+    dut=''
+    modfind=False
+    paramfind=False
+    iofind=False
+    for line in lines:
+        if (not modfind and startmatch.match(line)):
+            modfind=True
+        if modfind and parammatch.match(line):
+                paramfind=True
+        if modfind and iomatch.match(line):
+                iofind=True
+        if modfind and iofind:
+            # We need to filter all (); combinations
+            # from the line and check if ); still exists
+            testline=re.sub("\(.*?\)","",line)
+            if iostopmatch.match(testline):
+                modfind=False
+                iofind=False
+                paramfind=False
+                #Inclusive
+                line=re.sub(r"--.*;.*$","\);",line) +'\n'
+                #Force newline
+                line=re.sub(r"\);","",line) +'\n'
+                dut+=re.sub(r"--.*;.*$","\);",line) +'\n'
+            dut=dut+re.sub(r"--.*$","",line)
+    #Remove the EOL comments
+    dut=re.sub(r";.*$",",",dut)
+    dut=dut.replace("\n","")
+    #Generate lambda functions for pattern filtering
+    fils=[
+        re.compile(r"port\s*\(\s*"),
+        re.compile(r"^\s*"),
+        re.compile(r"--.*$"),
+      ]
+    func_list= [lambda s,fil=x: re.sub(fil,"",s) for x in fils]
+    dut=reduce(lambda s, func: func(s), func_list, dut)
+    dut=re.sub(r"\s+"," ",dut)
+    dut=re.sub(r"\s+in\s*","in :",dut)
+    dut=re.sub(r"\s+out\s*","out :",dut)
+    dut=re.sub(r"\s+inout\s*","inout :",dut)
+    dut=re.sub(r"\s*:\s*",":",dut)
+    dut=re.sub(r"\s*;\s*",";",dut)
+    ports=[]
+    if dut:
+        for ioline in dut.split(';'):
+            extr=ioline.split(':')
+            port={ 'name' : extr[0], 'cls' : None, 'type' : extr[2], 'll' : None, 'rl' : None }
+            if extr[1]=='in':
+                port['cls']='input'
+            elif extr[1]=='out':
+                port['cls']='output'
+            busdef=re.match(r"^.*\(\s*(.*)(\s+downto\s+|\s+to\s+)(.*)\s*\)",extr[2])
+            if busdef:
+                port['ll']=busdef.group(1)
+                port['rl']=busdef.group(3)
+            ports.append(port)
+    return ports
+
+def _parse_generics(lines, name):
+    '''Parses the generics of entity `name` from the lines of a VHDL file.
+    Returns a list of (name, value).
+
+    '''
+    startmatch=re.compile(r"entity *(?="+name+r"\s*is)"+r".*.+$")
+    parammatch=re.compile(r".*(?<=generic)\(.*$")
+    paramstopmatch=re.compile(r".*\);.*$")
+    parablock=''
+    modfind=False
+    parafind=False
+    for line in lines:
+        if (not modfind and startmatch.match(line)):
+            modfind=True
+        if modfind and parammatch.match(line):
+              parafind=True
+        if ( modfind and parafind and paramstopmatch.match(line)):
+            modfind=False
+            parafind=False
+            line=re.sub(r"\);.*$","",line)
+            line=re.sub(r"--.*$","",line)
+            #Inclusive
+            parablock=parablock+line +'\n'
+        elif modfind and parafind:
+            line=re.sub(r"--.*$","",line)
+            parablock=parablock+line
+    # Eventually we need to generate at least a tuple,
+    # but we could also have a parameter class with more properties
+    generics=[]
+    if parablock:
+        #Generate lambda functions for pattern filtering
+        parablock.replace("\n","")
+        #After these values we have name:type:value
+        fils=[
+            re.compile(r"generic\s*"),
+            re.compile(r"--"),
+            re.compile(r"\(*"),
+            re.compile(r"\)*"),
+            re.compile(r"\s*"),
+            re.compile(r"="),
+          ]
+        func_list= [lambda s,fil=x: re.sub(fil,"",s) for x in fils]
+        parablock=reduce(lambda s, func: func(s), func_list, parablock)
+        parablock=parablock.split(';')
+        for param in parablock:
+            extr=param.split(':')
+            generics.append((extr[0], extr[2]))
+    return generics
+
+def parse_entity(text, name):
+    '''Parses the interface of entity `name` from VHDL source text.
+
+    Returns
+    -------
+    dict
+        {'parameters' : [ (name, value), ... ],
+        'ports' : [ {'name', 'cls', 'type', 'll', 'rl'}, ... ]}
+
+    '''
+    lines=text.splitlines(keepends=True)
+    return { 'parameters' : _parse_generics(lines, name), 'ports' : _parse_ports(lines, name) }
 
 class vhdl_entity(module_common,thesdk):
     """Objective:
@@ -58,6 +191,20 @@ class vhdl_entity(module_common,thesdk):
         '''
         super().__init__(**kwargs)
     
+    @property
+    def interface(self):
+        '''Ports and generics of the entity parsed from the file, see `parse_entity`.
+        Parsing results are cached on disk with `rtl.interface_cache`.
+        None if the file does not exist.
+
+        '''
+        if not hasattr(self,'_interface'):
+            self._interface=None
+            if os.path.isfile(self.file):
+                self._interface=cached_interface(file=self.file, name=self.name,
+                        lang='vhdl', parser=parse_entity, version=parser_version)
+        return self._interface
+
     @property
     def ios(self):
         '''Rtl connector bundle containing connectors for all module IOS.
@@ -67,82 +214,25 @@ class vhdl_entity(module_common,thesdk):
 
         '''
         if not hasattr(self,'_ios'):
-            startmatch=re.compile(r"entity *(?="+self.name+r"\s*is)"+r".*.+$")
-            iomatch=re.compile(r".*port\(.*$")
-            #iomatch=re.compile(r".*$")
-            parammatch=re.compile(r".*generic\(.*$")
-            iostopmatch=re.compile(r'.*\);.*$')
-            dut=''
-            # Extract the module definition
             self._ios=rtl_connector_bundle()
-            if os.path.isfile(self.file):
-                with open(self.file) as infile:
-                    wholefile=infile.readlines()
-                    modfind=False
-                    paramfind=False
-                    iofind=False
-                    for line in wholefile:
-                        if (not modfind and startmatch.match(line)):
-                            modfind=True
-                        if modfind and parammatch.match(line):
-                                paramfind=True
-                        if modfind and iomatch.match(line):
-                                iofind=True
-                        if modfind and iofind: 
-                            # We need to filter all (); combinations 
-                            # from the line and check if ); still exists
-                            testline=re.sub("\(.*?\)","",line)
-                            if iostopmatch.match(testline):
-                                modfind=False
-                                iofind=False
-                                paramfind=False
-                                #Inclusive
-                                line=re.sub(r"--.*;.*$","\);",line) +'\n'
-                                #Force newline
-                                line=re.sub(r"\);","",line) +'\n'
-                                dut+=re.sub(r"--.*;.*$","\);",line) +'\n'
-                            dut=dut+re.sub(r"--.*$","",line)
-                    #Remove the EOL comments
-                    dut=re.sub(r";.*$",",",dut)
-                    dut=dut.replace("\n","")
-                    #Generate lambda functions for pattern filtering
-                    fils=[
-                        re.compile(r"port\s*\(\s*"),
-                        re.compile(r"^\s*"),
-                        re.compile(r"--.*$"),
-                      ]
-                    func_list= [lambda s,fil=x: re.sub(fil,"",s) for x in fils]
-                    dut=reduce(lambda s, func: func(s), func_list, dut)
-                    dut=re.sub(r"\s+"," ",dut)
-                    dut=re.sub(r"\s+in\s*","in :",dut)
-                    dut=re.sub(r"\s+out\s*","out :",dut)
-                    dut=re.sub(r"\s+inout\s*","inout :",dut)
-                    dut=re.sub(r"\s*:\s*",":",dut)
-                    dut=re.sub(r"\s*;\s*",";",dut)
-                    if dut:
-                        for ioline in dut.split(';'):
-                            extr=ioline.split(':')
-                            signal=rtl_connector(lang='vhdl')
-                            if extr[1]=='in':
-                                signal.cls='input'
-                            elif extr[1]=='out':
-                                signal.cls='output'
-                            signal.name=extr[0]
-                            signal.type=extr[2]
-                            busdef=re.match(r"^.*\(\s*(.*)(\s+downto\s+|\s+to\s+)(.*)\s*\)",extr[2])
-                            if busdef:
-                                signal.ll=busdef.group(1)
-                                signal.rl=busdef.group(3)
-                            #By default, we create a connector that is cross connected to the input
-                            signal.connect=deepcopy(signal)
-                            if signal.cls=='input':
-                                signal.connect.cls='reg'
-                            if signal.cls=='output':
-                                signal.connect.cls='wire'
-
-                            self._ios.Members[signal.name]=signal
-                            signal.connect.connect=signal
-                            self._ios.Members[signal.name]=signal
+            if self.interface is not None:
+                for port in self.interface['ports']:
+                    signal=rtl_connector(lang='vhdl')
+                    if port['cls'] is not None:
+                        signal.cls=port['cls']
+                    signal.name=port['name']
+                    signal.type=port['type']
+                    if port['ll'] is not None:
+                        signal.ll=port['ll']
+                        signal.rl=port['rl']
+                    #By default, we create a connector that is cross connected to the input
+                    signal.connect=signal.clone()
+                    if signal.cls=='input':
+                        signal.connect.cls='reg'
+                    if signal.cls=='output':
+                        signal.connect.cls='wire'
+                    signal.connect.connect=signal
+                    self._ios.Members[signal.name]=signal
         return self._ios
 
     # Setting principle, assign a dict
@@ -157,52 +247,10 @@ class vhdl_entity(module_common,thesdk):
 
         '''
         if not hasattr(self,'_parameters'):
-            startmatch=re.compile(r"entity *(?="+self.name+r"\s*is)"+r".*.+$")
-            parammatch=re.compile(r".*(?<=generic)\(.*$")
-            paramstopmatch=re.compile(r".*\);.*$")
-            parablock=''
             self._parameters=Bundle()
-            # Extract the module definition
-            if os.path.isfile(self.file):
-                with open(self.file) as infile:
-                    wholefile=infile.readlines()
-                    modfind=False
-                    parafind=False
-                    for line in wholefile:
-                        if (not modfind and startmatch.match(line)):
-                            modfind=True
-                        if modfind and parammatch.match(line):
-                              parafind=True
-                        if ( modfind and parafind and paramstopmatch.match(line)):
-                            modfind=False
-                            parafind=False
-                            line=re.sub(r"\);.*$","",line)
-                            line=re.sub(r"--.*$","",line)
-                            #Inclusive
-                            parablock=parablock+line +'\n'
-                        elif modfind and parafind:
-                            line=re.sub(r"--.*$","",line)
-                            parablock=parablock+line
-                    # Eventually we need to generate at least a tuple,
-                    # but we could also have a parameter class with more properties  
-                    if parablock:
-                        #Generate lambda functions for pattern filtering
-                        parablock.replace("\n","")
-                        #After these values we have name:type:value
-                        fils=[
-                            re.compile(r"generic\s*"),
-                            re.compile(r"--"),
-                            re.compile(r"\(*"),
-                            re.compile(r"\)*"),
-                            re.compile(r"\s*"),
-                            re.compile(r"="),
-                          ]
-                        func_list= [lambda s,fil=x: re.sub(fil,"",s) for x in fils]
-                        parablock=reduce(lambda s, func: func(s), func_list, parablock)
-                        parablock=parablock.split(';')
-                        for param in parablock:
-                            extr=param.split(':')
-                            self._parameters.Members[extr[0]]=extr[2]
+            if self.interface is not None:
+                for name, value in self.interface['parameters']:
+                    self._parameters.Members[name]=value
         return self._parameters
 
     # Setting principle, assign a dict
@@ -277,42 +325,31 @@ class vhdl_entity(module_common,thesdk):
         '''
         if not hasattr(self,'_definition'):
             #First we print the parameter section
+            definition=[]
             if self.parameters.Members:
-                parameters=''
-                first=True
+                parameters=[]
                 for name, val in self.parameters.Members.items():
                     if type(val) is not tuple:
                         self.print_log(type='F', msg='Parameter %s must be defined as {\'<name>\': (\'<type>\',value)}' %(name))
-                    if first:
-                        parameters='generic(\n %s : %s := %s' %(name,val[0],val[1])
-                        first=False
-                    else:
-                        parameters=parameters+';\n %s : %s := %s' %(name,val[0],val[1])
-                parameters=parameters+'\n);'
-                self._definition='entity %s is\n%s' %(self.name, parameters)
+                    parameters.append(' %s : %s := %s' %(name,val[0],val[1]))
+                definition.append('entity %s is\ngeneric(\n%s\n);' %(self.name, ';\n'.join(parameters)))
             else:
-                self._definition='entity %s is\n' %(self.name)
-            first=True
+                definition.append('entity %s is\n' %(self.name))
             if self.ios.Members:
+                ios=[]
                 for ioname, io in self.ios.Members.items():
-                    if first:
-                        self._definition=self._definition+'\nport(\n'
-                        first=False
-                    else:
-                        self._definition=self._definition+',\n'
                     if io.cls in [ 'input', 'output', 'inout' ]:
                         if io.width==1:
-                            self._definition=(self._definition+
-                                    ('    %s %s' %(io.cls, io.name)))
+                            ios.append('    %s %s' %(io.cls, io.name))
                         else:
-                            self._definition=(self._definition+
-                                    ('    %s [%s:%s] %s' %(io.cls, io.ll, io.rl, io.name)))
+                            ios.append('    %s [%s:%s] %s' %(io.cls, io.ll, io.rl, io.name))
                     else:
                         self.print_log(type='F', msg='Assigning signal direction %s to verilog module IO.' %(io.cls))
-                self._definition=self._definition+'\n)'
-            self._definition=self._definition+'\nend entity;\n'
+                definition.append('\nport(\n%s\n)' %(',\n'.join(ios)))
+            definition.append('\nend entity;\n')
             if self.contents:
-                self._definition=self._definition+self.contents
+                definition.append(self.contents)
+            self._definition=''.join(definition)
         return self._definition
 
 
@@ -330,7 +367,8 @@ class vhdl_entity(module_common,thesdk):
         if not os.path.isfile(self.file):
             self.print_log(msg='Exporting vhdl_entity to %s.' %(self.file))
             with open(self.file, "w") as module_file:
-                module_file.write(self.header+self.definition)
+                module_file.write(self.header)
+                module_file.write(self.definition)
 
         elif os.path.isfile(self.file) and not kwargs.get('force'):
             self.print_log(type='F', msg=('Export target file %s exists.\n Force overwrite with force=True.' %(self.file)))
@@ -338,7 +376,8 @@ class vhdl_entity(module_common,thesdk):
         elif kwargs.get('force'):
             self.print_log(msg='Forcing overwrite of vhdl_entity to %s.' %(self.file))
             with open(self.file, "w") as module_file:
-                module_file.write(self.header+self.definition)
+                module_file.write(self.header)
+                module_file.write(self.definition)
 
 if __name__=="__main__":
     pass
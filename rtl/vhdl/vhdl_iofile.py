@@ -12,16 +12,14 @@ Yue Dai, 2018
 """
 import os
 import sys
-import pdb
 from abc import * 
 from thesdk import *
 #from thesdk.iofile import iofile
 from rtl.rtl_iofile_common import rtl_iofile_common
 import numpy as np
-import pandas as pd
-import sortedcontainers as sc
 import re
 from rtl.connector import indent
+from rtl.code_emitter import code_emitter
 
 class vhdl_iofile(rtl_iofile_common):
     """
@@ -63,6 +61,14 @@ class vhdl_iofile(rtl_iofile_common):
     def ioformat(self,value):
         self._ioformat=value
 
+    @property
+    def binarydtype(self):
+        '''NumPy dtype of the records of binary IO files. 32-bit little-endian
+        integer, the VHDL integer written to a `file of integer`.
+
+        '''
+        return '<i4'
+
     @property
     def rtlparam(self):
         '''Extracts the parameter name and value from simparam attribute. 
@@ -140,9 +146,8 @@ class vhdl_iofile(rtl_iofile_common):
 
         '''
         if self.parent.iotype=='sample':
-            self._rtl_statdef=''
-            for connector in self.parent.rtl_connectors:
-                self._rtl_statdef+='variable status_%s : Boolean := False;\n' %(connector.name)
+            self._rtl_statdef=''.join([ 'variable status_%s : Boolean := False;\n' %(connector.name)
+                for connector in self.parent.rtl_connectors ])
         elif self.parent.iotype=='event':
             for connector in self.parent.rtl_connectors:
                 self._rtl_statdef='variable status_%s : Boolean := False;\n' %(connector.name)
@@ -151,8 +156,8 @@ class vhdl_iofile(rtl_iofile_common):
             for stamp in [ self.rtl_ctstamp, self.rtl_pstamp]:
                 self._rtl_statdef+='variable %s : integer := 0;\n' %(stamp)
             self._rtl_statdef+='variable %s : time := 0.0 * %s;\n' %(self.rtl_tdiff, self.rtl_timescale)
-            for connector in self.parent.rtl_connectors:
-                self._rtl_statdef+='variable status_%s : Boolean := False;\n' %(connector.name)
+            self._rtl_statdef+=''.join([ 'variable status_%s : Boolean := False;\n' %(connector.name)
+                for connector in self.parent.rtl_connectors ])
         return self._rtl_statdef
 
     # File opening, direction dependent 
@@ -165,8 +170,13 @@ class vhdl_iofile(rtl_iofile_common):
             mode='read'
         if self.parent.dir=='out':
             mode='write'
-        self._rtl_fopen=('file %s : text open %s_mode is %s;\n' 
-                         %(self.rtl_fptr,mode,next(iter(self.rtlparam))))
+        if self.parent.binaryio:
+            self._rtl_fopen='type binary_%s is file of integer;\n' %(self.rtl_fptr)
+            self._rtl_fopen+=('file %s : binary_%s open %s_mode is %s;\n' 
+                             %(self.rtl_fptr,self.rtl_fptr,mode,next(iter(self.rtlparam))))
+        else:
+            self._rtl_fopen=('file %s : text open %s_mode is %s;\n' 
+                             %(self.rtl_fptr,mode,next(iter(self.rtlparam))))
         self._rtl_fopen+='variable line_%s : line;\n' %(self.rtl_fptr)
         return self._rtl_fopen
 
@@ -191,14 +201,8 @@ class vhdl_iofile(rtl_iofile_common):
         '''
         if not hasattr(self,'_rtl_io_condition'):
             if self.parent.dir=='out':
-                first=True
-                for connector in self.parent.rtl_connectors:
-                    if first:
-                        self._rtl_io_condition='not is_x(%s)' %(connector.name)
-                        first=False
-                    else:
-                        self._rtl_io_condition='%s \n and not is_x(%s)' \
-                                %(self._rtl_io_condition,connector.name)
+                self._rtl_io_condition=' \n and '.join([ 'not is_x(%s)' %(connector.name)
+                    for connector in self.parent.rtl_connectors ])
             elif self.parent.dir=='in':
                 self.rtl_io_condition= 'True'
         return self._rtl_io_condition
@@ -249,161 +253,176 @@ class vhdl_iofile(rtl_iofile_common):
 
 
         '''
+        out=code_emitter()
         if self.parent.dir == 'out':
-            self._rtl_io='file_'+self.name+' : process\n'
+            out.write('file_'+self.name+' : process\n')
         elif self.parent.dir == 'in':
             if self.parent.iotype == 'sample':
-                self._rtl_io='file_'+self.name+' : process\n'
+                out.write('file_'+self.name+' : process\n')
             if self.parent.iotype == 'event':
-                self._rtl_io='file_'+self.name+' : process\n'
+                out.write('file_'+self.name+' : process\n')
 
-        self._rtl_io+=indent(text=self.rtl_statdef,level=1)
-        self._rtl_io+=indent(text=self.rtl_fopen,level=1)
+        if self.parent.binaryio:
+            for connector in self.parent.rtl_connectors:
+                if connector.ioformat != '%d' or (isinstance(connector.width,int) and connector.width > 32):
+                    self.print_log(type='F', msg='Connector %s is not supported by binary IO' %(connector.name))
+        out.indent(text=self.rtl_statdef,level=1)
+        out.indent(text=self.rtl_fopen,level=1)
         for connector in self.parent.rtl_connectors:
             if connector.width == 1:
                 if connector.ioformat == '%d':
-                    self._rtl_io+=indent(text='variable v_%s : integer;' 
+                    out.indent(text='variable v_%s : integer;' 
                                          %(connector.name),level=1)
                 elif connector.ioformat == '%s':
-                        self._rtl_io+=indent(text='variable v_%s : std_logic;' 
+                        out.indent(text='variable v_%s : std_logic;' 
                                              %(connector.name),level=1)
             else:
                 if connector.ioformat == '%d':
-                    self._rtl_io+=indent(text='variable v_%s : integer;' 
+                    out.indent(text='variable v_%s : integer;' 
                                          %(connector.name),level=1)
                 elif connector.ioformat == '%s':
-                    self._rtl_io+=indent(text='variable v_%s : std_logic_vector( %s downto %s);' 
+                    out.indent(text='variable v_%s : std_logic_vector( %s downto %s);' 
                                          %(connector.name, connector.ll, 
                                            connector.rl),level=1)
 
         if self.parent.iotype=='sample':
             if self.parent.dir=='out':
-                self._rtl_io+='begin\n'
-                self._rtl_io+=indent(text='while not thesdk_file_io_completed loop\n',level=1)
-                self._rtl_io+=indent(text='wait until %s;\n'%(self.rtl_io_sync),level=1)
-                self._rtl_io+=indent(text='if ( %s ) then\n' %(self.rtl_io_condition), level=2)
+                out.write('begin\n')
+                out.indent(text='while not thesdk_file_io_completed loop\n',level=1)
+                out.indent(text='wait until %s;\n'%(self.rtl_io_sync),level=1)
+                out.indent(text='if ( %s ) then\n' %(self.rtl_io_condition), level=2)
                 first = True
                 for connector in self.parent.rtl_connectors:
                     #verilog-like formatting
                     if connector.width == 1:
                         if connector.ioformat =='%d':
-                            self._rtl_io+=indent(text='v_%s := to_integer(unsigned\'(\"0\" & %s));\n' 
+                            out.indent(text='v_%s := to_integer(unsigned\'(\"0\" & %s));\n' 
                                                  %(connector.name,connector.name),level=4)
                         elif connector.ioformat== '%s':
-                            self._rtl_io+='v_%s := to_string(%s)' %(connector.name,connector.name)
+                            out.write('v_%s := to_string(%s)' %(connector.name,connector.name))
                         else:
                             self.print_log(type='F', 
                                            msg='Connector format %s not supported' %(connector.ioformat))
                     else:
                         if connector.ioformat =='%d':
                             if connector.type == 'signed':
-                                self._rtl_io+=indent(text='v_%s := to_integer(signed(%s));\n' 
+                                out.indent(text='v_%s := to_integer(signed(%s));\n' 
                                                      %(connector.name,connector.name),level=4)
                             else:
-                                self._rtl_io+=indent(text='v_%s := to_integer(unsigned(%s));\n' 
+                                out.indent(text='v_%s := to_integer(unsigned(%s));\n' 
                                                      %(connector.name,connector.name),level=4)
                         elif connector.ioformat== '%s':
-                            self._rtl_io+='v_%s := to_string(%s)' %(connector.name,connector.name)
+                            out.write('v_%s := to_string(%s)' %(connector.name,connector.name))
                         else:
                             self.print_log(type='F', 
                                            msg='Connector format %s not supported' %(connector.ioformat))
 
-                    if first:
-                        self._rtl_io+=indent(text='write(line_%s,v_%s);' 
+                    if self.parent.binaryio:
+                        out.indent(text='write(%s,v_%s);' 
+                                         %(self.rtl_fptr,connector.name), level=3)
+                    elif first:
+                        out.indent(text='write(line_%s,v_%s);' 
                                          %(self.rtl_fptr,connector.name), level=3)
                         first = False
                     else:
-                        self._rtl_io+=indent(text='write(line_%s, HT);'%(self.rtl_fptr), level=4)
-                        self._rtl_io+=indent(text='write(line_%s,v_%s);' 
+                        out.indent(text='write(line_%s, HT);'%(self.rtl_fptr), level=4)
+                        out.indent(text='write(line_%s,v_%s);' 
                                          %(self.rtl_fptr,connector.name), level=3)
 
-                self._rtl_io+=indent(text='writeline(%s,line_%s);\n' %(self.rtl_fptr,self.rtl_fptr), level=3)
-                self._rtl_io+=indent(text='end if;',level=2)
-                self._rtl_io+=indent(text='end loop;',level=1)
-                self._rtl_io+=indent(text='%s'%(self.rtl_fclose),level=1)
+                if not self.parent.binaryio:
+                    out.indent(text='writeline(%s,line_%s);\n' %(self.rtl_fptr,self.rtl_fptr), level=3)
+                out.indent(text='end if;',level=2)
+                out.indent(text='end loop;',level=1)
+                out.indent(text='%s'%(self.rtl_fclose),level=1)
             elif self.parent.dir=='in':
-                self._rtl_io+='begin\n'
-                self._rtl_io+=indent(text=('while not endfile(%s) loop\n' 
+                out.write('begin\n')
+                out.indent(text=('while not endfile(%s) loop\n' 
                                       %(self.rtl_fptr)),level=1)
-                self._rtl_io+=indent(text='wait until %s;\n' %(self.rtl_io_sync),level=2)
-                self._rtl_io+=indent(text='if ( %s ) then \n' %(self.rtl_io_condition), level=3)
-                self._rtl_io+=indent(text='readline(%s,line_%s);\n'
-                                     %(self.rtl_fptr,self.rtl_fptr,), level=4)
+                out.indent(text='wait until %s;\n' %(self.rtl_io_sync),level=2)
+                out.indent(text='if ( %s ) then \n' %(self.rtl_io_condition), level=3)
+                if not self.parent.binaryio:
+                    out.indent(text='readline(%s,line_%s);\n'
+                                         %(self.rtl_fptr,self.rtl_fptr,), level=4)
                 for connector in self.parent.rtl_connectors:
-                    self._rtl_io+=indent(text='read(line_%s,v_%s,status_%s);\n' 
-                                         %(self.rtl_fptr,connector.name,connector.name), level=4)
+                    if self.parent.binaryio:
+                        out.indent(text='read(%s,v_%s);\n' 
+                                             %(self.rtl_fptr,connector.name), level=4)
+                    else:
+                        out.indent(text='read(line_%s,v_%s,status_%s);\n' 
+                                             %(self.rtl_fptr,connector.name,connector.name), level=4)
                     #verilog-like formatting
                     if connector.ioformat =='%d':
                         # All integers are assumed to be signed
                         if connector.width == 1:
-                            self._rtl_io+=indent(text=('%s <= std_logic(to_unsigned(v_%s,1)(0));\n'
+                            out.indent(text=('%s <= std_logic(to_unsigned(v_%s,1)(0));\n'
                                                     %(connector.name,connector.name)
                                                    ),level=4)
                         else:
-                            self._rtl_io+=indent(text=('%s <= std_logic_vector(to_signed(v_%s,%s));\n'
+                            out.indent(text=('%s <= std_logic_vector(to_signed(v_%s,%s));\n'
                                                     %(connector.name,connector.name,connector.width)
                                                    ),level=4)
                     elif connector.ioformat== '%s':
                         # String is assumed to be logic
-                        self._rtl_io+=indent(text='%s <= v_%s;\n',level=4)
+                        out.indent(text='%s <= v_%s;\n',level=4)
                     else:
                         self.print_log(type='F', 
                                        msg='Connector format %s not supported' %(connector.ioformat))
-                self._rtl_io+=indent(text='end if;',level=3)
-                self._rtl_io+=indent(text='end loop;',level=1)
-                self._rtl_io+=indent(text='done_%s <= True;' %(self.rtl_fptr),level=1)
-                self._rtl_io+=indent(text='%s' %(self.rtl_fclose),level=1)
-                self._rtl_io+=indent(text='wait;',level=1)
-            self._rtl_io+='end process;\n\n'
+                out.indent(text='end if;',level=3)
+                out.indent(text='end loop;',level=1)
+                out.indent(text='done_%s <= True;' %(self.rtl_fptr),level=1)
+                out.indent(text='%s' %(self.rtl_fclose),level=1)
+                out.indent(text='wait;',level=1)
+            out.write('end process;\n\n')
 
         #Control files are handled differently
         elif self.parent.iotype=='event':
             if self.parent.dir=='out':
                 self.print_log(type='F', msg='Output writing for control files not supported')
             elif self.parent.dir=='in':
-                self._rtl_io+='begin\n'
-                self._rtl_io+=indent(text=('while not endfile(%s) loop\n' 
+                out.write('begin\n')
+                out.indent(text=('while not endfile(%s) loop\n' 
                                       %(self.rtl_fptr)),level=1)
-                self._rtl_io+=indent(text=('%s := %s;\n' 
+                out.indent(text=('%s := %s;\n' 
                                            %(self.rtl_pstamp, self.rtl_ctstamp))
                                      ,level=2)
-                self._rtl_io+=indent(text='readline(%s,line_%s);\n'
+                out.indent(text='readline(%s,line_%s);\n'
                                      %(self.rtl_fptr,self.rtl_fptr,), level=3)
-                self._rtl_io+=indent(text='read(line_%s,%s,status_%s);\n' %(self.rtl_fptr,self.rtl_ctstamp,self.rtl_ctstamp), level=3) 
+                out.indent(text='read(line_%s,%s,status_%s);\n' %(self.rtl_fptr,self.rtl_ctstamp,self.rtl_ctstamp), level=3) 
                 for connector in self.parent.rtl_connectors:
-                    self._rtl_io+=indent(text='read(line_%s,v_%s,status_%s);\n' 
+                    out.indent(text='read(line_%s,v_%s,status_%s);\n' 
                                          %(self.rtl_fptr,connector.name,connector.name), level=2)
-                self._rtl_io+=indent(text=('%s := ( %s - %s ) * %s;\n' 
+                out.indent(text=('%s := ( %s - %s ) * %s;\n' 
                                            %(self.rtl_tdiff, self.rtl_ctstamp,
                                              self.rtl_pstamp, self.rtl_timescale)),
                                      level=2)
-                self._rtl_io+=indent(text=('wait for %s ;\n' %(self.rtl_tdiff)), level=2);
+                out.indent(text=('wait for %s ;\n' %(self.rtl_tdiff)), level=2)
 
                 for connector in self.parent.rtl_connectors:
                     #verilog-like formatting
                     if connector.ioformat =='%d':
                         # All integers are assumed to be signed
                         if connector.width == 1:
-                            self._rtl_io+=indent(text=('%s <= std_logic(to_unsigned(v_%s,1)(0));\n'
+                            out.indent(text=('%s <= std_logic(to_unsigned(v_%s,1)(0));\n'
                                                     %(connector.name,connector.name)
                                                    ),level=3)
                         else:
-                            self._rtl_io+=indent(text=('%s <= std_logic_vector(to_signed(v_%s,%s));\n'
+                            out.indent(text=('%s <= std_logic_vector(to_signed(v_%s,%s));\n'
                                                     %(connector.name,connector.name,connector.width)
                                                    ),level=3)
                     elif connector.ioformat== '%s':
                         # String is assumed to be logic
-                        self._rtl_io+=indent(text='%s <= v_%s;\n',level=4)
+                        out.indent(text='%s <= v_%s;\n',level=4)
                     else:
                         self.print_log(type='F', 
                                        msg='Connector format %s not supported' %(connector.ioformat))
-                self._rtl_io+=indent(text='end loop;',level=1)
-                self._rtl_io+=indent(text='done_%s <= True;' %(self.rtl_fptr),level=1)
-                self._rtl_io+=indent(text='%s' %(self.rtl_fclose),level=1)
-                self._rtl_io+=indent(text='wait;',level=1)
-                self._rtl_io+='end process;\n\n'
+                out.indent(text='end loop;',level=1)
+                out.indent(text='done_%s <= True;' %(self.rtl_fptr),level=1)
+                out.indent(text='%s' %(self.rtl_fclose),level=1)
+                out.indent(text='wait;',level=1)
+                out.write('end process;\n\n')
         else:
             self.print_log(type='F', msg='Iotype not defined')
+        self._rtl_io=out.getvalue()
         return self._rtl_io
 
 
@@ -12,8 +12,8 @@ Derived from 'verilog_testbench' by Marko Kosunen 20230523, marko.kosunen@aalto.
 """
 import os
 import sys
-import pdb
 from rtl import indent
+from rtl.code_emitter import code_emitter
 from rtl.connector import rtl_connector
 from rtl.testbench_common import testbench_common
 
@@ -98,29 +98,29 @@ class vhdl_testbench(testbench_common):
         for name, val in self.connectors.Members.items():
             val.lang='vhdl'
         # Registers first
-        definitions='-- Driving signal definitions\n'
+        definitions=['-- Driving signal definitions\n']
         for name, val in self.connectors.Members.items():
             if val.cls=='reg':
-                definitions=definitions+val.definition
+                definitions.append(val.definition)
 
-        definitions=(definitions+
+        definitions.append(
                 '\n--Driven signal definitions\n--This controls the simulation duration\n'+
                 'signal thesdk_file_io_completed : Boolean := False;\n' +
                 'signal thesdk_simulation_completed : Boolean := False;\n')
         for name, val in self.connectors.Members.items():
             if val.cls=='wire':
-                definitions=definitions+val.definition
-        return definitions
+                definitions.append(val.definition)
+        return ''.join(definitions)
 
     def assignments(self,**kwargs):
         """Signal assingment strings
 
         """
         matchlist=kwargs.get('matchlist',self.assignment_matchlist)
-        assigns='\n--Assignments\n'
-        for match in matchlist:
-            assigns=assigns+self.connectors.assign(match=match)
-        return indent(text=assigns,level=kwargs.get('level',0))
+        assigns=['\n--Assignments\n']
+        # All expressions are matched in one pass
+        assigns.append(self.connectors.assign(match=list(matchlist)))
+        return indent(text=''.join(assigns),level=kwargs.get('level',0))
 
     @property
     def iofile_definitions(self):
@@ -130,11 +130,11 @@ class vhdl_testbench(testbench_common):
         These signals are used to set the 'thesdk_file_io_completed' signal to True.
 
         """
-        iofile_defs='--Signals for VHDL io_files to determine end of input file reading\n'
+        iofile_defs=['--Signals for VHDL io_files to determine end of input file reading\n']
         for name, val in self.iofiles.Members.items():
             if val.dir == 'in':
-                iofile_defs+='signal done_%s : Boolean := False;\n' %(val.rtl_fptr)
-        return iofile_defs 
+                iofile_defs.append('signal done_%s : Boolean := False;\n' %(val.rtl_fptr))
+        return ''.join(iofile_defs)
 
     @property
     def clock_definition(self):
@@ -163,11 +163,11 @@ class vhdl_testbench(testbench_common):
         """File close procedure for all IO files.
 
         """
-        iofile_close='\n--Close the io_files\n'
+        iofile_close=['\n--Close the io_files\n']
         for name, val in self.iofiles.Members.items():
-            iofile_close=iofile_close+val.rtl_fclose
-        iofile_close=iofile_close+'\n'
-        return iofile_close 
+            iofile_close.append(val.rtl_fclose)
+        iofile_close.append('\n')
+        return ''.join(iofile_close)
 
     @property
     def end_condition(self):
@@ -298,47 +298,47 @@ class vhdl_testbench(testbench_common):
 
         """
     # Start the testbench contents
-        contents=("""\narchitecture behavioural of """+ self.name + 
-                  """ is\n"""
-                  +self.parameter_definitions
-                  +self.connector_definitions
-                  +self.iofile_definitions
-                  + """\nbegin\n"""
-                  +self.assignments()
-                  +self.misccmd
-                  +self.dumpfile+
-                  """ -- DUT definition\n"""
-                  +self.dut_instance.vhdl_instance
-                  )
+        contents=code_emitter()
+        contents.write("""\narchitecture behavioural of """+ self.name + 
+                  """ is\n""")
+        contents.write(self.parameter_definitions)
+        contents.write(self.connector_definitions)
+        contents.write(self.iofile_definitions)
+        contents.write("""\nbegin\n""")
+        contents.write(self.assignments())
+        contents.write(self.misccmd)
+        contents.write(self.dumpfile)
+        contents.write(""" -- DUT definition\n""")
+        contents.write(self.dut_instance.vhdl_instance)
         for inst, module in self.verilog_instances.Members.items():
-            contents+=module.instance
+            contents.write(module.instance)
 
-        contents+=self.clock_definition
-        contents+=("""\n--Execution of processes and sequential assignments\n"""+
+        contents.write(self.clock_definition)
+        contents.write("""\n--Execution of processes and sequential assignments\n"""+
                    self.connectors.rtl_inits(level=0)+"""--IO out\n""")
         for key, member in self.iofiles.Members.items():
             if member.dir=='out':
-                contents+=indent(text=member.rtl_io,level=0)
-        contents+="""--IO in\n"""
+                contents.indent(text=member.rtl_io)
+        contents.write("""--IO in\n""")
         for key, member in self.iofiles.Members.items():
             if member.dir=='in':
-                contents+=indent(text=member.rtl_io, level=0)
+                contents.indent(text=member.rtl_io)
 
         first = True
         for key, member in self.iofiles.Members.items():
             if member.dir == 'in':
                 if first: 
-                    contents+='thesdk_file_io_completed <= '
-                    contents+=' done_%s' %(member.rtl_fptr)
+                    contents.write('thesdk_file_io_completed <= ')
+                    contents.write(' done_%s' %(member.rtl_fptr))
                     first = False
                 else:
-                    contents+=' and done_%s' %(member.rtl_fptr)
+                    contents.write(' and done_%s' %(member.rtl_fptr))
         if not first: 
-                contents+=';\n'
-        #contents+=self.iofile_close+'\n'
-        contents += self.end_condition 
-        contents+='\nend architecture;\n'
-        self.contents=contents
+                contents.write(';\n')
+        #contents.write(self.iofile_close+'\n')
+        contents.write(self.end_condition)
+        contents.write('\nend architecture;\n')
+        self.contents=contents.getvalue()
 
 
 if __name__=="__main__":
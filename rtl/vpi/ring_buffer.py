@@ -0,0 +1,219 @@
+"""
+===========
+Ring buffer
+===========
+Python side of the shared memory ring buffer bridge to HDL testbenches.
+
+A ring buffer is a file mapped to memory both by Python and by the
+simulator through the `thesdk_ring` VPI/DPI module (rtl/vpi/thesdk_ring.c).
+It holds records of 64-bit integers, one column per connector of the
+IO file. `ring_writer` and `ring_reader` threads fill and drain the rings
+while the simulator runs, so that no IO files are written or parsed.
+
+"""
+import os
+import mmap
+import time
+import struct
+import numpy as np
+from rtl.fifo_stream import fifo_stream
+
+# Header layout, kept in sync with rtl/vpi/thesdk_ring.c
+_MAGIC = 0x474e4952
+_HEADER = 64
+_HEAD = 16
+_TAIL = 24
+_PY_CLOSED = 32
+_HDL_CLOSED = 36
+
+class ring_buffer:
+    ''' Shared memory ring buffer of int64 records.
+
+    Parameters
+    ----------
+    **kwargs :
+        path : str
+            File backing the ring. Created, replacing an existing file.
+        columns : int
+            Values per record.
+        capacity : int, 65536
+            Number of records in the ring.
+
+    '''
+    def __init__(self, **kwargs):
+        self.path = kwargs.get('path')
+        self.columns = kwargs.get('columns', 1)
+        self.capacity = kwargs.get('capacity', 65536)
+        size = _HEADER + 8 * self.columns * self.capacity
+        if os.path.lexists(self.path):
+            os.remove(self.path)
+        with open(self.path, 'w+b') as fd:
+            fd.truncate(size)
+            self._mm = mmap.mmap(fd.fileno(), size)
+        struct.pack_into('<IIQQQII', self._mm, 0, _MAGIC, self.columns,
+                self.capacity, 0, 0, 0, 0)
+        self.data = np.ndarray((self.capacity, self.columns), dtype='<i8',
+                buffer=self._mm, offset=_HEADER)
+
+    def _get(self, fmt, offset):
+        return struct.unpack_from(fmt, self._mm, offset)[0]
+
+    @property
+    def head(self):
+        ''' Number of records written by the producer.
+
+        '''
+        return self._get('<Q', _HEAD)
+
+    @property
+    def tail(self):
+        ''' Number of records read by the consumer.
+
+        '''
+        return self._get('<Q', _TAIL)
+
+    @property
+    def hdl_closed(self):
+        ''' True when the testbench has closed the ring.
+
+        '''
+        return self._get('<I', _HDL_CLOSED) != 0
+
+    def write(self, rows):
+        ''' Copies as many rows as fit to the ring.
+
+        Returns
+        -------
+        int
+            Number of rows written.
+
+        '''
+        head = self.head
+        count = min(rows.shape[0], self.capacity - (head - self.tail))
+        start = head % self.capacity
+        first = min(count, self.capacity - start)
+        self.data[start:start+first] = rows[:first]
+        self.data[:count-first] = rows[first:count]
+        # Data must be in place before the index is advanced
+        struct.pack_into('<Q', self._mm, _HEAD, head + count)
+        return count
+
+    def read(self):
+        ''' Returns a copy of the records available in the ring and frees them.
+
+        '''
+        tail = self.tail
+        count = self.head - tail
+        start = tail % self.capacity
+        first = min(count, self.capacity - start)
+        rows = np.concatenate((self.data[start:start+first], self.data[:count-first]))
+        struct.pack_into('<Q', self._mm, _TAIL, tail + count)
+        return rows
+
+    def close(self):
+        ''' Tells the testbench that Python has finished with the ring.
+
+        '''
+        struct.pack_into('<I', self._mm, _PY_CLOSED, 1)
+
+class ring_stream(fifo_stream):
+    ''' Base class of the ring buffer streaming threads. The thread polls
+    the ring with an interval growing from 10 microseconds to `max_poll`
+    and exits when `finish` is called.
+
+    Parameters
+    ----------
+    **kwargs :
+        columns : int
+            Values per record.
+        capacity : int, 65536
+            Number of records in the ring.
+        max_poll : float, 0.01
+            Upper limit of the polling interval in seconds.
+
+    '''
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.max_poll = kwargs.get('max_poll', 0.01)
+        self.ring = ring_buffer(path=self.path, columns=kwargs.get('columns', 1),
+                capacity=kwargs.get('capacity', 65536))
+        self._finished = False
+
+    def _wait(self, poll):
+        time.sleep(poll)
+        return min(2 * poll, self.max_poll)
+
+    def unblock(self):
+        self._finished = True
+
+class ring_writer(ring_stream):
+    ''' Writes data to a ring buffer read by the testbench.
+
+    Parameters
+    ----------
+    **kwargs :
+        data : ndarray
+            Integer data, one row per record.
+        See `ring_stream`.
+
+    '''
+    def __init__(self, **kwargs):
+        data = np.asarray(kwargs.get('data'))
+        if data.ndim == 1:
+            data = data.reshape(-1, 1)
+        kwargs.setdefault('columns', data.shape[1])
+        super().__init__(**kwargs)
+        self.data = data.astype(np.int64)
+
+    def stream(self):
+        try:
+            start = 0
+            poll = 1e-5
+            while start < self.data.shape[0] and not self._finished:
+                written = self.ring.write(self.data[start:start+self.chunk])
+                start += written
+                if written:
+                    poll = 1e-5
+                else:
+                    poll = self._wait(poll)
+        finally:
+            self.ring.close()
+
+class ring_reader(ring_stream):
+    ''' Reads records written by the testbench to an int64 array.
+
+    Parameters
+    ----------
+    **kwargs :
+        See `ring_stream`.
+
+    '''
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._chunks = []
+
+    @property
+    def Data(self):
+        ''' Data read so far, one row per record.
+
+        '''
+        if not self._chunks:
+            return np.zeros((0, self.ring.columns), dtype=np.int64)
+        return np.concatenate(self._chunks)
+
+    def stream(self):
+        try:
+            poll = 1e-5
+            while True:
+                # Closed flags are read before the data, so that nothing is lost
+                done = self.ring.hdl_closed or self._finished
+                rows = self.ring.read()
+                if rows.shape[0]:
+                    self._chunks.append(rows)
+                    poll = 1e-5
+                elif done:
+                    break
+                else:
+                    poll = self._wait(poll)
+        finally:
+            self.ring.close()
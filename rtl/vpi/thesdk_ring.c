@@ -0,0 +1,365 @@
+/*
+ * Shared memory ring buffer bridge between TheSyDeKick and HDL testbenches.
+ *
+ * A ring is a file mapped to memory by both the Python process and the
+ * simulator. It holds a 64 byte header followed by `capacity` records of
+ * `columns` 64-bit little-endian integers. Each ring has one producer and
+ * one consumer. `head` is advanced by the producer and `tail` by the
+ * consumer. The side finishing first sets its closed flag.
+ *
+ * Header layout, kept in sync with rtl/vpi/ring_buffer.py:
+ *   0  uint32 magic
+ *   4  uint32 columns
+ *   8  uint64 capacity
+ *  16  uint64 head
+ *  24  uint64 tail
+ *  32  uint32 py_closed
+ *  36  uint32 hdl_closed
+ *
+ * Compile with -DTHESDK_VPI for VPI system tasks ($thesdk_ring_*, Icarus),
+ * or with -DTHESDK_DPI for DPI-C functions (thesdk_ring_*, Verilator).
+ */
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <fcntl.h>
+#include <sched.h>
+#include <time.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#define THESDK_RING_MAGIC 0x474e4952u
+#define THESDK_RING_HEADER 64
+#define THESDK_RING_MAX 256
+
+typedef struct {
+    uint32_t magic;
+    uint32_t columns;
+    uint64_t capacity;
+    uint64_t head;
+    uint64_t tail;
+    uint32_t py_closed;
+    uint32_t hdl_closed;
+} thesdk_ring_header;
+
+typedef struct {
+    thesdk_ring_header *header;
+    int64_t *data;
+    size_t size;
+    int64_t *record;
+} thesdk_ring;
+
+static thesdk_ring rings[THESDK_RING_MAX];
+static int nrings = 0;
+
+static void thesdk_ring_wait(unsigned *spins)
+{
+    /* Yield first, then sleep with a growing interval up to 1 ms */
+    if (*spins < 1000) {
+        sched_yield();
+    } else {
+        struct timespec ts;
+        unsigned shift = (*spins - 1000) / 100;
+        ts.tv_sec = 0;
+        ts.tv_nsec = 1000L << (shift < 10 ? shift : 10);
+        nanosleep(&ts, NULL);
+    }
+    (*spins)++;
+}
+
+/* Returns NULL for a closed ring, the calls after closing are ignored */
+static thesdk_ring *thesdk_ring_get_handle(int handle)
+{
+    if (handle < 0 || handle >= nrings) {
+        fprintf(stderr, "thesdk_ring: invalid handle %d\n", handle);
+        exit(1);
+    }
+    if (rings[handle].header == NULL)
+        return NULL;
+    return &rings[handle];
+}
+
+int thesdk_ring_open(const char *path)
+{
+    int fd;
+    struct stat st;
+    void *map;
+    thesdk_ring *ring;
+
+    if (nrings >= THESDK_RING_MAX) {
+        fprintf(stderr, "thesdk_ring: too many rings\n");
+        exit(1);
+    }
+    fd = open(path, O_RDWR);
+    if (fd < 0 || fstat(fd, &st) != 0) {
+        fprintf(stderr, "thesdk_ring: can not open %s\n", path);
+        exit(1);
+    }
+    map = mmap(NULL, st.st_size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+    close(fd);
+    if (map == MAP_FAILED) {
+        fprintf(stderr, "thesdk_ring: can not map %s\n", path);
+        exit(1);
+    }
+    ring = &rings[nrings];
+    ring->header = (thesdk_ring_header *)map;
+    if (ring->header->magic != THESDK_RING_MAGIC) {
+        fprintf(stderr, "thesdk_ring: %s is not a ring buffer\n", path);
+        exit(1);
+    }
+    ring->data = (int64_t *)((char *)map + THESDK_RING_HEADER);
+    ring->size = st.st_size;
+    ring->record = (int64_t *)calloc(ring->header->columns, sizeof(int64_t));
+    return nrings++;
+}
+
+/* Consumer: waits for a record, returns 1 if the producer has closed the ring */
+int thesdk_ring_eof(int handle)
+{
+    thesdk_ring *ring = thesdk_ring_get_handle(handle);
+    unsigned spins = 0;
+    if (ring == NULL)
+        return 1;
+    for (;;) {
+        uint64_t head = __atomic_load_n(&ring->header->head, __ATOMIC_ACQUIRE);
+        if (head != ring->header->tail)
+            return 0;
+        if (__atomic_load_n(&ring->header->py_closed, __ATOMIC_ACQUIRE)) {
+            /* Recheck, the last record may precede the flag */
+            head = __atomic_load_n(&ring->header->head, __ATOMIC_ACQUIRE);
+            return head == ring->header->tail;
+        }
+        thesdk_ring_wait(&spins);
+    }
+}
+
+long long thesdk_ring_get(int handle, int column)
+{
+    thesdk_ring *ring = thesdk_ring_get_handle(handle);
+    uint64_t row;
+    if (ring == NULL || thesdk_ring_eof(handle))
+        return 0;
+    row = ring->header->tail % ring->header->capacity;
+    return ring->data[row * ring->header->columns + column];
+}
+
+void thesdk_ring_pop(int handle)
+{
+    thesdk_ring *ring = thesdk_ring_get_handle(handle);
+    if (ring == NULL || thesdk_ring_eof(handle))
+        return;
+    __atomic_store_n(&ring->header->tail, ring->header->tail + 1, __ATOMIC_RELEASE);
+}
+
+/* Producer: values are collected to a record and committed with push */
+void thesdk_ring_put(int handle, int column, long long value)
+{
+    thesdk_ring *ring = thesdk_ring_get_handle(handle);
+    if (ring != NULL && column >= 0 && (uint32_t)column < ring->header->columns)
+        ring->record[column] = value;
+}
+
+void thesdk_ring_push(int handle)
+{
+    thesdk_ring *ring = thesdk_ring_get_handle(handle);
+    uint64_t head;
+    unsigned spins = 0;
+    if (ring == NULL)
+        return;
+    head = ring->header->head;
+    while (head - __atomic_load_n(&ring->header->tail, __ATOMIC_ACQUIRE) >= ring->header->capacity) {
+        /* Nobody will consume the data */
+        if (__atomic_load_n(&ring->header->py_closed, __ATOMIC_ACQUIRE))
+            return;
+        thesdk_ring_wait(&spins);
+    }
+    memcpy(&ring->data[(head % ring->header->capacity) * ring->header->columns],
+            ring->record, ring->header->columns * sizeof(int64_t));
+    __atomic_store_n(&ring->header->head, head + 1, __ATOMIC_RELEASE);
+}
+
+void thesdk_ring_close(int handle)
+{
+    thesdk_ring *ring = thesdk_ring_get_handle(handle);
+    if (ring == NULL)
+        return;
+    __atomic_store_n(&ring->header->hdl_closed, 1, __ATOMIC_RELEASE);
+    munmap(ring->header, ring->size);
+    free(ring->record);
+    ring->header = NULL;
+}
+
+#ifdef __cplusplus
+}
+#endif
+
+#ifdef THESDK_VPI
+#include <vpi_user.h>
+
+/* Returns the arguments of the current system task call */
+static int thesdk_ring_args(vpiHandle *argv, int max)
+{
+    vpiHandle call = vpi_handle(vpiSysTfCall, NULL);
+    vpiHandle iter = vpi_iterate(vpiArgument, call);
+    int argc = 0;
+    vpiHandle arg;
+    if (iter == NULL)
+        return 0;
+    while ((arg = vpi_scan(iter)) != NULL) {
+        if (argc < max)
+            argv[argc++] = arg;
+    }
+    return argc;
+}
+
+static int thesdk_ring_int_arg(vpiHandle arg)
+{
+    s_vpi_value value;
+    value.format = vpiIntVal;
+    vpi_get_value(arg, &value);
+    return value.value.integer;
+}
+
+static long long thesdk_ring_long_arg(vpiHandle arg)
+{
+    s_vpi_value value;
+    int size = vpi_get(vpiSize, arg);
+    uint64_t bits;
+    value.format = vpiVectorVal;
+    vpi_get_value(arg, &value);
+    bits = (uint32_t)value.value.vector[0].aval;
+    if (size > 32)
+        bits |= (uint64_t)(uint32_t)value.value.vector[1].aval << 32;
+    if (size < 64) {
+        bits &= ((uint64_t)1 << size) - 1;
+        /* Sign extension of signed expressions */
+        if (vpi_get(vpiSigned, arg) && (bits >> (size - 1)) & 1)
+            bits |= ~(((uint64_t)1 << size) - 1);
+    }
+    return (long long)bits;
+}
+
+static void thesdk_ring_return_int(int result)
+{
+    s_vpi_value value;
+    value.format = vpiIntVal;
+    value.value.integer = result;
+    vpi_put_value(vpi_handle(vpiSysTfCall, NULL), &value, NULL, vpiNoDelay);
+}
+
+static PLI_INT32 thesdk_ring_open_calltf(PLI_BYTE8 *user)
+{
+    vpiHandle argv[1];
+    s_vpi_value value;
+    (void)user;
+    thesdk_ring_args(argv, 1);
+    value.format = vpiStringVal;
+    vpi_get_value(argv[0], &value);
+    thesdk_ring_return_int(thesdk_ring_open(value.value.str));
+    return 0;
+}
+
+static PLI_INT32 thesdk_ring_eof_calltf(PLI_BYTE8 *user)
+{
+    vpiHandle argv[1];
+    (void)user;
+    thesdk_ring_args(argv, 1);
+    thesdk_ring_return_int(thesdk_ring_eof(thesdk_ring_int_arg(argv[0])));
+    return 0;
+}
+
+static PLI_INT32 thesdk_ring_get_sizetf(PLI_BYTE8 *user)
+{
+    (void)user;
+    return 64;
+}
+
+static PLI_INT32 thesdk_ring_get_calltf(PLI_BYTE8 *user)
+{
+    vpiHandle argv[2];
+    s_vpi_value value;
+    s_vpi_vecval vector[2];
+    uint64_t bits;
+    (void)user;
+    thesdk_ring_args(argv, 2);
+    bits = (uint64_t)thesdk_ring_get(thesdk_ring_int_arg(argv[0]), thesdk_ring_int_arg(argv[1]));
+    vector[0].aval = (PLI_INT32)(bits & 0xffffffffu);
+    vector[0].bval = 0;
+    vector[1].aval = (PLI_INT32)(bits >> 32);
+    vector[1].bval = 0;
+    value.format = vpiVectorVal;
+    value.value.vector = vector;
+    vpi_put_value(vpi_handle(vpiSysTfCall, NULL), &value, NULL, vpiNoDelay);
+    return 0;
+}
+
+static PLI_INT32 thesdk_ring_pop_calltf(PLI_BYTE8 *user)
+{
+    vpiHandle argv[1];
+    (void)user;
+    thesdk_ring_args(argv, 1);
+    thesdk_ring_pop(thesdk_ring_int_arg(argv[0]));
+    return 0;
+}
+
+static PLI_INT32 thesdk_ring_put_calltf(PLI_BYTE8 *user)
+{
+    vpiHandle argv[3];
+    (void)user;
+    thesdk_ring_args(argv, 3);
+    thesdk_ring_put(thesdk_ring_int_arg(argv[0]), thesdk_ring_int_arg(argv[1]),
+            thesdk_ring_long_arg(argv[2]));
+    return 0;
+}
+
+static PLI_INT32 thesdk_ring_push_calltf(PLI_BYTE8 *user)
+{
+    vpiHandle argv[1];
+    (void)user;
+    thesdk_ring_args(argv, 1);
+    thesdk_ring_push(thesdk_ring_int_arg(argv[0]));
+    return 0;
+}
+
+static PLI_INT32 thesdk_ring_close_calltf(PLI_BYTE8 *user)
+{
+    vpiHandle argv[1];
+    (void)user;
+    thesdk_ring_args(argv, 1);
+    thesdk_ring_close(thesdk_ring_int_arg(argv[0]));
+    return 0;
+}
+
+static void thesdk_ring_register_one(PLI_INT32 type, PLI_INT32 functype, const char *name,
+        PLI_INT32 (*calltf)(PLI_BYTE8 *), PLI_INT32 (*sizetf)(PLI_BYTE8 *))
+{
+    s_vpi_systf_data tf;
+    memset(&tf, 0, sizeof(tf));
+    tf.type = type;
+    tf.sysfunctype = functype;
+    tf.tfname = (PLI_BYTE8 *)name;
+    tf.calltf = calltf;
+    tf.sizetf = sizetf;
+    vpi_register_systf(&tf);
+}
+
+static void thesdk_ring_register(void)
+{
+    thesdk_ring_register_one(vpiSysFunc, vpiIntFunc, "$thesdk_ring_open", thesdk_ring_open_calltf, NULL);
+    thesdk_ring_register_one(vpiSysFunc, vpiIntFunc, "$thesdk_ring_eof", thesdk_ring_eof_calltf, NULL);
+    thesdk_ring_register_one(vpiSysFunc, vpiSizedSignedFunc, "$thesdk_ring_get",
+            thesdk_ring_get_calltf, thesdk_ring_get_sizetf);
+    thesdk_ring_register_one(vpiSysTask, 0, "$thesdk_ring_pop", thesdk_ring_pop_calltf, NULL);
+    thesdk_ring_register_one(vpiSysTask, 0, "$thesdk_ring_put", thesdk_ring_put_calltf, NULL);
+    thesdk_ring_register_one(vpiSysTask, 0, "$thesdk_ring_push", thesdk_ring_push_calltf, NULL);
+    thesdk_ring_register_one(vpiSysTask, 0, "$thesdk_ring_close", thesdk_ring_close_calltf, NULL);
+}
+
+void (*vlog_startup_routines[])(void) = { thesdk_ring_register, 0 };
+#endif
@@ -0,0 +1,42 @@
+"""
+===
+VPI
+===
+VPI is a mixin class providing the properties needed by the simulator
+backends to build the `thesdk_ring` VPI/DPI module used by IO files with
+`iomode` 'vpi'.
+
+"""
+import os
+from thesdk import *
+
+class vpi(thesdk,metaclass=abc.ABCMeta):
+    @property
+    def vpi_iofiles(self):
+        ''' IO files transferred through ring buffers.
+
+        '''
+        return [ file for name, file in self.iofile_bundle.Members.items()
+                if file.iomode=='vpi' ]
+
+    @property
+    def vpi_source(self):
+        ''' C source of the ring buffer module.
+
+        '''
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thesdk_ring.c')
+
+    @property
+    def vpi_module(self):
+        ''' Name of the compiled VPI module, `<vpi_module>.vpi` in `rtlworkpath`.
+
+        '''
+        return 'thesdk_ring'
+
+    @property
+    def vpi_sft(self):
+        ''' Icarus system function table declaring the return types of the
+        ring buffer functions for `iverilog`.
+
+        '''
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thesdk_ring.sft')
@@ -0,0 +1,114 @@
+"""
+===================
+VPI IOfile module
+===================
+
+Provides the SystemVerilog constructs for IO files transferred through
+the shared memory ring buffers of `rtl.vpi.ring_buffer`.
+
+Icarus calls the ring through the VPI system tasks `$thesdk_ring_*`.
+Verilator does not support user defined system tasks through VPI, so
+the same functions are imported with DPI-C.
+
+"""
+from thesdk import *
+from rtl.sv.verilog_iofile import verilog_iofile
+from rtl.code_emitter import code_emitter
+
+class vpi_iofile(verilog_iofile):
+    """
+    Class to provide ring buffer IO for rtl simulations. Used as the
+    langmodule of `rtl_iofile` with `iomode` 'vpi'.
+    """
+
+    @property
+    def rtl_call(self):
+        '''Prefix of the ring buffer calls. '$' for VPI system tasks, '' for DPI-C.
+
+        '''
+        model=self.parent.parent.model
+        if model=='icarus':
+            return '$'
+        elif model=='verilator':
+            return ''
+        else:
+            self.print_log(type='F', msg='VPI IO is not supported by model %s' %(model))
+
+    @property
+    def rtl_statdef(self):
+        '''Handle variable definition, and the DPI-C imports for Verilator.
+
+        '''
+        self._rtl_statdef = 'integer %s, %s;\n' %(self.rtl_stat, self.rtl_fptr)
+        if self.rtl_plusargs_files:
+            self._rtl_statdef += 'string %s;\n' %(self.rtl_fname)
+        if not self.rtl_call:
+            self._rtl_statdef+=('`ifndef THESDK_RING_DPI\n'
+                    + '`define THESDK_RING_DPI\n'
+                    + 'import "DPI-C" function int thesdk_ring_open(input string path);\n'
+                    + 'import "DPI-C" function int thesdk_ring_eof(input int handle);\n'
+                    + 'import "DPI-C" function longint thesdk_ring_get(input int handle, input int column);\n'
+                    + 'import "DPI-C" function void thesdk_ring_pop(input int handle);\n'
+                    + 'import "DPI-C" function void thesdk_ring_put(input int handle, input int column, input longint value);\n'
+                    + 'import "DPI-C" function void thesdk_ring_push(input int handle);\n'
+                    + 'import "DPI-C" function void thesdk_ring_close(input int handle);\n'
+                    + '`endif\n')
+        return self._rtl_statdef
+
+    @property
+    def rtl_fopen(self):
+        '''Ring buffer open routine string.
+
+        '''
+        self._rtl_fopen = self.rtl_initial_open('%sthesdk_ring_open(%s)' %(self.rtl_call,
+                self.rtl_fname))
+        return self._rtl_fopen
+
+    @property
+    def rtl_fclose(self):
+        '''Ring buffer close routine string.
+
+        '''
+        self._rtl_fclose = '%sthesdk_ring_close(%s);\n' %(self.rtl_call, self.rtl_fptr)
+        return self._rtl_fclose
+
+    @property
+    def rtl_io(self):
+        '''Verilog read/write construct for the ring buffer of a sample type IO.
+        Each record holds one 64-bit value per connector.
+
+        Returns
+        _______
+        str
+            Verilog code to read/write the ring buffer.
+
+        '''
+        if self.parent.iotype!='sample':
+            self.print_log(type='F', msg='VPI IO supports only sample type IO')
+        call=self.rtl_call
+        out=code_emitter()
+        if self.parent.dir=='out':
+            out.write('always '+self.rtl_io_sync +'begin\n')
+            with out.block():
+                out.indent(text='if ( %s ) begin\n' %(self.rtl_io_condition))
+                with out.block():
+                    for column, connector in enumerate(self.parent.rtl_connectors):
+                        out.indent(text='%sthesdk_ring_put(%s, %d, %s);' %(call,
+                            self.rtl_fptr, column, connector.name))
+                    out.indent(text='%sthesdk_ring_push(%s);' %(call, self.rtl_fptr))
+                out.indent(text='end')
+            out.indent(text='end')
+        elif self.parent.dir=='in':
+            out.write('while (!%sthesdk_ring_eof(%s)) begin\n' %(call, self.rtl_fptr))
+            out.indent(text='%s' %self.rtl_io_sync)
+            with out.block():
+                out.indent(text='if ( %s ) begin\n' %self.rtl_io_condition)
+                with out.block():
+                    for column, connector in enumerate(self.parent.rtl_connectors):
+                        out.indent(text='%s = %sthesdk_ring_get(%s, %d);' %(connector.name,
+                            call, self.rtl_fptr, column))
+                    out.indent(text='%sthesdk_ring_pop(%s);' %(call, self.rtl_fptr))
+                out.indent(text='end')
+            out.indent(text='end')
+        self._rtl_io=out.getvalue()
+        return self._rtl_io